@@ -0,0 +1,133 @@
+"""Persistent per-station store of raw daily TMAX/TMIN observations.
+
+The first fetch of a station parses the complete source file once (all
+years, all quality flags) and keeps the daily values as compact columnar
+arrays in `data/daily/<station_id>.npz`:
+
+    date     int32   YYYYMMDD
+    element  int8    0 = TMAX, 1 = TMIN
+    value    int16   tenths of a degree Celsius
+    qflag    S1      quality flag, b"" if the value passed all checks
+
+Every later request for that station, whatever its year range or
+`ignore_qflag` setting, is answered from these arrays without network I/O
+and without parsing text again.
+
+Authors:
+    Lisa Fritsch, Jan Goliasch, Finja Sterner, Menko Hornstein
+"""
+from __future__ import annotations
+import os
+import threading
+from pathlib import Path
+from typing import Dict, Optional
+
+import numpy as np
+import pandas as pd
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+DAILY_DIR = BASE_DIR / "data" / "daily"
+
+ELEMENTS = np.array(["TMAX", "TMIN"], dtype=object)
+
+
+def daily_path(station_id: str, root: Optional[Path] = None) -> Path:
+    """Returns the store file of a station."""
+    return (root or DAILY_DIR) / f"{station_id}.npz"
+
+
+def has_daily(station_id: str, root: Optional[Path] = None) -> bool:
+    """Checks whether the daily values of a station are already stored."""
+    return daily_path(station_id, root).exists()
+
+
+def daily_arrays_from_frame(df: pd.DataFrame) -> Dict[str, np.ndarray]:
+    """Converts an unfiltered loader frame into the store columns.
+
+    Accepts both loader layouts: a `day` column (S3) or the melted `day_raw`
+    column `v1`..`v31` (DLY). Missing qflags (NaN/None/blank) become b"".
+    """
+    if "day" in df.columns:
+        day = df["day"].to_numpy(dtype=np.int32)
+    else:
+        day = df["day_raw"].str.slice(1).astype(np.int32).to_numpy()
+
+    date = (df["year"].to_numpy(dtype=np.int32) * 10000
+            + df["month"].to_numpy(dtype=np.int32) * 100 + day)
+    element = np.where(df["element"].to_numpy() == "TMAX", 0, 1).astype(np.int8)
+
+    if "qflag" in df.columns:
+        qflag = df["qflag"].fillna("").astype(str).str.strip().str.slice(0, 1)
+        qflag = qflag.str.encode("ascii").to_numpy(dtype="S1")
+    else:
+        qflag = np.zeros(len(df), dtype="S1")
+
+    return {
+        "date": date,
+        "element": element,
+        "value": df["value"].to_numpy().astype(np.int16),
+        "qflag": qflag,
+    }
+
+
+def save_daily(station_id: str, arrays: Dict[str, np.ndarray], root: Optional[Path] = None) -> Path:
+    """Writes the store file of a station atomically (temp file + rename).
+
+    The temp file is unique per process and thread, so concurrent saves of
+    the same station never write into each other's file; a failed save
+    leaves no temp file behind.
+    """
+    path = daily_path(station_id, root)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_name(f"{path.name}.{os.getpid()}.{threading.get_ident()}.part")
+    try:
+        with open(tmp, "wb") as f:
+            np.savez(f, **arrays)
+        os.replace(tmp, path)
+    finally:
+        tmp.unlink(missing_ok=True)
+    return path
+
+
+def load_daily(station_id: str, root: Optional[Path] = None) -> Optional[Dict[str, np.ndarray]]:
+    """Loads the stored arrays of a station, or None if it was never fetched."""
+    path = daily_path(station_id, root)
+    try:
+        with np.load(path) as data:
+            return {name: data[name] for name in ("date", "element", "value", "qflag")}
+    except FileNotFoundError:
+        return None
+
+
+def daily_frame(
+    station_id: str,
+    arrays: Dict[str, np.ndarray],
+    start_year: Optional[int],
+    end_year: Optional[int],
+    ignore_qflag: bool,
+) -> pd.DataFrame:
+    """Builds the loader-shaped frame for one request from the stored arrays.
+
+    Returns the columns station_id, year, month, element, value that
+    `_process_weather_data` expects, in the original source order.
+    """
+    date = arrays["date"]
+    keep = np.ones(len(date), dtype=bool)
+    if start_year:
+        keep &= date >= int(start_year) * 10000
+    if end_year:
+        keep &= date < (int(end_year) + 1) * 10000
+    if ignore_qflag:
+        keep &= arrays["qflag"] == b""
+
+    date = date[keep]
+    if not len(date):
+        return pd.DataFrame()
+
+    return pd.DataFrame({
+        "station_id": station_id,
+        "year": date // 10000,
+        "month": date // 100 % 100,
+        "element": ELEMENTS[arrays["element"][keep]],
+        "value": arrays["value"][keep].astype(np.float64),
+    })
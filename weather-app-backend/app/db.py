@@ -0,0 +1,155 @@
+"""Shared SQLite connection pool used by all backend modules.
+
+Opens connections once instead of per request, switches the database to
+WAL mode so readers never block on the writer, and applies tuned pragmas.
+Reads go through a pool of `query_only` reader connections; all writes go
+through one writer connection guarded by a lock, so the write-behind saver
+and the importers never fight over the SQLite write lock.
+
+Authors:
+    Lisa Fritsch, Jan Goliasch, Finja Sterner, Menko Hornstein
+"""
+from __future__ import annotations
+import os
+import queue
+import sqlite3
+import threading
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Dict, Iterator, Optional, Union
+
+# Base directory of the project
+BASE_DIR = Path(__file__).resolve().parent.parent
+DB_PATH = BASE_DIR / "weather.sqlite3"
+
+# Pool configuration
+DB_READERS = int(os.getenv("DB_READERS", "8"))
+DB_TIMEOUT = float(os.getenv("DB_TIMEOUT", "10"))
+
+# Connection pragmas (cache_size in KiB when negative, mmap_size in bytes)
+PRAGMAS = {
+    "synchronous": "NORMAL",
+    "cache_size": -32000,
+    "mmap_size": 256 * 1024 * 1024,
+    "temp_store": "MEMORY",
+    "busy_timeout": int(DB_TIMEOUT * 1000),
+}
+
+
+def configure_connection(conn: sqlite3.Connection, read_only: bool = False) -> None:
+    """Applies the pool pragmas to a fresh connection.
+
+    Args:
+        conn: The connection to configure.
+        read_only: If True, the connection is switched to `query_only`.
+    """
+    if not read_only:
+        # Persistent per database file, only the writer needs to set it
+        conn.execute("PRAGMA journal_mode=WAL;")
+    for name, value in PRAGMAS.items():
+        conn.execute(f"PRAGMA {name}={value};")
+    if read_only:
+        conn.execute("PRAGMA query_only=ON;")
+
+
+class ConnectionPool:
+    """Reader connection pool plus a single, lock-protected writer connection."""
+
+    def __init__(self, db_path: Union[str, Path] = DB_PATH, readers: int = DB_READERS) -> None:
+        self.db_path = str(db_path)
+        self.max_readers = max(1, int(readers))
+        self._idle: "queue.LifoQueue[sqlite3.Connection]" = queue.LifoQueue()
+        self._created = 0
+        self._lock = threading.Lock()
+        self._writer: Optional[sqlite3.Connection] = None
+        self._writer_lock = threading.RLock()
+
+    def _connect(self, read_only: bool) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.db_path, timeout=DB_TIMEOUT, check_same_thread=False)
+        conn.row_factory = sqlite3.Row
+        configure_connection(conn, read_only=read_only)
+        return conn
+
+    def _acquire_reader(self) -> sqlite3.Connection:
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            pass
+
+        with self._lock:
+            create = self._created < self.max_readers
+            if create:
+                self._created += 1
+        if not create:
+            return self._idle.get(timeout=DB_TIMEOUT)
+
+        try:
+            return self._connect(read_only=True)
+        except BaseException:
+            with self._lock:
+                self._created -= 1
+            raise
+
+    @contextmanager
+    def reader(self) -> Iterator[sqlite3.Connection]:
+        """Borrows a read-only connection for the duration of the block."""
+        conn = self._acquire_reader()
+        try:
+            yield conn
+        finally:
+            # End the implicit read transaction so the WAL can be checkpointed
+            conn.rollback()
+            self._idle.put(conn)
+
+    @contextmanager
+    def writer(self) -> Iterator[sqlite3.Connection]:
+        """Holds the single writer connection for the duration of the block.
+
+        Uncommitted changes are rolled back if the block raises.
+        """
+        with self._writer_lock:
+            if self._writer is None:
+                self._writer = self._connect(read_only=False)
+            try:
+                yield self._writer
+            except BaseException:
+                self._writer.rollback()
+                raise
+
+    def close(self) -> None:
+        """Closes all idle readers and the writer."""
+        with self._writer_lock:
+            if self._writer is not None:
+                self._writer.close()
+                self._writer = None
+        while True:
+            try:
+                self._idle.get_nowait().close()
+            except queue.Empty:
+                break
+        with self._lock:
+            self._created = 0
+
+
+_pools: Dict[str, ConnectionPool] = {}
+_pools_lock = threading.Lock()
+
+
+def get_pool(db_path: Union[str, Path] = DB_PATH) -> ConnectionPool:
+    """Returns the process-wide pool for a database file, creating it on first use."""
+    key = str(db_path)
+    with _pools_lock:
+        pool = _pools.get(key)
+        if pool is None:
+            pool = ConnectionPool(key)
+            _pools[key] = pool
+        return pool
+
+
+def close_pools() -> None:
+    """Closes and forgets all pools (application shutdown, tests)."""
+    with _pools_lock:
+        pools = list(_pools.values())
+        _pools.clear()
+    for pool in pools:
+        pool.close()
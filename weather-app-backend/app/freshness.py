@@ -0,0 +1,234 @@
+"""Freshness tracking and stale-while-revalidate for cached temperature data.
+
+Aggregates of complete historical years never change once computed. Only
+the most recent years (`TEMPS_RECENT_YEARS` before the current one, plus
+the current year) keep receiving observations and late quality control.
+Requests touching those years are always answered from the cache; if the
+station's raw data is older than `TEMPS_TTL_HOURS`, a background job
+revalidates it:
+
+    1. Conditional GET of the station's source file (ETag/Last-Modified)
+    2. 304  -> only `checked_at` is updated
+    3. 200  -> daily store replaced, recent periods recomputed and saved
+
+Revalidation holds the station's `fetch-<station_id>` lock, so with
+several API workers only one of them revalidates a stale station; the
+others skip it instead of downloading the same file again.
+
+Per-station metadata lives in `station_temp_freshness`. Stations without a
+row (fetched before revalidation ran for them) fall back to the
+modification time of their daily store file.
+
+Authors:
+    Lisa Fritsch, Jan Goliasch, Finja Sterner, Menko Hornstein
+"""
+from __future__ import annotations
+import os
+import sqlite3
+import time
+from pathlib import Path
+from typing import Optional, Union
+
+from app.daily_store import daily_arrays_from_frame, daily_frame, daily_path, save_daily
+from app.db import DB_PATH, get_pool
+from app.http_client import get_http_client
+from app.import_temps import (
+    COVERAGE_MAX_YEAR,
+    DATA_DIR,
+    DLY_BASE_URL,
+    S3_BASE_URL,
+    S3_DATA_DIR,
+    StationDataUnavailable,
+    _load_dly_data,
+    _load_s3_data,
+    _process_weather_data,
+    _seasons_for,
+    save_station_periods_to_db,
+)
+from app.process_lock import holding
+
+# Seconds after which recent periods of a station are revalidated
+TEMPS_TTL_SECONDS = float(os.getenv("TEMPS_TTL_HOURS", "24")) * 3600
+
+# Years before the current one that are still treated as mutable
+TEMPS_RECENT_YEARS = int(os.getenv("TEMPS_RECENT_YEARS", "1"))
+
+
+def recent_start_year(now: Optional[float] = None) -> int:
+    """Returns the first year whose periods may still change."""
+    return time.localtime(now).tm_year - TEMPS_RECENT_YEARS
+
+
+def touches_recent(end_year: Optional[int], now: Optional[float] = None) -> bool:
+    """Checks whether a requested range reaches into the mutable recent years."""
+    return end_year is None or end_year >= recent_start_year(now)
+
+
+def is_immutable_range(end_year: Optional[int], now: Optional[float] = None) -> bool:
+    """Checks whether a fully cached range can never change again.
+
+    Revalidation also rewrites the season that starts in December of the
+    year before the recent years, so that year does not count as immutable.
+    """
+    return end_year is not None and end_year < recent_start_year(now) - 1
+
+
+def get_changed_at(conn: sqlite3.Connection, station_id: str) -> Optional[float]:
+    """Returns when revalidation last changed the station's data, None if never."""
+    row = conn.execute(
+        "SELECT changed_at FROM station_temp_freshness WHERE station_id = ?;", (station_id,)
+    ).fetchone()
+    return None if row is None else row[0]
+
+
+def get_checked_at(conn: sqlite3.Connection, station_id: str) -> Optional[float]:
+    """Returns when the station's raw data was last fetched or revalidated."""
+    row = conn.execute(
+        "SELECT checked_at FROM station_temp_freshness WHERE station_id = ?;", (station_id,)
+    ).fetchone()
+    if row is not None:
+        return float(row[0])
+    try:
+        return daily_path(station_id).stat().st_mtime
+    except FileNotFoundError:
+        return None
+
+
+def is_stale(conn: sqlite3.Connection, station_id: str, now: Optional[float] = None) -> bool:
+    """Checks whether the recent periods of a station are older than the TTL."""
+    checked_at = get_checked_at(conn, station_id)
+    if checked_at is None:
+        return True
+    return (now or time.time()) - checked_at > TEMPS_TTL_SECONDS
+
+
+def save_freshness(
+    conn: sqlite3.Connection,
+    station_id: str,
+    source_url: str,
+    etag: Optional[str],
+    last_modified: Optional[str],
+    checked_at: float,
+    changed: bool,
+) -> None:
+    """Records a revalidation; `changed_at` is kept unless the data changed. Does not commit."""
+    conn.execute("""
+    INSERT INTO station_temp_freshness (station_id, source_url, etag, last_modified, checked_at, changed_at)
+    VALUES (?, ?, ?, ?, ?, ?)
+    ON CONFLICT(station_id) DO UPDATE SET
+        source_url = excluded.source_url,
+        etag = excluded.etag,
+        last_modified = excluded.last_modified,
+        checked_at = excluded.checked_at,
+        changed_at = COALESCE(excluded.changed_at, station_temp_freshness.changed_at);
+    """, (station_id, source_url, etag, last_modified, checked_at, checked_at if changed else None))
+
+
+def _sources(station_id: str):
+    """Candidate source files (url, local path, loader), preferred first."""
+    return [
+        (f"{S3_BASE_URL}/csv.gz/by_station/{station_id}.csv.gz", S3_DATA_DIR / f"{station_id}.csv.gz", _load_s3_data),
+        (f"{DLY_BASE_URL}/{station_id}.dly", DATA_DIR / f"{station_id}.dly", _load_dly_data),
+    ]
+
+
+def revalidate_station(
+    station_id: str,
+    lat: Optional[float] = None,
+    db_path: Union[str, Path] = DB_PATH,
+    recent_from: Optional[int] = None,
+) -> dict:
+    """Revalidates the recent periods of one station against its source.
+
+    Sends a conditional request for the source the station was last fetched
+    from (S3 first if unknown); the other source is the fallback if that
+    request fails or the changed file has no temperature data. Only periods from
+    `recent_from` (default `recent_start_year()`) on, plus the season that
+    crosses into it, are recomputed; complete historical years are never
+    rewritten.
+
+    Skipped if another worker process or thread holds the station's fetch
+    lock, i.e. is already revalidating or fetching it.
+
+    Returns:
+        {"station_id", "status": "not_modified" | "updated" | "skipped", "rows": n}
+
+    Raises:
+        Exception: If no source could be reached.
+        StationDataUnavailable: If no source had temperature data.
+    """
+    with holding(f"fetch-{station_id}", timeout=0) as locked:
+        if not locked:
+            print(f"[REVALIDATE] {station_id} is being fetched elsewhere, skipped", flush=True)
+            return {"station_id": station_id, "status": "skipped", "rows": 0}
+        return _revalidate_station(station_id, lat, db_path, recent_from)
+
+
+def _revalidate_station(
+    station_id: str,
+    lat: Optional[float],
+    db_path: Union[str, Path],
+    recent_from: Optional[int],
+) -> dict:
+    """Body of `revalidate_station`; the caller holds the station's fetch lock."""
+    recent_from = recent_start_year() if recent_from is None else recent_from
+
+    with get_pool(db_path).reader() as conn:
+        known = conn.execute(
+            "SELECT source_url, etag, last_modified FROM station_temp_freshness WHERE station_id = ?;",
+            (station_id,),
+        ).fetchone()
+
+    # The known source first, the others as fallback
+    sources = _sources(station_id)
+    if known is not None:
+        sources.sort(key=lambda source: source[0] != known[0])
+
+    error: Optional[Exception] = None
+    for url, dest, loader in sources:
+        etag = last_modified = None
+        if known is not None and known[0] == url and dest.exists():
+            etag, last_modified = known[1], known[2]
+        try:
+            validators = get_http_client().download_if_changed(url, dest, etag, last_modified)
+        except Exception as e:
+            print(f"[REVALIDATE] {url} failed: {e}", flush=True)
+            error = e
+            continue
+
+        now = time.time()
+        if validators is None:
+            with get_pool(db_path).writer() as conn:
+                save_freshness(conn, station_id, url, etag, last_modified, now, changed=False)
+                conn.commit()
+            print(f"[REVALIDATE] {station_id} not modified", flush=True)
+            return {"station_id": station_id, "status": "not_modified", "rows": 0}
+
+        # A file without temperature rows falls through to the next source,
+        # like a cold fetch does, and is never recorded as the station's source
+        df = loader(station_id, None, None, False)
+        if not df.empty:
+            break
+        print(f"[REVALIDATE] {url} has no temperature data", flush=True)
+        error = StationDataUnavailable(f"No temperature data available for station {station_id}")
+    else:
+        raise error
+
+    arrays = daily_arrays_from_frame(df)
+    save_daily(station_id, arrays)
+    # The season starting in December of the year before `recent_from`
+    # ends in `recent_from`, so it is recomputed as well
+    boundary_season = _seasons_for(lat)[12]
+    recent = daily_frame(station_id, arrays, recent_from - 1, COVERAGE_MAX_YEAR, True)
+    rows = [
+        r for r in _process_weather_data(recent, recent_from - 1, None, lat=lat)
+        if r[1] >= recent_from or r[2] == boundary_season
+    ]
+
+    with get_pool(db_path).writer() as conn:
+        if rows:
+            save_station_periods_to_db(conn, rows)
+        save_freshness(conn, station_id, url, validators["etag"], validators["last_modified"], now, changed=True)
+        conn.commit()
+    print(f"[REVALIDATE] {station_id} updated {len(rows)} recent rows", flush=True)
+    return {"station_id": station_id, "status": "updated", "rows": len(rows)}
@@ -0,0 +1,67 @@
+"""HTTP validators and cache policies for the read endpoints.
+
+ETags are strong and deterministic: they are derived from the request
+parameters and a version of the cached content (never from the process),
+so every worker issues the same tag for the same data and a CDN can
+revalidate against any of them.
+
+Cache policies for `/api/stations/{station_id}/temps`:
+
+    complete, historical   immutable, cached for a year
+    complete, recent       short max-age, revalidated with the ETag
+    live / partial         no-cache, no validator (not yet in the cache)
+
+Authors:
+    Lisa Fritsch, Jan Goliasch, Finja Sterner, Menko Hornstein
+"""
+from __future__ import annotations
+import hashlib
+import os
+from typing import Any, Dict, Optional
+
+from fastapi import Response
+
+# Bump when the aggregation or response format changes, so old tags stop matching
+ETAG_VERSION = "1"
+
+TEMPS_RECENT_MAX_AGE = int(os.getenv("TEMPS_RECENT_MAX_AGE", "3600"))
+
+CACHE_IMMUTABLE = "public, max-age=31536000, immutable"
+CACHE_RECENT = f"public, max-age={TEMPS_RECENT_MAX_AGE}"
+CACHE_REVALIDATE = "no-cache"
+
+
+def make_etag(*parts: Any) -> str:
+    """Builds a strong ETag from the given parts (parameters and content version)."""
+    digest = hashlib.blake2b(repr((ETAG_VERSION,) + parts).encode(), digest_size=16).hexdigest()
+    return f'"{digest}"'
+
+
+def etag_matches(if_none_match: Optional[str], etag: str, allow_wildcard: bool = True) -> bool:
+    """Checks an If-None-Match header (list, `*` or weak tags) against an ETag.
+
+    `*` matches any existing representation; callers that have not yet
+    established that the resource exists pass `allow_wildcard=False`.
+    """
+    if not if_none_match:
+        return False
+    for candidate in if_none_match.split(","):
+        candidate = candidate.strip()
+        if candidate.startswith("W/"):
+            candidate = candidate[2:]
+        if (candidate == "*" and allow_wildcard) or candidate == etag:
+            return True
+    return False
+
+
+def not_modified(etag: str, cache_control: str) -> Response:
+    """Returns an empty 304 carrying the validator and cache policy."""
+    return Response(status_code=304, headers=cache_headers(etag, cache_control))
+
+
+def cache_headers(etag: Optional[str], cache_control: str) -> Dict[str, str]:
+    """Returns the ETag / Cache-Control headers of a response."""
+    headers = {"Cache-Control": cache_control}
+    if etag is not None:
+        headers["ETag"] = etag
+    return headers
@@ -0,0 +1,309 @@
+"""Shared pooled HTTP client for all NOAA downloads.
+
+One `requests.Session` with a connection pool is shared by the station
+and temperature importers, so consecutive downloads from the same host
+reuse kept-alive connections instead of paying a new TCP+TLS handshake.
+Failed requests (connection errors, 429/5xx) are retried with
+exponential backoff, and a per-host semaphore limits how many downloads
+run against one mirror at the same time.
+
+`race` implements the optional hedged fallback: the primary source
+starts immediately, the fallback after a short hedge delay (or as soon
+as the primary fails), and whichever delivers a usable result first
+wins. The losers are signalled to stop through their cancel event.
+
+Authors:
+    Lisa Fritsch, Jan Goliasch, Finja Sterner, Menko Hornstein
+"""
+from __future__ import annotations
+import os
+import queue
+import threading
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Callable, Dict, Iterator, Optional, Sequence, TypeVar
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+# Pool and retry configuration
+HTTP_POOL_SIZE = int(os.getenv("HTTP_POOL_SIZE", "16"))
+HTTP_HOST_CONCURRENCY = int(os.getenv("HTTP_HOST_CONCURRENCY", "8"))
+HTTP_RETRIES = int(os.getenv("HTTP_RETRIES", "3"))
+HTTP_BACKOFF = float(os.getenv("HTTP_BACKOFF", "0.5"))
+
+# Hedge delay in seconds before the fallback source is raced (0 = sequential fallback)
+HTTP_HEDGE_DELAY = float(os.getenv("HTTP_HEDGE_DELAY", "0"))
+
+CHUNK_SIZE = 1024 * 1024
+RETRY_STATUS = (429, 500, 502, 503, 504)
+
+T = TypeVar("T")
+
+# Progress callback: (bytes received so far, Content-Length or None)
+ProgressCallback = Callable[[int, Optional[int]], None]
+
+
+def part_path(dest: Path) -> Path:
+    """Returns a temp file next to `dest`, unique per process and thread.
+
+    Thread idents repeat across forked worker processes, so the process ID
+    is part of the name as well.
+    """
+    return dest.with_name(f"{dest.name}.{os.getpid()}.{threading.get_ident()}.part")
+
+
+class DownloadCancelled(Exception):
+    """Raised inside a download whose result is no longer needed."""
+
+
+class HttpClient:
+    """Session with keep-alive pooling, retries and per-host concurrency limits."""
+
+    def __init__(
+        self,
+        pool_size: int = HTTP_POOL_SIZE,
+        host_concurrency: int = HTTP_HOST_CONCURRENCY,
+        retries: int = HTTP_RETRIES,
+        backoff: float = HTTP_BACKOFF,
+    ) -> None:
+        self.host_concurrency = max(1, int(host_concurrency))
+        retry = Retry(
+            total=retries,
+            connect=retries,
+            read=retries,
+            status=retries,
+            backoff_factor=backoff,
+            status_forcelist=RETRY_STATUS,
+            allowed_methods=frozenset({"GET", "HEAD"}),
+            raise_on_status=False,
+        )
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retry)
+        self.session = requests.Session()
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self._lock = threading.Lock()
+        self._hosts: Dict[str, threading.BoundedSemaphore] = {}
+        self._requests = 0
+        self._bytes = 0
+
+    def _host_slot(self, url: str) -> threading.BoundedSemaphore:
+        host = urlsplit(url).netloc
+        with self._lock:
+            slot = self._hosts.get(host)
+            if slot is None:
+                slot = threading.BoundedSemaphore(self.host_concurrency)
+                self._hosts[host] = slot
+            return slot
+
+    @contextmanager
+    def stream(self, url: str, timeout: float = 30, headers: Optional[dict] = None) -> Iterator[requests.Response]:
+        """Opens a streamed GET while holding one of the host's download slots.
+
+        Raises:
+            requests.HTTPError: For a non-2xx final status (after retries).
+        """
+        with self._host_slot(url):
+            with self.session.get(url, stream=True, timeout=timeout, headers=headers) as r:
+                with self._lock:
+                    self._requests += 1
+                r.raise_for_status()
+                yield r
+
+    def iter_chunks(
+        self,
+        url: str,
+        timeout: float = 30,
+        cancel: Optional[threading.Event] = None,
+        chunk_size: int = CHUNK_SIZE,
+        progress: Optional[ProgressCallback] = None,
+    ) -> Iterator[bytes]:
+        """Yields the body of `url` chunk by chunk.
+
+        Raises:
+            DownloadCancelled: If `cancel` is set while the body streams.
+        """
+        with self.stream(url, timeout=timeout) as r:
+            yield from self._iter_body(r, cancel, chunk_size, progress)
+
+    def _iter_body(
+        self,
+        r: requests.Response,
+        cancel: Optional[threading.Event],
+        chunk_size: int = CHUNK_SIZE,
+        progress: Optional[ProgressCallback] = None,
+    ) -> Iterator[bytes]:
+        length = r.headers.get("Content-Length")
+        total = int(length) if length and length.isdigit() else None
+        received = 0
+        for chunk in r.iter_content(chunk_size=chunk_size):
+            if cancel is not None and cancel.is_set():
+                raise DownloadCancelled(r.url)
+            if chunk:
+                with self._lock:
+                    self._bytes += len(chunk)
+                received += len(chunk)
+                if progress is not None:
+                    progress(received, total)
+                yield chunk
+        if cancel is not None and cancel.is_set():
+            raise DownloadCancelled(r.url)
+
+    def download(
+        self,
+        url: str,
+        dest: Path,
+        timeout: float = 30,
+        cancel: Optional[threading.Event] = None,
+        progress: Optional[ProgressCallback] = None,
+    ) -> None:
+        """Downloads `url` to `dest`.
+
+        The body is written to a temporary file next to `dest` that only
+        replaces it once complete, so concurrent or failed downloads never
+        leave a truncated file behind.
+        """
+        dest.parent.mkdir(parents=True, exist_ok=True)
+        part = part_path(dest)
+        try:
+            with open(part, "wb") as f:
+                for chunk in self.iter_chunks(url, timeout=timeout, cancel=cancel, progress=progress):
+                    f.write(chunk)
+            os.replace(part, dest)
+        finally:
+            if part.exists():
+                part.unlink()
+
+    def download_if_changed(
+        self,
+        url: str,
+        dest: Path,
+        etag: Optional[str] = None,
+        last_modified: Optional[str] = None,
+        timeout: float = 30,
+    ) -> Optional[Dict[str, Optional[str]]]:
+        """Conditionally downloads `url` to `dest` using stored validators.
+
+        Sends `If-None-Match` / `If-Modified-Since` for the given validators.
+        A `304 Not Modified` leaves `dest` untouched.
+
+        Returns:
+            None if the server reported no change, otherwise the new
+            validators {"etag": ..., "last_modified": ...} of the download.
+        """
+        headers = {}
+        if etag:
+            headers["If-None-Match"] = etag
+        if last_modified:
+            headers["If-Modified-Since"] = last_modified
+
+        dest.parent.mkdir(parents=True, exist_ok=True)
+        part = part_path(dest)
+        try:
+            with self.stream(url, timeout=timeout, headers=headers) as r:
+                if r.status_code == 304:
+                    return None
+                with open(part, "wb") as f:
+                    for chunk in self._iter_body(r, None):
+                        f.write(chunk)
+                validators = {"etag": r.headers.get("ETag"), "last_modified": r.headers.get("Last-Modified")}
+            os.replace(part, dest)
+            return validators
+        finally:
+            if part.exists():
+                part.unlink()
+
+    def stats(self) -> dict:
+        """Returns request and byte counters for monitoring."""
+        with self._lock:
+            return {"requests": self._requests, "bytes": self._bytes, "hosts": len(self._hosts)}
+
+    def close(self) -> None:
+        """Closes all pooled connections."""
+        self.session.close()
+
+
+def race(
+    tasks: Sequence[Callable[[threading.Event], T]],
+    hedge_delay: float,
+    accept: Callable[[T], bool] = lambda result: True,
+) -> T:
+    """Runs tasks as hedged fallbacks and returns the first accepted result.
+
+    Task `i + 1` starts `hedge_delay` seconds after task `i`, or right away
+    if task `i` failed or returned an unaccepted result. Every task gets its
+    own cancel event, which is set once another task has won.
+
+    Args:
+        tasks: Callables taking a cancel event, in order of preference.
+        hedge_delay: Seconds to wait before starting the next task.
+        accept: Decides whether a result counts (e.g. non-empty data).
+
+    Returns:
+        The first accepted result, otherwise the last unaccepted one.
+
+    Raises:
+        Exception: The last error if every task failed.
+    """
+    results: "queue.Queue[tuple]" = queue.Queue()
+    cancels = [threading.Event() for _ in tasks]
+
+    def _run(i: int) -> None:
+        try:
+            results.put((i, tasks[i](cancels[i]), None))
+        except BaseException as e:
+            results.put((i, None, e))
+
+    started = finished = 0
+    fallback: Optional[tuple] = None
+    error: Optional[BaseException] = None
+    while finished < len(tasks):
+        if started == finished and started < len(tasks):
+            threading.Thread(target=_run, args=(started,), name=f"race-{started}", daemon=True).start()
+            started += 1
+        try:
+            timeout = hedge_delay if started < len(tasks) else None
+            i, result, exc = results.get(timeout=timeout)
+        except queue.Empty:
+            # Hedge: the running task is slow, start the next one alongside
+            threading.Thread(target=_run, args=(started,), name=f"race-{started}", daemon=True).start()
+            started += 1
+            continue
+        finished += 1
+        if exc is None and accept(result):
+            for j, cancel in enumerate(cancels):
+                if j != i:
+                    cancel.set()
+            return result
+        if exc is not None:
+            error = exc
+        else:
+            fallback = (result,)
+
+    if fallback is not None:
+        return fallback[0]
+    raise error
+
+
+_client: Optional[HttpClient] = None
+_client_lock = threading.Lock()
+
+
+def get_http_client() -> HttpClient:
+    """Returns the process-wide HTTP client, creating it on first use."""
+    global _client
+    with _client_lock:
+        if _client is None:
+            _client = HttpClient()
+        return _client
+
+
+def close_http_client() -> None:
+    """Closes and forgets the shared client (application shutdown, tests)."""
+    global _client
+    with _client_lock:
+        client, _client = _client, None
+    if client is not None:
+        client.close()
@@ -10,12 +10,17 @@ Authors:
     Lisa Fritsch, Jan Goliasch, Finja Sterner, Menko Hornstein
 """
 from __future__ import annotations
+import argparse
 import sqlite3
+import threading
 from pathlib import Path
-import requests
+from typing import Callable, ContextManager, Dict, Iterable, Iterator, Optional
 import logging
 import time
 
+from app.db import DB_PATH, get_pool
+from app.http_client import HTTP_HEDGE_DELAY, get_http_client, race
+
 # AWS and NOAA URLs for daily data
 STATIONS_URL = "https://noaa-ghcn-pds.s3.amazonaws.com/ghcnd-stations.txt"
 NOA_STATIONS_URL = "https://www.ncei.noaa.gov/pub/data/ghcn/daily/ghcnd-stations.txt"
@@ -25,24 +30,26 @@ NOA_INVENTORY_URL = "https://www.ncei.noaa.gov/pub/data/ghcn/daily/ghcnd-invento
 # Base directory of the project
 BASE_DIR = Path(__file__).resolve().parent.parent
 DATA_DIR = BASE_DIR / "data"
-DB_PATH = BASE_DIR / "weather.sqlite3"
 STATIONS_TXT = DATA_DIR / "ghcnd-stations.txt"
 INVENTORY_TXT = DATA_DIR / "ghcnd-inventory.txt"
 
 
-def main():
-    """Main execution point: Downloads, parses, and imports stations into the DB."""
-    try:
-        download_file(STATIONS_URL, STATIONS_TXT)
-    except Exception as e:
-        logging.warning(f"Primary URL failed: {e}. Trying fallback...")
-        download_file(NOA_STATIONS_URL, STATIONS_TXT)
-        
-    try:
-        download_file(INVENTORY_URL, INVENTORY_TXT)
-    except Exception as e:
-        logging.warning(f"Primary inventory URL failed: {e}. Trying fallback...")
-        download_file(NOA_INVENTORY_URL, INVENTORY_TXT)
+def main(argv: Optional[list] = None):
+    """Main execution point: Downloads, parses, and imports stations into the DB.
+
+    With `--refresh`, conditionally re-downloads both files and applies
+    only the differences to an existing database.
+    """
+    parser = argparse.ArgumentParser(description="Import NOAA station metadata")
+    parser.add_argument("--refresh", action="store_true", help="Conditional refresh with incremental upsert")
+    args = parser.parse_args(argv)
+
+    if args.refresh:
+        refresh_station_metadata()
+        return
+
+    download_with_fallback(STATIONS_URL, NOA_STATIONS_URL, STATIONS_TXT)
+    download_with_fallback(INVENTORY_URL, NOA_INVENTORY_URL, INVENTORY_TXT)
 
     conn = sqlite3.connect(DB_PATH)
     create_schema(conn)
@@ -51,12 +58,13 @@ def main():
     conn.close()
 
 
-def download_file(url: str, dest: Path) -> None:
+def download_file(url: str, dest: Path, cancel: Optional[threading.Event] = None) -> None:
     """Downloads a file from a given URL to a defined local destination.
 
     Args:
         url: The source URL to download.
         dest: The local path where the file will be saved.
+        cancel: Optional event that aborts the download once set.
 
     Raises:
         Exception: If the HTTP request or file writing fails.
@@ -68,12 +76,7 @@ def download_file(url: str, dest: Path) -> None:
     print(f"Downloading {url} to {dest}...", flush=True)
     start_t = time.time()
     try:
-        with requests.get(url, stream=True, timeout=30) as r:
-            r.raise_for_status()
-            with open(dest, "wb") as f:
-                for chunk in r.iter_content(chunk_size=1024 * 1024):
-                    if chunk:
-                        f.write(chunk)
+        get_http_client().download(url, dest, timeout=30, cancel=cancel)
         elapsed = time.time() - start_t
         size_mb = dest.stat().st_size / (1024 * 1024)
         print(f"[OK] Downloaded {dest} in {elapsed:.2f}s (Size: {size_mb:.2f} MB).", flush=True)
@@ -82,6 +85,32 @@ def download_file(url: str, dest: Path) -> None:
         raise e
 
 
+def download_with_fallback(url: str, fallback_url: str, dest: Path) -> None:
+    """Downloads `dest` from the primary mirror, falling back to the second one.
+
+    With `HTTP_HEDGE_DELAY` set, the fallback mirror is started as soon as
+    the primary has not finished within the delay, and the slower download
+    is cancelled.
+
+    Raises:
+        Exception: If both mirrors fail.
+    """
+    if HTTP_HEDGE_DELAY > 0:
+        race(
+            [
+                lambda cancel: download_file(url, dest, cancel=cancel),
+                lambda cancel: download_file(fallback_url, dest, cancel=cancel),
+            ],
+            HTTP_HEDGE_DELAY,
+        )
+        return
+    try:
+        download_file(url, dest)
+    except Exception as e:
+        logging.warning(f"Primary URL {url} failed: {e}. Trying fallback...")
+        download_file(fallback_url, dest)
+
+
 def create_schema(conn: sqlite3.Connection) -> None:
     """Creates the necessary tables and indices for storing weather stations.
 
@@ -105,7 +134,16 @@ def create_schema(conn: sqlite3.Connection) -> None:
         "CREATE INDEX IF NOT EXISTS idx_stations_lat ON stations(lat);")
     conn.execute(
         "CREATE INDEX IF NOT EXISTS idx_stations_lon ON stations(lon);")
-        
+
+    # R*Tree spatial index over the station coordinates (id = stations.rowid)
+    conn.execute("""
+    CREATE VIRTUAL TABLE IF NOT EXISTS stations_rtree USING rtree(
+        id,
+        min_lat, max_lat,
+        min_lon, max_lon
+    );
+    """)
+
     conn.execute("""
     CREATE TABLE IF NOT EXISTS station_inventory (
         station_id TEXT NOT NULL,
@@ -117,6 +155,31 @@ def create_schema(conn: sqlite3.Connection) -> None:
     """)
     conn.execute(
         "CREATE INDEX IF NOT EXISTS idx_inventory_station ON station_inventory(station_id);")
+
+    # Per-station TMAX/TMIN coverage, materialized from station_inventory
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS station_coverage (
+        station_id TEXT PRIMARY KEY,
+        min_year INTEGER,
+        max_year INTEGER,
+        tmax_start INTEGER,
+        tmax_end INTEGER,
+        tmin_start INTEGER,
+        tmin_end INTEGER
+    );
+    """)
+
+    # HTTP validators of the downloaded metadata files (conditional refresh)
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS source_files (
+        name TEXT PRIMARY KEY,
+        url TEXT NOT NULL,
+        etag TEXT,
+        last_modified TEXT,
+        checked_at REAL,
+        changed_at REAL
+    );
+    """)
     conn.commit()
 
 
@@ -142,6 +205,29 @@ def parse_station_line(line: str) -> dict:
     }
 
 
+def iter_station_rows(stations_txt: Path) -> Iterator[tuple]:
+    """Yields one `stations` row tuple per non-empty line of ghcnd-stations.txt."""
+    with open(stations_txt, "r", encoding="utf-8", errors="replace") as f:
+        for line in f:
+            line = line.rstrip("\n")
+            if not line.strip():
+                continue
+
+            d = parse_station_line(line)
+
+            yield (
+                d["station_id"],
+                d["lat"],
+                d["lon"],
+                d["elevation_m"],
+                d["state"],
+                d["name"],
+                d["gsn_flag"],
+                d["hcn_crn_flag"],
+                d["wmo_id"],
+            )
+
+
 def import_stations(conn: sqlite3.Connection, stations_txt: Path) -> None:
     """Reads the local stations file and imports the records into the database.
 
@@ -163,43 +249,57 @@ def import_stations(conn: sqlite3.Connection, stations_txt: Path) -> None:
     batch: list[tuple] = []
     count = 0
 
-    with open(stations_txt, "r", encoding="utf-8", errors="replace") as f:
-        for line in f:
-            line = line.rstrip("\n")
-            if not line.strip():
-                continue
+    for row in iter_station_rows(stations_txt):
+        batch.append(row)
 
-            d = parse_station_line(line)
-
-            row = (
-                d["station_id"],
-                d["lat"],
-                d["lon"],
-                d["elevation_m"],
-                d["state"],
-                d["name"],
-                d["gsn_flag"],
-                d["hcn_crn_flag"],
-                d["wmo_id"],
-            )
-
-            batch.append(row)
-
-            if len(batch) >= 1000:
-                cursor.executemany(insert_sql, batch)
-                count += len(batch)
-                print(f"  Inserted {count} stations...", end="\r", flush=True)
-                batch = []
+        if len(batch) >= 1000:
+            cursor.executemany(insert_sql, batch)
+            count += len(batch)
+            print(f"  Inserted {count} stations...", end="\r", flush=True)
+            batch = []
 
     if batch:
         cursor.executemany(insert_sql, batch)
         count += len(batch)
         print(f"  Inserted {count} stations...", end="\r", flush=True)
 
+    rebuild_station_rtree(conn)
     conn.commit()
     print(f"[OK] Imported {count} stations.", flush=True)
 
 
+def rebuild_station_rtree(conn: sqlite3.Connection) -> None:
+    """Rebuilds the R*Tree spatial index from the current stations table.
+
+    Each station is stored as a degenerate box (min == max) keyed by the
+    rowid of its row in `stations`. Does not commit, so it can run inside
+    the transaction of the import that changed the stations.
+
+    Args:
+        conn: The active SQLite database connection.
+    """
+    conn.execute("DELETE FROM stations_rtree;")
+    conn.execute("""
+    INSERT INTO stations_rtree (id, min_lat, max_lat, min_lon, max_lon)
+    SELECT rowid, lat, lat, lon, lon FROM stations;
+    """)
+
+
+def iter_inventory_rows(inventory_txt: Path) -> Iterator[tuple]:
+    """Yields (station_id, element, start_year, end_year) for TMAX/TMIN lines of ghcnd-inventory.txt."""
+    with open(inventory_txt, "r", encoding="utf-8", errors="replace") as f:
+        for line in f:
+            line = line.rstrip("\n")
+            if len(line) < 45:
+                continue
+
+            element = line[31:35].strip()
+            if element not in ("TMAX", "TMIN"):
+                continue
+
+            yield (line[0:11].strip(), element, int(line[36:40].strip()), int(line[41:45].strip()))
+
+
 def import_inventory(conn: sqlite3.Connection, inventory_txt: Path) -> None:
     """Reads the local inventory file and imports the records into the database.
     Only imports TMAX and TMIN elements.
@@ -222,37 +322,247 @@ def import_inventory(conn: sqlite3.Connection, inventory_txt: Path) -> None:
     batch: list[tuple] = []
     count = 0
 
-    with open(inventory_txt, "r", encoding="utf-8", errors="replace") as f:
-        for line in f:
-            line = line.rstrip("\n")
-            if len(line) < 45:
-                continue
-
-            element = line[31:35].strip()
-            if element not in ("TMAX", "TMIN"):
-                continue
-
-            station_id = line[0:11].strip()
-            start_year = int(line[36:40].strip())
-            end_year = int(line[41:45].strip())
-
-            batch.append((station_id, element, start_year, end_year))
+    for row in iter_inventory_rows(inventory_txt):
+        batch.append(row)
 
-            if len(batch) >= 5000:
-                cursor.executemany(insert_sql, batch)
-                count += len(batch)
-                print(f"  Inserted {count} inventory records...", end="\r", flush=True)
-                batch = []
+        if len(batch) >= 5000:
+            cursor.executemany(insert_sql, batch)
+            count += len(batch)
+            print(f"  Inserted {count} inventory records...", end="\r", flush=True)
+            batch = []
 
     if batch:
         cursor.executemany(insert_sql, batch)
         count += len(batch)
         print(f"  Inserted {count} inventory records...", end="\r", flush=True)
 
+    rebuild_station_coverage(conn)
     conn.commit()
     print(f"[OK] Imported {count} inventory records.", flush=True)
 
 
+# Per-station coverage aggregate; {where} optionally limits it to one station
+_COVERAGE_SQL = """
+    INSERT INTO station_coverage (
+        station_id, min_year, max_year, tmax_start, tmax_end, tmin_start, tmin_end
+    )
+    SELECT station_id,
+           MIN(start_year),
+           MAX(end_year),
+           MAX(CASE WHEN element = 'TMAX' THEN start_year END),
+           MAX(CASE WHEN element = 'TMAX' THEN end_year END),
+           MAX(CASE WHEN element = 'TMIN' THEN start_year END),
+           MAX(CASE WHEN element = 'TMIN' THEN end_year END)
+    FROM station_inventory
+    {where}
+    GROUP BY station_id;
+"""
+
+
+def rebuild_station_coverage(conn: sqlite3.Connection, station_ids: Optional[Iterable[str]] = None) -> None:
+    """Materializes the per-station year coverage from station_inventory.
+
+    Stores the overall min/max year and the TMAX/TMIN year ranges per station,
+    so searches can filter and return years without per-row subqueries.
+    Does not commit, so it stays consistent with the inventory import.
+
+    Args:
+        conn: The active SQLite database connection.
+        station_ids: Only recompute these stations (incremental refresh);
+            None rebuilds the whole table.
+    """
+    if station_ids is None:
+        conn.execute("DELETE FROM station_coverage;")
+        conn.execute(_COVERAGE_SQL.format(where=""))
+        return
+
+    params = [(sid,) for sid in station_ids]
+    conn.executemany("DELETE FROM station_coverage WHERE station_id = ?;", params)
+    conn.executemany(_COVERAGE_SQL.format(where="WHERE station_id = ?"), params)
+
+
+STATION_COLUMNS = "station_id, lat, lon, elevation_m, state, name, gsn_flag, hcn_crn_flag, wmo_id"
+
+
+def read_source_files(conn: sqlite3.Connection) -> Dict[str, tuple]:
+    """Returns the stored (url, etag, last_modified) of every metadata file by name."""
+    return {
+        r[0]: tuple(r[1:])
+        for r in conn.execute("SELECT name, url, etag, last_modified FROM source_files;")
+    }
+
+
+def fetch_if_changed(
+    known: Optional[tuple],
+    url: str,
+    fallback_url: str,
+    dest: Path,
+) -> Optional[tuple]:
+    """Conditionally re-downloads a metadata file, primary mirror first.
+
+    The stored ETag/Last-Modified of `dest` (`known`, see `read_source_files`)
+    are only sent to the mirror they came from and only while the local copy
+    still exists. Needs no database connection, so no lock is held while
+    downloading.
+
+    Returns:
+        None if the file is unchanged, otherwise the `source_files` row to
+        store once the new content has been applied (see `save_source_file`).
+
+    Raises:
+        Exception: If both mirrors fail.
+    """
+    error: Optional[Exception] = None
+    for candidate in (url, fallback_url):
+        etag = last_modified = None
+        if known is not None and known[0] == candidate and dest.exists():
+            etag, last_modified = known[1], known[2]
+        try:
+            validators = get_http_client().download_if_changed(candidate, dest, etag, last_modified)
+        except Exception as e:
+            print(f"Refresh of {dest.name} from {candidate} failed: {e}", flush=True)
+            error = e
+            continue
+
+        if validators is None:
+            print(f"[OK] {dest.name} not modified.", flush=True)
+            return None
+        now = time.time()
+        print(f"[OK] {dest.name} changed, downloaded from {candidate}.", flush=True)
+        return (dest.name, candidate, validators["etag"], validators["last_modified"], now, now)
+
+    raise error
+
+
+def save_source_file(conn: sqlite3.Connection, source: tuple) -> None:
+    """Stores the validators of an applied metadata download. Does not commit."""
+    conn.execute("""
+    INSERT OR REPLACE INTO source_files (name, url, etag, last_modified, checked_at, changed_at)
+    VALUES (?, ?, ?, ?, ?, ?);
+    """, source)
+
+
+def touch_source_file(conn: sqlite3.Connection, name: str) -> None:
+    """Records that a metadata file was checked and found unchanged. Does not commit."""
+    conn.execute("UPDATE source_files SET checked_at = ? WHERE name = ?;", (time.time(), name))
+
+
+def upsert_stations_diff(conn: sqlite3.Connection, rows: Iterable[tuple]) -> Dict[str, int]:
+    """Applies the parsed rows of a new ghcnd-stations.txt as a diff against the stations table.
+
+    Only added, changed and removed stations are written, and the R*Tree
+    entries of exactly those rows are updated. Does not commit.
+
+    Returns:
+        Counts of added, updated, removed and unchanged stations.
+    """
+    existing = {r[0]: tuple(r) for r in conn.execute(f"SELECT {STATION_COLUMNS} FROM stations;")}
+    incoming = {row[0]: row for row in rows}
+
+    added = [row for sid, row in incoming.items() if sid not in existing]
+    updated = [row for sid, row in incoming.items() if sid in existing and existing[sid] != row]
+    removed = [(sid,) for sid in existing if sid not in incoming]
+
+    conn.executemany(
+        "DELETE FROM stations_rtree WHERE id = (SELECT rowid FROM stations WHERE station_id = ?);", removed)
+    conn.executemany("DELETE FROM stations WHERE station_id = ?;", removed)
+    conn.executemany("""
+    UPDATE stations SET lat = ?, lon = ?, elevation_m = ?, state = ?, name = ?,
+        gsn_flag = ?, hcn_crn_flag = ?, wmo_id = ?
+    WHERE station_id = ?;
+    """, [row[1:] + row[:1] for row in updated])
+    conn.executemany(f"INSERT INTO stations ({STATION_COLUMNS}) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?);", added)
+    conn.executemany("""
+    INSERT OR REPLACE INTO stations_rtree (id, min_lat, max_lat, min_lon, max_lon)
+    SELECT rowid, lat, lat, lon, lon FROM stations WHERE station_id = ?;
+    """, [row[:1] for row in added + updated])
+
+    return {
+        "added": len(added),
+        "updated": len(updated),
+        "removed": len(removed),
+        "unchanged": len(existing) - len(updated) - len(removed),
+    }
+
+
+def upsert_inventory_diff(conn: sqlite3.Connection, rows: Iterable[tuple]) -> Dict[str, int]:
+    """Applies the parsed rows of a new ghcnd-inventory.txt as a diff against station_inventory.
+
+    Only changed (station, element) ranges are written, and station_coverage
+    is recomputed for the affected stations only. Does not commit.
+
+    Returns:
+        Counts of added, updated, removed and unchanged inventory rows.
+    """
+    existing = {
+        (r[0], r[1]): (r[2], r[3])
+        for r in conn.execute("SELECT station_id, element, start_year, end_year FROM station_inventory;")
+    }
+    incoming = {(r[0], r[1]): (r[2], r[3]) for r in rows}
+
+    changed = [key + years for key, years in incoming.items() if existing.get(key) != years]
+    removed = [key for key in existing if key not in incoming]
+
+    conn.executemany("DELETE FROM station_inventory WHERE station_id = ? AND element = ?;", removed)
+    conn.executemany("""
+    INSERT OR REPLACE INTO station_inventory (station_id, element, start_year, end_year)
+    VALUES (?, ?, ?, ?);
+    """, changed)
+    rebuild_station_coverage(conn, sorted({r[0] for r in changed} | {k[0] for k in removed}))
+
+    added = sum(1 for r in changed if r[:2] not in existing)
+    return {
+        "added": added,
+        "updated": len(changed) - added,
+        "removed": len(removed),
+        "unchanged": len(existing) - (len(changed) - added) - len(removed),
+    }
+
+
+def refresh_station_metadata(
+    writer: Optional[Callable[[], ContextManager[sqlite3.Connection]]] = None,
+) -> dict:
+    """Refreshes stations and inventory from NOAA if the files changed.
+
+    Sends conditional requests for both files and parses changed files
+    without holding a connection; `writer` (default: the pool's single
+    writer) is only taken to apply the incremental diffs, rebuild R*Tree
+    and coverage and store the validators. Each file is committed together
+    with its validators, so a failed apply is retried by the next refresh.
+
+    Returns:
+        {"stations": counts | None, "inventory": counts | None, "changed": bool},
+        where None means the file was not modified.
+    """
+    writer = writer or get_pool().writer
+    with writer() as conn:
+        create_schema(conn)
+        known = read_source_files(conn)
+        conn.commit()
+    result: dict = {"stations": None, "inventory": None}
+
+    for key, url, fallback_url, dest, parse, apply in (
+        ("stations", STATIONS_URL, NOA_STATIONS_URL, STATIONS_TXT, iter_station_rows, upsert_stations_diff),
+        ("inventory", INVENTORY_URL, NOA_INVENTORY_URL, INVENTORY_TXT, iter_inventory_rows, upsert_inventory_diff),
+    ):
+        source = fetch_if_changed(known.get(dest.name), url, fallback_url, dest)
+        rows = None if source is None else list(parse(dest))
+        with writer() as conn:
+            if source is None:
+                touch_source_file(conn, dest.name)
+            else:
+                result[key] = apply(conn, rows)
+                save_source_file(conn, source)
+            conn.commit()
+
+    result["changed"] = any(
+        counts is not None and (counts["added"] or counts["updated"] or counts["removed"])
+        for counts in (result["stations"], result["inventory"])
+    )
+    print(f"[OK] Station metadata refresh: {result}", flush=True)
+    return result
+
+
 def ensure_stations_imported() -> dict:
     """Checks the database for existing stations and initiates import if empty.
 
@@ -266,40 +576,42 @@ def ensure_stations_imported() -> dict:
 
     DATA_DIR.mkdir(parents=True, exist_ok=True)
 
-    conn = sqlite3.connect(DB_PATH)
-    try:
+    with get_pool().writer() as conn:
         create_schema(conn)
 
         cur = conn.execute("SELECT COUNT(*) FROM stations;")
         count = int(cur.fetchone()[0])
-        
+
+        if count > 0:
+            # Databases created before the spatial index existed need a one-time build
+            cur = conn.execute("SELECT COUNT(*) FROM stations_rtree;")
+            if int(cur.fetchone()[0]) != count:
+                print("Rebuilding stations R*Tree index...", flush=True)
+                rebuild_station_rtree(conn)
+                conn.commit()
+
         cur = conn.execute("SELECT COUNT(*) FROM station_inventory;")
         inv_count = int(cur.fetchone()[0])
 
         if count > 0 and inv_count > 0:
+            cur = conn.execute("SELECT COUNT(*) FROM station_coverage;")
+            if int(cur.fetchone()[0]) == 0:
+                print("Building station coverage table...", flush=True)
+                rebuild_station_coverage(conn)
+                conn.commit()
             return {"imported": False, "stations_count": count, "inventory_count": inv_count}
 
         if count == 0:
-            try:
-                download_file(STATIONS_URL, STATIONS_TXT)
-            except Exception as e:
-                print(f"Primary URL failed: {e}. Trying fallback...", flush=True)
-                download_file(NOA_STATIONS_URL, STATIONS_TXT)
+            download_with_fallback(STATIONS_URL, NOA_STATIONS_URL, STATIONS_TXT)
             import_stations(conn, STATIONS_TXT)
             
         if inv_count == 0:
-            try:
-                download_file(INVENTORY_URL, INVENTORY_TXT)
-            except Exception as e:
-                print(f"Primary inventory URL failed: {e}. Trying fallback...", flush=True)
-                download_file(NOA_INVENTORY_URL, INVENTORY_TXT)
+            download_with_fallback(INVENTORY_URL, NOA_INVENTORY_URL, INVENTORY_TXT)
             import_inventory(conn, INVENTORY_TXT)
 
         cur = conn.execute("SELECT COUNT(*) FROM stations;")
         count2 = int(cur.fetchone()[0])
         return {"imported": True, "stations_count": count2}
-    finally:
-        conn.close()
 
 
 if __name__ == "__main__":
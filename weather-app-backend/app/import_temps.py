@@ -8,25 +8,49 @@ Authors:
     Lisa Fritsch, Jan Goliasch, Finja Sterner, Menko Hornstein
 """
 from __future__ import annotations
+import os
+import re
 import sqlite3
+import threading
+import zlib
 from pathlib import Path
-from typing import Tuple, List, Optional
-import requests
+from typing import Dict, Iterable, Iterator, Tuple, List, Optional
 import pandas as pd
 import numpy as np
 import time
 import logging
 
+from app.daily_store import daily_arrays_from_frame, daily_frame, load_daily, save_daily
+from app.db import DB_PATH
+from app.http_client import HTTP_HEDGE_DELAY, ProgressCallback, get_http_client, part_path, race
+from app.parse_pool import ParsePool, get_parse_pool
+from app.process_lock import FETCH_LOCK_TIMEOUT, holding
+from app.progress import report as report_progress
+
 S3_BASE_URL = "https://noaa-ghcn-pds.s3.amazonaws.com"
 DLY_BASE_URL = "https://www.ncei.noaa.gov/pub/data/ghcn/daily/all"
 BASE_DIR = Path(__file__).resolve().parent.parent
 DATA_DIR = BASE_DIR / "data" / "dly"
 S3_DATA_DIR = BASE_DIR / "data" / "s3_csv"
-DB_PATH = BASE_DIR / "weather.sqlite3"
 
 MISSING = -9999
 
-def download_from_ncei(station_id: str, dest: Path) -> None:
+# Year bounds standing in for an open start/end when tracking cache coverage
+COVERAGE_MIN_YEAR = 0
+COVERAGE_MAX_YEAR = 9999
+
+
+class StationDataUnavailable(FileNotFoundError):
+    """Raised when neither S3 nor NCEI delivered temperature data for a station.
+
+    Covers failed downloads as well as stations without any TMAX/TMIN
+    values: either way nothing may be recorded as cached coverage.
+    """
+
+# Years aggregated per block when periods are streamed
+STREAM_BLOCK_YEARS = int(os.getenv("STREAM_BLOCK_YEARS", "10"))
+
+def download_from_ncei(station_id: str, dest: Path, cancel: Optional[threading.Event] = None) -> None:
     """Downloads the .dly file from NCEI for the given station."""
     dest.parent.mkdir(parents=True, exist_ok=True)
     if dest.exists() and dest.stat().st_size > 0:
@@ -34,14 +58,20 @@ def download_from_ncei(station_id: str, dest: Path) -> None:
 
     url = f"{DLY_BASE_URL}/{station_id}.dly"
     print(f"Downloading {url} -> {dest}")
-    with requests.get(url, stream=True, timeout=60) as r:
-        r.raise_for_status()
-        with open(dest, "wb") as f:
-            for chunk in r.iter_content(chunk_size=1024 * 1024):
-                if chunk:
-                    f.write(chunk)
-
-def download_from_s3(station_id: str, dest: Path) -> None:
+    get_http_client().download(url, dest, timeout=60, cancel=cancel, progress=_download_progress(station_id, "dly"))
+
+def _download_progress(station_id: str, source: str, interval: float = 0.2) -> ProgressCallback:
+    """Reports download progress of a station file, at most every `interval` seconds."""
+    last = [0.0]
+
+    def _report(received: int, total: Optional[int]) -> None:
+        now = time.monotonic()
+        if now - last[0] >= interval or received == total:
+            last[0] = now
+            report_progress(station_id, "download", source=source, bytes=received, total=total)
+    return _report
+
+def download_from_s3(station_id: str, dest: Path, cancel: Optional[threading.Event] = None) -> None:
     """Downloads the compressed CSV file from AWS S3 for the given station."""
     dest.parent.mkdir(parents=True, exist_ok=True)
     if dest.exists() and dest.stat().st_size > 0:
@@ -49,227 +79,344 @@ def download_from_s3(station_id: str, dest: Path) -> None:
 
     url = f"{S3_BASE_URL}/csv.gz/by_station/{station_id}.csv.gz"
     print(f"Downloading {url} -> {dest}")
-    with requests.get(url, stream=True, timeout=30) as r:
-        r.raise_for_status()
-        with open(dest, "wb") as f:
-            for chunk in r.iter_content(chunk_size=1024 * 1024):
-                if chunk:
-                    f.write(chunk)
-
-def _load_dly_data(station_id: str, start_year: Optional[int], end_year: Optional[int], ignore_qflag: bool) -> pd.DataFrame:
+    get_http_client().download(url, dest, timeout=30, cancel=cancel, progress=_download_progress(station_id, "s3"))
+
+# Fixed-width layout of a .dly record: ID(11) YEAR(4) MONTH(2) ELEMENT(4),
+# then 31 x [VALUE(5) MFLAG(1) QFLAG(1) SFLAG(1)]
+DLY_RECORD_LEN = 269
+DLY_DAYS = 31
+_DLY_VALUE_OFFSETS = 21 + 8 * np.arange(DLY_DAYS)
+_DLY_DIGIT_WEIGHTS = np.array([10000, 1000, 100, 10, 1], dtype=np.int64)
+_DLY_ELEMENTS = (b"TMAX", b"TMIN")
+
+
+def _parse_dly_bytes(
+    data: bytes,
+    start_year: Optional[int],
+    end_year: Optional[int],
+    ignore_qflag: bool,
+) -> pd.DataFrame:
+    """Parses raw .dly bytes into the long (one row per day) DataFrame.
+
+    Lines that are not TMAX/TMIN or outside the year range are skipped before
+    any field is decoded. The 31 value/flag slots of the remaining lines are
+    decoded with NumPy byte arithmetic instead of `read_fwf` + `melt`.
+
+    The result is the same frame the former `read_fwf` implementation
+    produced: columns station_id, year, month, element, day_raw, value,
+    qflag, with rows ordered day by day and the melt index preserved.
+    """
+    lines = []
+    for line in data.split(b"\n"):
+        if line[17:21] not in _DLY_ELEMENTS:
+            continue
+        if start_year or end_year:
+            year = int(line[11:15])
+            if start_year and year < start_year:
+                continue
+            if end_year and year > end_year:
+                continue
+        lines.append(line.rstrip(b"\r").ljust(DLY_RECORD_LEN)[:DLY_RECORD_LEN])
+
+    columns = ["station_id", "year", "month", "element", "day_raw", "value", "qflag"]
+    if not lines:
+        return pd.DataFrame(columns=columns)
+
+    n = len(lines)
+    raw = np.frombuffer(b"".join(lines), dtype=np.uint8).reshape(n, DLY_RECORD_LEN)
+
+    # VALUE fields as (n, 31, 5) bytes: right-aligned digits with optional '-'
+    value_bytes = raw[:, _DLY_VALUE_OFFSETS[:, None] + np.arange(5)]
+    is_digit = (value_bytes >= ord("0")) & (value_bytes <= ord("9"))
+    digits = np.where(is_digit, value_bytes - ord("0"), 0).astype(np.int64)
+    values = digits @ _DLY_DIGIT_WEIGHTS
+    values = np.where((value_bytes == ord("-")).any(axis=2), -values, values)
+
+    qflag_bytes = raw[:, _DLY_VALUE_OFFSETS + 6]
+
+    # Day-major order, exactly like DataFrame.melt over v1..v31
+    values_long = values.T.ravel()
+    qflag_long = qflag_bytes.T.ravel()
+    keep = values_long != MISSING
+    if ignore_qflag:
+        keep &= qflag_long == ord(" ")
+    positions = np.flatnonzero(keep)
+    line_idx = positions % n
+    day_idx = positions // n
+
+    qflag = np.full(len(positions), np.nan, dtype=object)
+    flagged = qflag_long[positions] != ord(" ")
+    qflag[flagged] = [chr(c) for c in qflag_long[positions][flagged]]
+
+    ids = np.array([l[0:11].decode("ascii").strip() for l in lines], dtype=object)
+    elements = np.array([l[17:21].decode("ascii") for l in lines], dtype=object)
+    years = np.array([int(l[11:15]) for l in lines], dtype=np.int64)
+    months = np.array([int(l[15:17]) for l in lines], dtype=np.int64)
+    day_names = np.array([f"v{i}" for i in range(1, DLY_DAYS + 1)], dtype=object)
+
+    return pd.DataFrame(
+        {
+            "station_id": ids[line_idx],
+            "year": years[line_idx],
+            "month": months[line_idx],
+            "element": elements[line_idx],
+            "day_raw": day_names[day_idx],
+            "value": values_long[positions],
+            "qflag": qflag,
+        },
+        index=pd.Index(positions),
+    )
+
+
+def _load_dly_data(
+    station_id: str,
+    start_year: Optional[int],
+    end_year: Optional[int],
+    ignore_qflag: bool,
+    cancel: Optional[threading.Event] = None,
+) -> pd.DataFrame:
     """Loads and parses the fixed-width .dly file into a pandas DataFrame."""
     dly_path = DATA_DIR / f"{station_id}.dly"
     try:
-        download_from_ncei(station_id, dly_path)
+        download_from_ncei(station_id, dly_path, cancel=cancel)
     except Exception as e:
         print(f"NCEI Download failed: {e}")
         return pd.DataFrame()
 
-    colspecs = [(0, 11), (11, 15), (15, 17), (17, 21)]
-    names = ["station_id", "year", "month", "element"]
-    
-    for i in range(1, 32):
-        start = 21 + (i - 1) * 8
-        colspecs.append((start, start + 5))      
-        colspecs.append((start + 6, start + 7)) 
-        names.append(f"v{i}")
-        names.append(f"q{i}")
-
     try:
-        df = pd.read_fwf(
-            dly_path, 
-            colspecs=colspecs, 
-            names=names, 
-            header=None,
-            dtype={"station_id": str, "year": int, "month": int, "element": str}
-        )
+        data = dly_path.read_bytes()
     except Exception as e:
         print(f"Error reading {dly_path}: {e}")
         return pd.DataFrame()
 
-    if df.empty:
+    if not data:
         return pd.DataFrame()
 
-    if start_year:
-        df = df[df["year"] >= start_year]
-    if end_year:
-        df = df[df["year"] <= end_year]
-
-    df = df[df["element"].isin(["TMAX", "TMIN"])]
-
-    id_vars = ["station_id", "year", "month", "element"]
-    val_vars = [f"v{i}" for i in range(1, 32)]
-    df_v = df.melt(id_vars=id_vars, value_vars=val_vars, var_name="day_raw", value_name="value")
-    
-    q_vars = [f"q{i}" for i in range(1, 32)]
-    df_q = df.melt(id_vars=id_vars, value_vars=q_vars, var_name="day_q_raw", value_name="qflag")
-    
-    df_v["qflag"] = df_q["qflag"]
-    df_v = df_v[df_v["value"] != MISSING]
-    
-    if ignore_qflag:
-        mask_valid = df_v["qflag"].isna() | (df_v["qflag"].astype(str).str.strip() == "")
-        df_v = df_v[mask_valid]
-    
-    return df_v
+    return _parse_dly_bytes(data, start_year, end_year, ignore_qflag)
 
-def _load_s3_data(station_id: str, start_year: Optional[int], end_year: Optional[int], ignore_qflag: bool) -> pd.DataFrame:
-    """Loads and parses the compressed .csv.gz file from S3 into a pandas DataFrame."""
-    csv_path = S3_DATA_DIR / f"{station_id}.csv.gz"
-    
+# Read size for the streamed csv.gz (compressed bytes)
+S3_CHUNK_SIZE = 256 * 1024
+
+# One S3 row: ID,YYYYMMDD,ELEMENT,VALUE,MFLAG,QFLAG,SFLAG,OBSTIME.
+# Only TMAX/TMIN rows match; groups are year, month, day, element, value, qflag.
+_S3_TEMP_ROW = re.compile(
+    rb"^[^,\n]*,(\d{4})(\d\d)(\d\d),(TMAX|TMIN),(-?\d+),[^,\n]*,([^,\n]*),", re.MULTILINE)
+
+
+def _iter_s3_chunks(station_id: str, dest: Path, cancel: Optional[threading.Event] = None) -> Iterator[bytes]:
+    """Yields the compressed csv.gz of a station chunk by chunk.
+
+    Uses the cached file in `S3_DATA_DIR` if there is one. Otherwise the
+    chunks are yielded as they come off the network and written to a
+    `.part` file at the same time, which only replaces `dest` once the
+    download is complete.
+    """
+    if dest.exists() and dest.stat().st_size > 0:
+        with open(dest, "rb") as f:
+            while True:
+                chunk = f.read(S3_CHUNK_SIZE)
+                if not chunk:
+                    return
+                yield chunk
+
+    dest.parent.mkdir(parents=True, exist_ok=True)
+    part = part_path(dest)
+    url = f"{S3_BASE_URL}/csv.gz/by_station/{station_id}.csv.gz"
+    print(f"Streaming {url} -> {dest}")
+    report_progress(station_id, "s3", url=url)
+    progress = _download_progress(station_id, "s3")
     try:
-        download_from_s3(station_id, csv_path)
-    except Exception as e:
-        print(f"S3 Download failed: {e}")
-        if csv_path.exists() and csv_path.stat().st_size == 0:
-             csv_path.unlink()
-        raise e 
+        with open(part, "wb") as f:
+            for chunk in get_http_client().iter_chunks(
+                url, timeout=30, cancel=cancel, chunk_size=S3_CHUNK_SIZE, progress=progress
+            ):
+                f.write(chunk)
+                yield chunk
+        part.replace(dest)
+    finally:
+        if part.exists():
+            part.unlink()
+
+
+def _parse_s3_stream(
+    station_id: str,
+    chunks: Iterable[bytes],
+    start_year: Optional[int],
+    end_year: Optional[int],
+    ignore_qflag: bool,
+) -> pd.DataFrame:
+    """Decompresses and filters a csv.gz stream into compact typed arrays.
+
+    Every decompressed block is scanned for TMAX/TMIN rows; other elements,
+    out-of-range years and (optionally) flagged rows are dropped while still
+    bytes. Only the surviving rows are converted, so memory grows with the
+    number of kept temperature values, not with the size of the file.
+    """
+    first = b"%04d" % start_year if start_year else None
+    last = b"%04d" % end_year if end_year else None
+
+    years: List[np.ndarray] = []
+    months: List[np.ndarray] = []
+    days: List[np.ndarray] = []
+    is_tmax: List[np.ndarray] = []
+    values: List[np.ndarray] = []
+    qflags: List[np.ndarray] = []
+
+    def scan(block: bytes) -> None:
+        rows = _S3_TEMP_ROW.findall(block)
+        if not rows:
+            return
+        arr = np.array(rows, dtype="S6")
+        keep = np.ones(len(arr), dtype=bool)
+        if first:
+            keep &= arr[:, 0] >= first
+        if last:
+            keep &= arr[:, 0] <= last
+        qflag = np.char.strip(arr[:, 5])
+        if ignore_qflag:
+            keep &= qflag == b""
+        arr = arr[keep]
+        if len(arr):
+            years.append(arr[:, 0].astype(np.int16))
+            months.append(arr[:, 1].astype(np.int8))
+            days.append(arr[:, 2].astype(np.int8))
+            is_tmax.append(arr[:, 3] == b"TMAX")
+            values.append(arr[:, 4].astype(np.int16))
+            qflags.append(qflag[keep].astype("S1"))
+
+    decomp = zlib.decompressobj(16 + zlib.MAX_WBITS)
+    tail = b""
+    for chunk in chunks:
+        while chunk:
+            data = tail + decomp.decompress(chunk)
+            cut = data.rfind(b"\n") + 1
+            scan(data[:cut])
+            tail = data[cut:]
+            # Concatenated gzip members continue in a fresh decompressor
+            chunk = decomp.unused_data
+            if chunk:
+                decomp = zlib.decompressobj(16 + zlib.MAX_WBITS)
+    scan(tail + decomp.flush())
+
+    if not values:
+        return pd.DataFrame()
+
+    tmax = np.concatenate(is_tmax)
+    return pd.DataFrame({
+        "station_id": station_id,
+        "year": np.concatenate(years),
+        "month": np.concatenate(months),
+        "element": np.where(tmax, "TMAX", "TMIN").astype(object),
+        "value": np.concatenate(values).astype(np.float64),
+        "day": np.concatenate(days),
+        "qflag": np.char.decode(np.concatenate(qflags), "ascii").astype(object),
+    })
+
 
-    names = ["station_id", "date", "element", "value", "mflag", "qflag", "sflag", "obstime"]
-    
+def _load_s3_data(
+    station_id: str,
+    start_year: Optional[int],
+    end_year: Optional[int],
+    ignore_qflag: bool,
+    cancel: Optional[threading.Event] = None,
+) -> pd.DataFrame:
+    """Streams the compressed .csv.gz file from S3 into a pandas DataFrame."""
+    csv_path = S3_DATA_DIR / f"{station_id}.csv.gz"
     try:
-        df = pd.read_csv(csv_path, names=names, header=None, usecols=["station_id", "date", "element", "value", "qflag"], dtype={"station_id": str, "date": str, "element": str, "value": float})
+        chunks = _iter_s3_chunks(station_id, csv_path, cancel=cancel)
+        return _parse_s3_stream(station_id, chunks, start_year, end_year, ignore_qflag)
     except Exception as e:
-        print(f"Error reading S3 CSV {csv_path}: {e}")
+        print(f"S3 fetch of {csv_path.name} failed: {e}")
         raise e
 
-    if df.empty:
-        return pd.DataFrame()
+# Season of each month (index 1..12), northern and southern hemisphere
+_NORTH_SEASONS = np.array([None, "winter", "winter", "spring", "spring", "spring", "summer",
+                           "summer", "summer", "autumn", "autumn", "autumn", "winter"], dtype=object)
+_SOUTH_SEASONS = np.array([None, "summer", "summer", "autumn", "autumn", "autumn", "winter",
+                           "winter", "winter", "spring", "spring", "spring", "summer"], dtype=object)
 
-    df["year"] = df["date"].str.slice(0, 4).astype(int)
-    df["month"] = df["date"].str.slice(4, 6).astype(int)
 
-    if start_year:
-        df = df[df["year"] >= start_year]
-    if end_year:
-        df = df[df["year"] <= end_year]
+def _seasons_for(lat: Optional[float]) -> np.ndarray:
+    """Returns the month -> season table of the station's hemisphere."""
+    is_southern = lat == "unknown" or (lat is not None and lat < 0)
+    return _SOUTH_SEASONS if is_southern else _NORTH_SEASONS
 
-    df = df[df["element"].isin(["TMAX", "TMIN"])]
-    
-    if ignore_qflag:
-        mask_valid = df["qflag"].isna() | (df["qflag"].astype(str).str.strip() == "")
-        df = df[mask_valid]
 
-    return df[["station_id", "year", "month", "element", "value"]]
+def _nullable_floats(values: np.ndarray) -> np.ndarray:
+    """Converts floats to an object array of Python floats with NaN/inf as None."""
+    out = values.astype(np.float64).astype(object)
+    out[~np.isfinite(values)] = None
+    return out
+
 
 def _process_weather_data(df_v: pd.DataFrame, start_year: Optional[int], end_year: Optional[int], lat: Optional[float] = None) -> List[Tuple]:
-    """Calculates seasonal and annual mean TMAX and TMIN from the daily data DataFrame."""
+    """Calculates seasonal and annual mean TMAX and TMIN from the daily data DataFrame.
+
+    Daily values are first averaged per month, so missing days do not
+    distort the result. Annual and seasonal means are then taken over the
+    monthly means in a single grouped pass; the counts are numbers of months.
+    """
     if df_v.empty:
         return []
 
-    # Daily integers are tenths of a degree Celsius
-    df_v["value"] = df_v["value"] / 10.0
+    # 1. Daily -> Monthly Average (daily integers are tenths of a degree Celsius)
+    monthly = pd.DataFrame({
+        "station_id": df_v["station_id"].to_numpy(),
+        "year": df_v["year"].to_numpy(dtype=np.int64),
+        "month": df_v["month"].to_numpy(dtype=np.int64),
+        "element": df_v["element"].to_numpy(),
+        "value": df_v["value"].to_numpy(dtype=np.float64) / 10.0,
+    }).groupby(["station_id", "year", "month", "element"], sort=True)["value"].mean()
+
+    station = monthly.index.get_level_values("station_id").to_numpy()
+    year = monthly.index.get_level_values("year").to_numpy()
+    month = monthly.index.get_level_values("month").to_numpy()
+    element = monthly.index.get_level_values("element").to_numpy()
+    value = monthly.to_numpy()
+
+    # 2. Season mapping depends on hemisphere. The season crossing the year
+    # boundary (Dec Y, Jan Y+1, Feb Y+1) is winter in the north and summer
+    # in the south and belongs to year Y.
+    season = _seasons_for(lat)[month]
+    season_year = year - (month <= 2)
+
+    # 3. Annual and seasonal means in one pass: annual rows (kind 0) come
+    # before seasonal rows (kind 1), each sorted by station, year, period
+    n = len(value)
+    periods = pd.DataFrame({
+        "kind": np.repeat([0, 1], n),
+        "station_id": np.concatenate([station, station]),
+        "year": np.concatenate([year, season_year]),
+        "period": np.concatenate([np.full(n, "annual", dtype=object), season]),
+        "element": np.concatenate([element, element]),
+        "value": np.concatenate([value, value]),
+    }).groupby(["kind", "station_id", "year", "period", "element"], sort=True)["value"].agg(["mean", "size"])
+
+    table = periods.unstack("element")
+    if start_year:
+        table = table[table.index.get_level_values("year") >= start_year]
+    if end_year:
+        table = table[table.index.get_level_values("year") <= end_year]
+    if table.empty:
+        return []
 
-    # 1. Daily -> Monthly Average
-    # We group by month so that missing days do not distort the year average
-    grp_monthly = df_v.groupby(["station_id", "year", "month", "element"]).agg(
-        value=("value", "mean")
-    ).reset_index()
+    def column(stat: str, elem: str, fill: float) -> np.ndarray:
+        if (stat, elem) not in table.columns:
+            return np.full(len(table), fill, dtype=np.float64)
+        return table[(stat, elem)].to_numpy(dtype=np.float64)
 
-    # We create a dummy "count" column of 1 for the period logic
-    grp_monthly["count"] = 1
+    count_tmax = np.nan_to_num(column("size", "TMAX", 0.0)).astype(np.int64)
+    count_tmin = np.nan_to_num(column("size", "TMIN", 0.0)).astype(np.int64)
 
-    # Season mapping depends on hemisphere
-    is_southern = lat == "unknown" or (lat is not None and lat < 0)
-    
-    if is_southern:
-        # Southern Hemisphere seasons
-        season_map = {
-            3: "autumn", 4: "autumn", 5: "autumn",
-            6: "winter", 7: "winter", 8: "winter",
-            9: "spring", 10: "spring", 11: "spring",
-            12: "summer", 1: "summer", 2: "summer"
-        }
-    else:
-        # Northern Hemisphere seasons (default)
-        season_map = {
-            3: "spring", 4: "spring", 5: "spring",
-            6: "summer", 7: "summer", 8: "summer",
-            9: "autumn", 10: "autumn", 11: "autumn",
-            12: "winter", 1: "winter", 2: "winter"
-        }
-
-    grp_monthly["season"] = grp_monthly["month"].map(season_map)
-    
-    grp_monthly["season_year"] = grp_monthly["year"]
-    
-    # "Winter" spans crossing year boundary in Northern Hemisphere (Dec Y, Jan Y+1, Feb Y+1) 
-    # and "Summer" spans crossing year boundary in Southern Hemisphere (Dec Y, Jan Y+1, Feb Y+1)
-    boundary_season = "summer" if is_southern else "winter"
-    
-    mask_cross = grp_monthly["season"] == boundary_season
-    mask_jan_feb = mask_cross & grp_monthly["month"].isin([1, 2])
-    grp_monthly.loc[mask_jan_feb, "season_year"] -= 1
-
-    # 2. Annual Aggregation
-    grp_annual = grp_monthly.groupby(["station_id", "year", "element"]).agg(
-        mean=("value", "mean"),
-        count=("count", "sum")
-    )
-    grp_annual = grp_annual.unstack("element") 
-    grp_annual.columns = [f"{x}_{y}" for x, y in grp_annual.columns]
-    grp_annual = grp_annual.reset_index()
-    grp_annual["period"] = "annual"
-    
-    # 3. Seasonal Aggregation
-    grp_seasonal = grp_monthly.groupby(["station_id", "season_year", "season", "element"]).agg(
-        mean=("value", "mean"),
-        count=("count", "sum")
-    )
-    grp_seasonal = grp_seasonal.unstack("element")
-    grp_seasonal.columns = [f"{x}_{y}" for x, y in grp_seasonal.columns]
-    grp_seasonal = grp_seasonal.reset_index()
-    grp_seasonal = grp_seasonal.rename(columns={"season_year": "year", "season": "period"})
-    
-    final_df = pd.concat([grp_annual, grp_seasonal], ignore_index=True)
-    
-    expected_cols = ["mean_TMAX", "mean_TMIN", "count_TMAX", "count_TMIN"]
-    for c in expected_cols:
-        if c not in final_df.columns:
-            final_df[c] = np.nan
-            
-    final_df["count_TMAX"] = final_df["count_TMAX"].fillna(0).astype(int)
-    final_df["count_TMIN"] = final_df["count_TMIN"].fillna(0).astype(int)
-    
-    results = []
-    recs = final_df.to_dict(orient="records")
-    
-    def clean_val(v):
-        try:
-            f = float(v)
-            if np.isnan(f) or np.isinf(f):
-                return None
-            return f
-        except (ValueError, TypeError):
-            return None
-
-    for r in recs:
-        y = r["year"]
-        if start_year and y < start_year: continue
-        if end_year and y > end_year: continue
-        
-        results.append((
-            r["station_id"],
-            int(r["year"]),
-            r["period"],
-            clean_val(r.get("mean_TMAX")),
-            clean_val(r.get("mean_TMIN")),
-            int(r.get("count_TMAX", 0)),
-            int(r.get("count_TMIN", 0)),
-        ))
-    
-    import json
-    for i, row in enumerate(results):
-        try:
-            json.dumps(row[3], allow_nan=False)
-            json.dumps(row[4], allow_nan=False)
-        except (ValueError, TypeError) as e:
-            lst = list(row)
-            lst[3] = None
-            lst[4] = None
-            results[i] = tuple(lst)
-            
-    return results
+    return list(zip(
+        table.index.get_level_values("station_id").tolist(),
+        table.index.get_level_values("year").astype(np.int64).tolist(),
+        table.index.get_level_values("period").tolist(),
+        _nullable_floats(column("mean", "TMAX", np.nan)).tolist(),
+        _nullable_floats(column("mean", "TMIN", np.nan)).tolist(),
+        count_tmax.tolist(),
+        count_tmin.tolist(),
+    ))
 
 def fetch_and_parse_station_periods(
     station_id: str,
@@ -280,7 +427,8 @@ def fetch_and_parse_station_periods(
 ) -> List[Tuple]:
     """Fetches and parses temperature records for a specific station.
 
-    Attempts S3 fetch first as priority; falls back to NCEI DLY files on failure.
+    Computes the periods from the station's daily store. Only the first
+    fetch of a station downloads data (S3 first, NCEI DLY as fallback).
 
     Args:
         station_id: NOAA station identifier.
@@ -291,32 +439,310 @@ def fetch_and_parse_station_periods(
 
     Returns:
         List of tuples representing aggregated period data.
+
+    Raises:
+        StationDataUnavailable: If the station's daily data could not be loaded.
+    """
+    rows = fetch_station_period_spans(station_id, [(start_year, end_year)], conn, ignore_qflag)
+    # The recomputed season before the span lies outside the requested range
+    return [r for r in rows if not start_year or r[1] >= start_year]
+
+
+def fetch_station_period_spans(
+    station_id: str,
+    spans: List[Tuple[Optional[int], Optional[int]]],
+    conn: sqlite3.Connection = None,
+    ignore_qflag: bool = True,
+    lat: Optional[float] = None,
+) -> List[Tuple]:
+    """Aggregates several year spans of a station from one download and parse.
+
+    Args:
+        station_id: NOAA station identifier.
+        spans: Disjoint (start_year, end_year) ranges, e.g. the missing spans
+            from `get_missing_spans`. None or the coverage bounds mean open.
+        conn: SQLite connection to retrieve station metadata.
+        ignore_qflag: If True, ignores data points with quality flags.
+        lat: Station latitude for the season mapping; looked up via `conn`
+            if not given.
+
+    Returns:
+        The aggregated period tuples of all spans, span by span. Each span
+        also includes the season starting in December before it, whose
+        January/February lie inside the span.
+
+    Raises:
+        StationDataUnavailable: If the station's daily data could not be loaded.
     """
-    lat = None
-    if conn:
+    if lat is None and conn:
         try:
-            row = conn.execute("SELECT lat FROM stations WHERE station_id = ?", (station_id,)).fetchone()
-            if row:
-                lat = float(row[0])
+            lat = get_station_lat(conn, station_id)
         except Exception as e:
             print(f"Could not load latitude for {station_id}: {e}")
-    
+
+    arrays = require_station_arrays(station_id)
+    pool = get_parse_pool()
+    if pool is None:
+        results = _aggregate_spans(station_id, arrays, spans, ignore_qflag, lat)
+    else:
+        results = pool.call(_aggregate_spans, station_id, arrays, spans, ignore_qflag, lat)
+    report_progress(station_id, "aggregated", rows=len(results))
+    return results
+
+
+def _aggregate_spans(
+    station_id: str,
+    arrays: Dict[str, np.ndarray],
+    spans: List[Tuple[Optional[int], Optional[int]]],
+    ignore_qflag: bool,
+    lat: Optional[float],
+) -> List[Tuple]:
+    """Aggregates the periods of several year spans (runs in a parse worker if enabled)."""
+    results: List[Tuple] = []
+    for start_year, end_year in spans:
+        results.extend(_aggregate_span(station_id, arrays, start_year, end_year, ignore_qflag, lat))
+    return results
+
+
+def _aggregate_span(
+    station_id: str,
+    arrays: Dict[str, np.ndarray],
+    start_year: Optional[int],
+    end_year: Optional[int],
+    ignore_qflag: bool,
+    lat: Optional[float],
+    with_boundary: bool = True,
+) -> List[Tuple]:
+    """Aggregates one year span, including the seasons crossing its edges.
+
+    The frame reaches into the year after `end_year`, so the season starting
+    in December of `end_year` gets its January/February. With
+    `with_boundary`, the season starting in December before `start_year`
+    is recomputed as well (its January/February lie inside the span), so
+    spans aggregated separately give the same rows as one cold aggregation.
+    """
+    frame_start = start_year - 1 if start_year and with_boundary else start_year
+    frame_end = end_year + 1 if end_year else end_year
+    df = daily_frame(station_id, arrays, frame_start, frame_end, ignore_qflag)
+    rows = _process_weather_data(df, frame_start, end_year, lat=lat)
+    if frame_start != start_year:
+        boundary_season = _seasons_for(lat)[12]
+        rows = [r for r in rows if r[1] >= start_year or r[2] == boundary_season]
+    return rows
+
+
+def load_station_arrays(station_id: str, pool: Optional[ParsePool] = None) -> Optional[Dict[str, np.ndarray]]:
+    """Returns the daily arrays of a station, downloading them on first use.
+
+    Only one worker process (or thread) downloads a station at a time; the
+    others wait for its fetch lock and then read the daily store it wrote.
+    After `FETCH_LOCK_TIMEOUT` seconds they fetch on their own.
+
+    Args:
+        station_id: NOAA station identifier.
+        pool: Parse pool for the download's parse step; defaults to the
+            shared pool (`get_parse_pool`).
+
+    Returns:
+        The store arrays, or None if neither source had temperature data.
+    """
+    arrays = load_daily(station_id)
+    if arrays is None:
+        with holding(f"fetch-{station_id}", FETCH_LOCK_TIMEOUT) as locked:
+            if not locked:
+                print(f"Fetch lock of {station_id} timed out, fetching anyway", flush=True)
+            arrays = load_daily(station_id)
+            if arrays is None:
+                return _fetch_daily_arrays(station_id, pool)
+    print(f"Daily store hit for {station_id}", flush=True)
+    return arrays
+
+
+def require_station_arrays(station_id: str, pool: Optional[ParsePool] = None) -> Dict[str, np.ndarray]:
+    """Like `load_station_arrays`, but raises if the station has no data.
+
+    Raises:
+        StationDataUnavailable: If neither source had temperature data.
+    """
+    arrays = load_station_arrays(station_id, pool)
+    if arrays is None:
+        raise StationDataUnavailable(f"No temperature data available for station {station_id}")
+    return arrays
+
+
+def iter_station_period_blocks(
+    station_id: str,
+    arrays: Dict[str, np.ndarray],
+    spans: List[Tuple[Optional[int], Optional[int]]],
+    ignore_qflag: bool = True,
+    lat: Optional[float] = None,
+    block_years: int = STREAM_BLOCK_YEARS,
+) -> Iterator[List[Tuple]]:
+    """Aggregates year spans block by block, for streamed responses.
+
+    Yields the period tuples of `block_years` years at a time, sorted by
+    year and period, as soon as the block is aggregated. Blocks are
+    aggregated like spans (`_aggregate_span`), the season before a span
+    only with its first block, so the rows equal those of
+    `fetch_station_period_spans`.
+    """
+    years = arrays["date"] // 10000
+    if not len(years):
+        return
+    # Jan/Feb of the first year belong to the season of the year before
+    first, last = int(years.min()) - 1, int(years.max())
+
+    for start_year, end_year in spans:
+        lo = max(start_year or first, first)
+        hi = min(end_year or last, last)
+        for block_start in range(lo, hi + 1, block_years):
+            block_end = min(block_start + block_years - 1, hi)
+            rows = _aggregate_span(
+                station_id, arrays, block_start, block_end, ignore_qflag, lat, with_boundary=block_start == lo)
+            if rows:
+                yield sorted(rows, key=lambda r: (r[1], r[2]))
+
+
+def _fetch_daily_arrays(station_id: str, pool: Optional[ParsePool] = None) -> Optional[Dict[str, np.ndarray]]:
+    """Downloads and parses the complete daily history of a station once.
+
+    Attempts S3 first and falls back to the NCEI DLY file. With
+    `HTTP_HEDGE_DELAY` set, NCEI is raced against a slow S3 download instead
+    of waiting for it to fail. All years and all quality flags are kept and
+    written to the daily store, so later ranges and the `ignore_qflag`
+    variant never touch the network again.
+
+    With a parse pool (`pool`, or the shared one from `PARSE_PROCESSES`),
+    only the download runs on the calling thread and the file is parsed in
+    a worker process.
+
+    Returns:
+        The store arrays, or None if neither source had temperature data.
+    """
+    pool = pool or get_parse_pool()
+    if pool is not None:
+        arrays = _parse_in_pool(pool, station_id)
+    else:
+        arrays = _parse_in_process(station_id)
+    if arrays is None:
+        return None
+    report_progress(station_id, "parsed", rows=len(arrays["date"]))
+
+    try:
+        save_daily(station_id, arrays)
+    except OSError as e:
+        print(f"Could not write daily store for {station_id}: {e}", flush=True)
+    return arrays
+
+
+def _parse_in_process(station_id: str) -> Optional[Dict[str, np.ndarray]]:
+    """Downloads and parses a station on the calling thread, streaming S3."""
+    df = pd.DataFrame()
+    if HTTP_HEDGE_DELAY > 0:
+        def _hedge(cancel: threading.Event) -> pd.DataFrame:
+            report_progress(station_id, "fallback", source="dly")
+            return _load_dly_data(station_id, None, None, False, cancel=cancel)
+
+        start_t = time.time()
+        df = race(
+            [
+                lambda cancel: _load_s3_data(station_id, None, None, False, cancel=cancel),
+                _hedge,
+            ],
+            HTTP_HEDGE_DELAY,
+            accept=lambda result: not result.empty,
+        )
+        print(f"Raced Loading Time: {time.time() - start_t:.2f}s", flush=True)
+    else:
+        df = _load_sequential(station_id)
+    return None if df.empty else daily_arrays_from_frame(df)
+
+
+def _parse_in_pool(pool: ParsePool, station_id: str) -> Optional[Dict[str, np.ndarray]]:
+    """Downloads a station file on the calling thread and parses it in the pool.
+
+    An S3 file without temperature data falls back to the NCEI DLY file.
+    """
+    source = _download_station_file(station_id)
+    arrays = None if source is None else pool.call_arrays(_parse_station_file, station_id, source)
+    if arrays is None and source == "s3":
+        print("S3 data empty, falling back...", flush=True)
+        report_progress(station_id, "fallback", source="dly")
+        if _download_dly(station_id):
+            arrays = pool.call_arrays(_parse_station_file, station_id, "dly")
+    return arrays
+
+
+def _download_station_file(station_id: str) -> Optional[str]:
+    """Downloads the source file of a station (S3 first, hedged or sequential NCEI fallback).
+
+    Returns:
+        "s3" or "dly", or None if neither file could be downloaded.
+    """
+    def _s3(cancel: Optional[threading.Event]) -> str:
+        report_progress(station_id, "s3", url=f"{S3_BASE_URL}/csv.gz/by_station/{station_id}.csv.gz")
+        download_from_s3(station_id, S3_DATA_DIR / f"{station_id}.csv.gz", cancel=cancel)
+        return "s3"
+
+    def _dly(cancel: Optional[threading.Event]) -> Optional[str]:
+        report_progress(station_id, "fallback", source="dly")
+        return "dly" if _download_dly(station_id, cancel) else None
+
+    if HTTP_HEDGE_DELAY > 0:
+        try:
+            return race([_s3, _dly], HTTP_HEDGE_DELAY, accept=lambda source: source is not None)
+        except Exception as e:
+            print(f"Download of {station_id} failed: {e}", flush=True)
+            return None
+    try:
+        return _s3(None)
+    except Exception as e:
+        print(f"S3 download failed ({e}), falling back to NCEI DLY...", flush=True)
+    return _dly(None)
+
+
+def _download_dly(station_id: str, cancel: Optional[threading.Event] = None) -> bool:
+    """Downloads the NCEI DLY file of a station; False if it failed."""
+    try:
+        download_from_ncei(station_id, DATA_DIR / f"{station_id}.dly", cancel=cancel)
+        return True
+    except Exception as e:
+        print(f"NCEI Download failed: {e}")
+        return False
+
+
+def _parse_station_file(station_id: str, source: str) -> Optional[Dict[str, np.ndarray]]:
+    """Parses a downloaded source file into store arrays (runs in a parse worker).
+
+    Reads the file `_download_station_file` fetched; the S3 loader only
+    streams from the network if the file is missing.
+    """
+    loader = _load_s3_data if source == "s3" else _load_dly_data
+    df = loader(station_id, None, None, False)
+    return None if df.empty else daily_arrays_from_frame(df)
+
+
+def _load_sequential(station_id: str) -> pd.DataFrame:
+    """Loads the full history from S3, then from NCEI if S3 failed or was empty."""
+    df = pd.DataFrame()
     try:
         start_t = time.time()
-        df = _load_s3_data(station_id, start_year, end_year, ignore_qflag)
+        df = _load_s3_data(station_id, None, None, False)
         if not df.empty:
             elapsed = time.time() - start_t
             print(f"AWS Loading Time: {elapsed:.2f}s", flush=True)
-            return _process_weather_data(df, start_year, end_year, lat=lat)
-        print("S3 data empty, falling back...", flush=True)
+        else:
+            print("S3 data empty, falling back...", flush=True)
     except Exception as e:
         print(f"S3 fetch failed ({e}), falling back to NCEI DLY...", flush=True)
 
-    start_t = time.time()
-    df = _load_dly_data(station_id, start_year, end_year, ignore_qflag)
-    elapsed = time.time() - start_t
-    print(f"NCEI Loading Time: {elapsed:.2f}s", flush=True)
-    return _process_weather_data(df, start_year, end_year, lat=lat)
+    if df.empty:
+        report_progress(station_id, "fallback", source="dly")
+        start_t = time.time()
+        df = _load_dly_data(station_id, None, None, False)
+        elapsed = time.time() - start_t
+        print(f"NCEI Loading Time: {elapsed:.2f}s", flush=True)
+    return df
 
 
 def save_station_periods_to_db(conn: sqlite3.Connection, rows: List[Tuple]) -> None:
@@ -344,6 +770,10 @@ def import_station_periods(
         station_id, conn, ignore_qflag, start_year, end_year
     )
     save_station_periods_to_db(conn, rows)
+    if ignore_qflag:
+        lo = COVERAGE_MIN_YEAR if start_year is None else int(start_year)
+        hi = COVERAGE_MAX_YEAR if end_year is None else int(end_year)
+        save_station_coverage(conn, [(station_id, lo, hi)])
 
 
 def _years_to_blocks(years: List[int]) -> List[Tuple[int, int]]:
@@ -362,58 +792,127 @@ def _years_to_blocks(years: List[int]) -> List[Tuple[int, int]]:
     return blocks
 
 
-def ensure_station_periods_range(
-    station_id: str,
+def get_covered_spans(conn: sqlite3.Connection, station_id: str) -> List[Tuple[int, int]]:
+    """Returns the year spans of a station that are cached, sorted and disjoint."""
+    rows = conn.execute(
+        """
+        SELECT start_year, end_year
+        FROM station_temp_coverage
+        WHERE station_id = ?
+        ORDER BY start_year;
+        """,
+        (station_id,),
+    ).fetchall()
+    return [(int(r[0]), int(r[1])) for r in rows]
+
+
+def find_missing_spans(
+    covered: List[Tuple[int, int]],
+    start_year: Optional[int],
+    end_year: Optional[int],
+) -> List[Tuple[int, int]]:
+    """Subtracts the covered spans from the requested range.
+
+    Open bounds are replaced by `COVERAGE_MIN_YEAR` / `COVERAGE_MAX_YEAR`.
+    """
+    lo = COVERAGE_MIN_YEAR if start_year is None else int(start_year)
+    hi = COVERAGE_MAX_YEAR if end_year is None else int(end_year)
+
+    missing: List[Tuple[int, int]] = []
+    for a, b in sorted(covered):
+        if b < lo:
+            continue
+        if a > hi:
+            break
+        if a > lo:
+            missing.append((lo, a - 1))
+        lo = max(lo, b + 1)
+    if lo <= hi:
+        missing.append((lo, hi))
+    return missing
+
+
+def get_missing_spans(
     conn: sqlite3.Connection,
+    station_id: str,
     start_year: Optional[int],
     end_year: Optional[int],
-) -> dict:
-    """Ensures temperature data for the requested years is cached in the DB."""
-    create_schema(conn)
+) -> List[Tuple[int, int]]:
+    """Returns the parts of the requested range that are not cached yet."""
+    return find_missing_spans(get_covered_spans(conn, station_id), start_year, end_year)
 
-    if start_year is None or end_year is None:
-        import_station_periods(station_id, conn)
-        return {"imported": True, "mode": "full", "blocks": None}
 
-    start_year = int(start_year)
-    end_year = int(end_year)
-    if start_year > end_year:
-        raise ValueError("start_year must be <= end_year")
+def _merge_spans(spans: List[Tuple[int, int]]) -> List[Tuple[int, int]]:
+    """Merges overlapping and adjacent spans."""
+    merged: List[Tuple[int, int]] = []
+    for a, b in sorted(spans):
+        if merged and a <= merged[-1][1] + 1:
+            merged[-1] = (merged[-1][0], max(merged[-1][1], b))
+        else:
+            merged.append((a, b))
+    return merged
 
-    existing_rows = conn.execute(
-        """
-        SELECT DISTINCT year
-        FROM station_temp_period
-        WHERE station_id = ?
-          AND period = 'annual'
-          AND year BETWEEN ? AND ?;
-        """,
-        (station_id, start_year, end_year),
-    ).fetchall()
 
-    existing_years = {int(r[0]) for r in existing_rows}
-    requested_years = set(range(start_year, end_year + 1))
-    missing_years = sorted(requested_years - existing_years)
+def save_station_coverage(conn: sqlite3.Connection, spans: List[Tuple[str, int, int]]) -> None:
+    """Records (station_id, start_year, end_year) spans as cached.
+
+    Must run after the rows of these spans were saved, so a reader never
+    sees coverage without the matching rows.
+    """
+    by_station: dict = {}
+    for station_id, a, b in spans:
+        by_station.setdefault(station_id, []).append((int(a), int(b)))
+
+    for station_id, new_spans in by_station.items():
+        merged = _merge_spans(get_covered_spans(conn, station_id) + new_spans)
+        conn.execute("DELETE FROM station_temp_coverage WHERE station_id = ?;", (station_id,))
+        conn.executemany(
+            "INSERT INTO station_temp_coverage (station_id, start_year, end_year) VALUES (?, ?, ?);",
+            [(station_id, a, b) for a, b in merged],
+        )
+    conn.commit()
 
-    if not missing_years:
-        return {
-            "imported": False,
-            "mode": "range",
-            "missing_years_count": 0,
-            "blocks": [],
-        }
 
-    blocks = _years_to_blocks(missing_years)
+def ensure_station_periods_range(
+    station_id: str,
+    conn: sqlite3.Connection,
+    start_year: Optional[int],
+    end_year: Optional[int],
+) -> dict:
+    """Ensures temperature data for the requested years is cached in the DB.
 
-    for (a, b) in blocks:
-        import_station_periods(station_id, conn, start_year=a, end_year=b)
+    Missing spans are taken from the coverage table and filled from a
+    single download and parse.
+    """
+    create_schema(conn)
 
-    return {
-        "imported": True,
-        "mode": "range",
-        "missing_years_count": len(missing_years),
+    full = start_year is None or end_year is None
+    if not full:
+        start_year = int(start_year)
+        end_year = int(end_year)
+        if start_year > end_year:
+            raise ValueError("start_year must be <= end_year")
+
+    blocks = get_missing_spans(conn, station_id, start_year, end_year)
+    if blocks:
+        rows = fetch_station_period_spans(station_id, blocks, conn)
+        save_station_periods_to_db(conn, rows)
+        save_station_coverage(conn, [(station_id, a, b) for a, b in blocks])
+
+    result = {
+        "imported": bool(blocks),
+        "mode": "full" if full else "range",
         "blocks": [{"start_year": a, "end_year": b} for (a, b) in blocks],
     }
+    if not full:
+        result["missing_years_count"] = sum(b - a + 1 for a, b in blocks)
+    return result
+
+
+def get_station_lat(conn: sqlite3.Connection, station_id: str) -> Optional[float]:
+    """Returns the latitude of a station, or None if it is unknown."""
+    row = conn.execute("SELECT lat FROM stations WHERE station_id = ?", (station_id,)).fetchone()
+    return float(row[0]) if row else None
 
 
 def get_station_periods(
@@ -422,9 +921,42 @@ def get_station_periods(
     start_year: Optional[int] = None,
     end_year: Optional[int] = None,
 ) -> List[dict]:
-    """Retrieves cached temperature averages for a station from the DB."""
-    create_schema(conn)
+    """Retrieves cached temperature averages for a station from the DB.
+
+    Pure read: the schema is created once at startup, not per request.
+    """
+    sql, params = _station_periods_query(station_id, start_year, end_year)
+    conn.row_factory = sqlite3.Row
+    rows = conn.execute(sql, params).fetchall()
+    return [dict(r) for r in rows]
 
+
+def iter_station_periods(
+    station_id: str,
+    conn: sqlite3.Connection,
+    start_year: Optional[int] = None,
+    end_year: Optional[int] = None,
+    batch_size: int = 500,
+) -> Iterator[List[Tuple]]:
+    """Yields cached periods straight from the cursor, in batches of tuples.
+
+    Tuples are (year, period, avg_tmax_c, avg_tmin_c, n_tmax, n_tmin),
+    ordered by year and period.
+    """
+    sql, params = _station_periods_query(station_id, start_year, end_year)
+    cursor = conn.execute(sql, params)
+    while True:
+        batch = cursor.fetchmany(batch_size)
+        if not batch:
+            return
+        yield [tuple(r) for r in batch]
+
+
+def _station_periods_query(
+    station_id: str,
+    start_year: Optional[int],
+    end_year: Optional[int],
+) -> Tuple[str, List[object]]:
     sql = """
     SELECT year, period, avg_tmax_c, avg_tmin_c, n_tmax, n_tmin
     FROM station_temp_period
@@ -441,10 +973,7 @@ def get_station_periods(
         params.append(int(end_year))
 
     sql += " ORDER BY year, period;"
-
-    conn.row_factory = sqlite3.Row
-    rows = conn.execute(sql, params).fetchall()
-    return [dict(r) for r in rows]
+    return sql, params
 
 
 def create_schema(conn: sqlite3.Connection) -> None:
@@ -463,6 +992,22 @@ def create_schema(conn: sqlite3.Connection) -> None:
         );
         CREATE INDEX IF NOT EXISTS idx_temp_period_station_year
         ON station_temp_period (station_id, year);
+
+        CREATE TABLE IF NOT EXISTS station_temp_coverage (
+            station_id   TEXT NOT NULL,
+            start_year   INTEGER NOT NULL,
+            end_year     INTEGER NOT NULL,
+            PRIMARY KEY (station_id, start_year)
+        );
+
+        CREATE TABLE IF NOT EXISTS station_temp_freshness (
+            station_id    TEXT PRIMARY KEY,
+            source_url    TEXT NOT NULL,
+            etag          TEXT,
+            last_modified TEXT,
+            checked_at    REAL NOT NULL,
+            changed_at    REAL
+        );
         """
     )
     conn.commit()
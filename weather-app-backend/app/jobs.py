@@ -0,0 +1,158 @@
+"""Asynchronous jobs for long-running station fetches.
+
+A cold fetch of a station with a century of data can outlast proxy
+timeouts; the client then sees a 504 and its retry starts over. Instead,
+a fetch runs as a job: the client gets a job ID right away and polls or
+awaits the job until its result is ready.
+
+Jobs are deduplicated by key (station and year range): submitting a key
+whose job is still running, or finished successfully within
+`JOBS_TTL_SECONDS`, returns the existing job. Failed jobs are replaced by
+the next submission. The registry holds at most `JOBS_MAX` jobs; when it
+is full, the oldest finished job is evicted, and if every job is still
+running the submission is rejected with `JobsFull`.
+
+Jobs are plain `concurrent.futures` futures of a worker pool, so they keep
+running when the request (or event loop) that created them is gone.
+
+Authors:
+    Lisa Fritsch, Jan Goliasch, Finja Sterner, Menko Hornstein
+"""
+from __future__ import annotations
+import asyncio
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import Future
+from typing import Callable, Dict, Hashable, Optional, Tuple
+
+# Registry bound and how long finished jobs keep their result
+JOBS_MAX = int(os.getenv("JOBS_MAX", "256"))
+JOBS_TTL_SECONDS = float(os.getenv("JOBS_TTL_SECONDS", "600"))
+
+
+class JobsFull(Exception):
+    """Raised when the registry is full of jobs that are still running."""
+
+
+class Job:
+    """One submitted unit of work and its outcome."""
+
+    def __init__(self, key: Hashable, future: Future) -> None:
+        self.job_id = uuid.uuid4().hex[:12]
+        self.key = key
+        self.future = future
+        self.created_at = time.time()
+        self.finished_at: Optional[float] = None
+        future.add_done_callback(self._finished)
+
+    def _finished(self, _future: Future) -> None:
+        self.finished_at = time.time()
+
+    @property
+    def status(self) -> str:
+        """Job state: running, done or failed."""
+        if not self.future.done():
+            return "running"
+        return "failed" if self.future.exception() is not None else "done"
+
+    async def wait(self, timeout: float) -> bool:
+        """Waits up to `timeout` seconds for the job; True once it is finished.
+
+        A timed-out wait leaves the job running.
+        """
+        if not self.future.done() and timeout > 0:
+            try:
+                await asyncio.wait_for(asyncio.shield(asyncio.wrap_future(self.future)), timeout)
+            except Exception:
+                # Timed out (the job keeps running) or failed (read from the future)
+                pass
+        return self.future.done()
+
+    def stats(self) -> dict:
+        """Returns the job state without its result."""
+        return {
+            "job_id": self.job_id,
+            "status": self.status,
+            "created_at": round(self.created_at, 3),
+            "finished_at": None if self.finished_at is None else round(self.finished_at, 3),
+        }
+
+
+class JobRegistry:
+    """Bounded, deduplicating registry of jobs with a result TTL."""
+
+    def __init__(self, max_jobs: int = JOBS_MAX, ttl: float = JOBS_TTL_SECONDS) -> None:
+        self.max_jobs = max(1, int(max_jobs))
+        self.ttl = float(ttl)
+        self._lock = threading.Lock()
+        self._jobs: Dict[str, Job] = {}
+        self._by_key: Dict[Hashable, Job] = {}
+        self._submitted = 0
+        self._deduplicated = 0
+
+    def submit(self, key: Hashable, start: Callable[[], Future]) -> Tuple[Job, bool]:
+        """Returns the live job for `key`, or starts a new one via `start()`.
+
+        Args:
+            key: Identifies identical work, e.g. (station_id, start_year, end_year).
+            start: Schedules the work and returns its future; only called
+                if no reusable job exists.
+
+        Returns:
+            A tuple (job, shared). `shared` is True for an existing job.
+
+        Raises:
+            JobsFull: If the registry is full of running jobs.
+            Exception: Whatever `start()` raised (e.g. a saturated pool).
+        """
+        with self._lock:
+            self._prune()
+            job = self._by_key.get(key)
+            if job is not None and job.status != "failed":
+                self._deduplicated += 1
+                return job, True
+            if len(self._jobs) >= self.max_jobs and not self._evict_oldest_finished():
+                raise JobsFull(f"{self.max_jobs} jobs are still running")
+
+            job = Job(key, start())
+            self._jobs[job.job_id] = job
+            self._by_key[key] = job
+            self._submitted += 1
+            return job, False
+
+    def get(self, job_id: str) -> Optional[Job]:
+        """Returns a job by ID, or None if it is unknown or expired."""
+        with self._lock:
+            self._prune()
+            return self._jobs.get(job_id)
+
+    def stats(self) -> dict:
+        """Returns registry counters for the metrics endpoint."""
+        with self._lock:
+            self._prune()
+            running = sum(1 for j in self._jobs.values() if not j.future.done())
+            return {
+                "jobs": len(self._jobs),
+                "running": running,
+                "submitted": self._submitted,
+                "deduplicated": self._deduplicated,
+            }
+
+    def _forget(self, job: Job) -> None:
+        del self._jobs[job.job_id]
+        if self._by_key.get(job.key) is job:
+            del self._by_key[job.key]
+
+    def _prune(self) -> None:
+        cutoff = time.time() - self.ttl
+        for job in [j for j in self._jobs.values() if j.finished_at is not None and j.finished_at < cutoff]:
+            self._forget(job)
+
+    def _evict_oldest_finished(self) -> bool:
+        finished = [j for j in self._jobs.values() if j.finished_at is not None]
+        if not finished:
+            return False
+        self._forget(min(finished, key=lambda j: j.finished_at))
+        return True
@@ -7,30 +7,63 @@ Authors:
     Lisa Fritsch, Jan Goliasch, Finja Sterner, Menko Hornstein
 """
 
-from fastapi import FastAPI, HTTPException, BackgroundTasks, Response
+from fastapi import FastAPI, Header, HTTPException, Query, Response
+from fastapi.responses import JSONResponse, ORJSONResponse, StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
 
-from pydantic import BaseModel
-from typing import List, Optional, Tuple, Dict, Any
+from pydantic import BaseModel, Field, model_validator
+from typing import AsyncIterator, Callable, Iterator, List, Literal, Optional, Set, Tuple, Dict, Any
 import asyncio
-import sqlite3
+import json
+import hmac
 import os
+import threading
 import time
 import logging
 from contextlib import asynccontextmanager
 
 
-from app.import_stations import ensure_stations_imported
+from app.compression import CompressionMiddleware
+from app.db import get_pool, close_pools
+from app.freshness import get_changed_at, is_immutable_range, is_stale, revalidate_station, touches_recent
+from app.http_cache import (
+    CACHE_IMMUTABLE,
+    CACHE_RECENT,
+    CACHE_REVALIDATE,
+    cache_headers,
+    etag_matches,
+    make_etag,
+    not_modified,
+)
+from app.http_client import close_http_client, get_http_client
+from app.import_stations import (
+    ensure_stations_imported,
+    create_schema as create_stations_schema,
+    refresh_station_metadata,
+)
 from app.stations_search import find_stations_nearby
+from app.station_index import get_station_index, reload_station_index
+from app.single_flight import SingleFlight
+from app.worker_pool import BoundedExecutor, PoolSaturated
+from app.write_queue import WriteBehindQueue
+from app.jobs import Job, JobRegistry, JobsFull
+from app.parse_pool import close_parse_pool, get_parse_pool
+from app.process_lock import BOOTSTRAP_LOCK_TIMEOUT, LockTimeout, named_lock
+from app.progress import get_progress_registry
+from app.responses import NDJSON_MEDIA_TYPE, PERIOD_FIELDS, ndjson_line, ndjson_lines, temps_response
+from app.prefetch import PREFETCH_PARALLELISM, PREFETCH_PROCESSES, PrefetchJob, select_stations
 
 
 from app.import_temps import (
-    DB_PATH,
     create_schema as create_temps_schema,
     ensure_station_periods_range,
     get_station_periods,
-    fetch_and_parse_station_periods,
-    save_station_periods_to_db,
+    get_station_lat,
+    get_missing_spans,
+    fetch_station_period_spans,
+    iter_station_period_blocks,
+    iter_station_periods,
+    require_station_arrays,
 )
 
 @asynccontextmanager
@@ -41,7 +74,9 @@ async def lifespan(app: FastAPI):
 
     async def _bootstrap():
         try:
-            info = await asyncio.to_thread(ensure_stations_imported)
+            info = await asyncio.to_thread(_bootstrap_shared_db)
+            # Searches are served from memory once the index is loaded
+            await asyncio.to_thread(reload_station_index)
             app.state.stations_info = info
             app.state.stations_ready = True
             print("[BOOT] statrions:", info)
@@ -49,8 +84,49 @@ async def lifespan(app: FastAPI):
             app.state.stations_error = str(e)
             print("[BOOT] error:", repr(e))
 
+    async def _warm_up_parse_pool():
+        # Worker processes start (and import pandas) before the first cold fetch
+        try:
+            await asyncio.to_thread(parse_pool.warm_up)
+            print(f"[BOOT] parse pool ready ({parse_pool.processes} processes)")
+        except Exception as e:
+            print("[BOOT] parse pool warm-up failed:", repr(e))
+
+    _write_queue.start()
     asyncio.create_task(_bootstrap())
+    parse_pool = get_parse_pool()
+    if parse_pool is not None:
+        asyncio.create_task(_warm_up_parse_pool())
     yield
+    # Running fetches hand their rows to the write queue, so they finish
+    # first; then pending write-behind rows drain before the connections close
+    await asyncio.to_thread(_fetch_pool.shutdown, True)
+    await asyncio.to_thread(_revalidate_pool.shutdown, True)
+    await asyncio.to_thread(_write_queue.stop)
+    close_parse_pool()
+    close_pools()
+    close_http_client()
+
+
+# Schema creation runs once at startup instead of on every request
+def _init_db():
+    with get_pool().writer() as conn:
+        create_stations_schema(conn)
+        create_temps_schema(conn)
+
+# Schema and station import run in one worker process at a time; workers
+# started alongside wait for it and then find the shared database ready
+def _bootstrap_shared_db() -> dict:
+    lock = named_lock("bootstrap")
+    if not lock.acquire(0):
+        print(f"[BOOT] worker {os.getpid()} waiting for another worker's bootstrap")
+        if not lock.acquire(BOOTSTRAP_LOCK_TIMEOUT):
+            raise LockTimeout(f"Bootstrap lock not acquired within {BOOTSTRAP_LOCK_TIMEOUT:.0f}s")
+    try:
+        _init_db()
+        return ensure_stations_imported()
+    finally:
+        lock.release()
 
 
 app = FastAPI(title="Weather Data API", version="0.1.0", lifespan=lifespan)
@@ -64,6 +140,113 @@ def ready():
         "ready": bool(getattr(app.state, "stations_ready", False)),
         "error": getattr(app.state, "stations_error", None),
         "info": getattr(app.state, "stations_info", None),
+        "worker": os.getpid(),
+    }
+
+# Concurrent cold requests for the same station and range share one live fetch
+_temps_flight = SingleFlight()
+
+# Dedicated pool for cold fetches (download + parse + aggregate)
+FETCH_WORKERS = int(os.getenv("FETCH_WORKERS", "4"))
+FETCH_QUEUE = int(os.getenv("FETCH_QUEUE", "16"))
+FETCH_RETRY_AFTER = int(os.getenv("FETCH_RETRY_AFTER", "5"))
+_fetch_pool = BoundedExecutor(FETCH_WORKERS, FETCH_QUEUE, name="fetch")
+# Pause before a running NDJSON stream retries a block on a saturated pool
+STREAM_SATURATED_RETRY = 0.05
+
+# Single writer thread that merges write-behind saves into batched commits
+_write_queue = WriteBehindQueue()
+
+# Progress channels of live fetches, streamed as Server-Sent Events
+PROGRESS_HEARTBEAT = float(os.getenv("PROGRESS_HEARTBEAT", "15"))
+_progress = get_progress_registry()
+
+# Runs a live fetch on the fetch pool with a progress channel for its station
+def _tracked_fetch(station_id: str, fn: Callable[..., Any], *args: Any) -> Any:
+    channel = _progress.open(station_id)
+    channel.publish("started")
+    try:
+        return fn(*args)
+    except Exception as e:
+        channel.publish("error", detail=str(e))
+        raise
+
+# Asynchronous temps jobs; the sync endpoint hands off to a job once a cold
+# fetch takes longer than the latency budget
+TEMPS_LATENCY_BUDGET = float(os.getenv("TEMPS_LATENCY_BUDGET", "20"))
+JOB_WAIT_MAX = float(os.getenv("JOB_WAIT_MAX", "30"))
+_jobs = JobRegistry()
+
+# Write-behind callback that ends the station's progress channel
+def _report_saved(station_id: str, rows: int) -> Callable[[bool], None]:
+    def _on_saved(ok: bool) -> None:
+        if ok:
+            _progress.report(station_id, "saved", rows=rows)
+        else:
+            _progress.report(station_id, "error", detail="Rows could not be saved")
+    return _on_saved
+
+# Background revalidation of stale recent periods (stale-while-revalidate)
+REVALIDATE_WORKERS = int(os.getenv("REVALIDATE_WORKERS", "2"))
+REVALIDATE_QUEUE = int(os.getenv("REVALIDATE_QUEUE", "32"))
+_revalidate_pool = BoundedExecutor(REVALIDATE_WORKERS, REVALIDATE_QUEUE, name="revalidate")
+_revalidating: Set[str] = set()
+_revalidating_lock = threading.Lock()
+
+# Schedules one background revalidation per station; skipped while the pool is full
+def _schedule_revalidation(station_id: str, lat: Optional[float]) -> bool:
+    with _revalidating_lock:
+        if station_id in _revalidating:
+            return False
+        _revalidating.add(station_id)
+
+    def _done(future) -> None:
+        with _revalidating_lock:
+            _revalidating.discard(station_id)
+        if future.exception() is not None:
+            print(f"[API] Revalidation of {station_id} failed: {future.exception()}")
+
+    try:
+        future = _revalidate_pool.submit(revalidate_station, station_id, lat)
+    except PoolSaturated:
+        with _revalidating_lock:
+            _revalidating.discard(station_id)
+        return False
+    future.add_done_callback(_done)
+    return True
+
+# Coalescing counters of both cold fetch paths: NDJSON streams share a
+# single-flight load, sync requests and temps jobs share a job
+def _temps_fetch_stats() -> dict:
+    stream = _temps_flight.stats()
+    jobs = _jobs.stats()
+    return {
+        "requests": stream["requests"] + jobs["submitted"] + jobs["deduplicated"],
+        "executions": stream["executions"] + jobs["submitted"],
+        "coalesced": stream["coalesced"] + jobs["deduplicated"],
+        "in_flight": stream["in_flight"] + jobs["running"],
+        "stream": stream,
+        "jobs": {
+            "requests": jobs["submitted"] + jobs["deduplicated"],
+            "executions": jobs["submitted"],
+            "coalesced": jobs["deduplicated"],
+            "in_flight": jobs["running"],
+        },
+    }
+
+# Metrics Endpoint for monitoring the live fetch path
+@app.get("/api/metrics")
+def metrics():
+    parse_pool = get_parse_pool()
+    return {
+        "temps_fetch": _temps_fetch_stats(),
+        "fetch_pool": _fetch_pool.stats(),
+        "write_queue": _write_queue.stats(),
+        "revalidate_pool": _revalidate_pool.stats(),
+        "http": get_http_client().stats(),
+        "progress": _progress.stats(),
+        "jobs": _jobs.stats(),
+        "parse_pool": parse_pool.stats() if parse_pool is not None else None,
     }
 
 # Guard function to check if the database is initialized and ready to serve requests
@@ -85,7 +268,19 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Brotli/gzip compression of larger responses
+app.add_middleware(CompressionMiddleware)
+
+# Upper bound for the number of queries in one batch search request
+BATCH_SEARCH_MAX = int(os.getenv("BATCH_SEARCH_MAX", "100000"))
+
 # Data models for API requests and responses
+# Rejects inverted year filters of request models
+def _check_year_range(model: BaseModel) -> BaseModel:
+    if model.start_year is not None and model.end_year is not None and model.start_year > model.end_year:
+        raise ValueError("start_year must be <= end_year")
+    return model
+
 class StationSearchRequest(BaseModel):
     lat: float
     lon: float
@@ -94,6 +289,18 @@ class StationSearchRequest(BaseModel):
     start_year: Optional[int] = None
     end_year: Optional[int] = None
 
+    _check_years = model_validator(mode="after")(_check_year_range)
+
+class StationNearestRequest(BaseModel):
+    lat: float
+    lon: float
+    k: int = 10
+    max_distance_km: Optional[float] = None
+    start_year: Optional[int] = None
+    end_year: Optional[int] = None
+
+    _check_years = model_validator(mode="after")(_check_year_range)
+
 class StationItem(BaseModel):
     station_id: str
     name: str
@@ -105,17 +312,42 @@ class StationItem(BaseModel):
 
 # Stationssuche um Umgebungssuche
 @app.post("/api/stations/search", response_model=List[StationItem])
-def search_stations(request: StationSearchRequest):
+def search_stations(
+    request: StationSearchRequest,
+    response: Response,
+    if_none_match: Optional[str] = Header(None),
+):
     """Searches for weather stations within a specified radius.
 
+    Results from the in-memory index carry an ETag of the index version and
+    the search parameters; a matching `If-None-Match` is answered with 304
+    without running the search.
+
     Args:
         request: Search parameters including lat, lon, radius, and optional year range.
+        response: FastAPI response object for setting headers.
+        if_none_match: ETag(s) the client already has.
 
     Returns:
-        List of matching stations ordered by distance.
+        List of matching stations ordered by distance, or an empty 304.
     """
     _require_ready()
 
+    index = get_station_index()
+    if index is not None:
+        etag = make_etag("search", index.version, sorted(request.model_dump().items()))
+        if etag_matches(if_none_match, etag):
+            return not_modified(etag, CACHE_REVALIDATE)
+        response.headers.update(cache_headers(etag, CACHE_REVALIDATE))
+        return index.search(
+            lat=request.lat,
+            lon=request.lon,
+            radius_km=request.radius_km,
+            limit=request.limit,
+            start_year=request.start_year,
+            end_year=request.end_year,
+        )
+
     stations = find_stations_nearby(
         lat=request.lat,
         lon=request.lon,
@@ -126,92 +358,541 @@ def search_stations(request: StationSearchRequest):
     )
     return stations
 
-# Helper function for background tasks to save data to the database
-def _background_save_to_db(rows: List[Tuple]):
-    print(f"[BG] Saving {len(rows)} rows to DB...")
-    conn = sqlite3.connect(DB_PATH)
+# Batch search for many query points in one request
+@app.post("/api/stations/search/batch")
+def search_stations_batch(queries: List[StationSearchRequest]):
+    """Resolves many station searches in one pass over the station index.
+
+    Results are streamed back as NDJSON in input order, one line per query:
+    `{"index": i, "stations": [...]}`. Only one chunk of queries is resolved
+    at a time, so large batches are never buffered as a whole.
+
+    Args:
+        queries: List of search queries, same fields as `/api/stations/search`.
+
+    Returns:
+        A streaming `application/x-ndjson` response.
+
+    Raises:
+        HTTPException: 413 if the batch is too large, 503 while the index is loading.
+    """
+    _require_ready()
+
+    if len(queries) > BATCH_SEARCH_MAX:
+        raise HTTPException(
+            status_code=413, detail=f"At most {BATCH_SEARCH_MAX} queries per batch")
+
+    index = get_station_index()
+    if index is None:
+        raise HTTPException(status_code=503, detail="Station index loading")
+
+    def _lines():
+        dumped = (q.model_dump() for q in queries)
+        for i, stations in enumerate(index.search_batch(dumped)):
+            yield ndjson_line({"index": i, "stations": stations})
+
+    return StreamingResponse(_lines(), media_type=NDJSON_MEDIA_TYPE)
+
+# k nearest stations, independent of the station density
+@app.post("/api/stations/nearest", response_model=List[StationItem])
+def nearest_stations(request: StationNearestRequest):
+    """Finds the k weather stations closest to a coordinate.
+
+    Unlike the radius search this always returns up to `k` stations, also in
+    sparse regions (oceans, deserts), optionally bounded by `max_distance_km`.
+
+    Args:
+        request: Query point, k, optional maximum distance and year range.
+
+    Returns:
+        List of the nearest stations ordered by distance.
+
+    Raises:
+        HTTPException: 503 while the station index is still loading.
+    """
+    _require_ready()
+
+    index = get_station_index()
+    if index is None:
+        raise HTTPException(status_code=503, detail="Station index loading")
+
+    return index.nearest(
+        lat=request.lat,
+        lon=request.lon,
+        k=request.k,
+        max_distance_km=request.max_distance_km,
+        start_year=request.start_year,
+        end_year=request.end_year,
+    )
+
+# Admin token for maintenance endpoints (unset = admin endpoints disabled)
+ADMIN_TOKEN = os.getenv("ADMIN_TOKEN")
+
+# Upper bounds for prefetch jobs started through the admin API
+PREFETCH_MAX_PARALLELISM = int(os.getenv("PREFETCH_MAX_PARALLELISM", "32"))
+PREFETCH_MAX_PROCESSES = int(os.getenv("PREFETCH_MAX_PROCESSES", str(max(PREFETCH_PROCESSES, os.cpu_count() or 1))))
+PREFETCH_MAX_STATION_IDS = 10000
+
+# Number of finished prefetch jobs kept for status queries
+PREFETCH_JOBS_KEPT = 20
+
+_prefetch_jobs: Dict[str, PrefetchJob] = {}
+# Serializes the running-job check and the registration of a new job
+_prefetch_lock = threading.Lock()
+
+class PrefetchRequest(BaseModel):
+    bbox: Optional[List[float]] = Field(None, min_length=4, max_length=4)  # [min_lat, min_lon, max_lat, max_lon]
+    prefix: Optional[str] = Field(None, min_length=2, max_length=11)
+    station_ids: Optional[List[str]] = Field(None, max_length=PREFETCH_MAX_STATION_IDS)
+    parallelism: int = Field(PREFETCH_PARALLELISM, ge=1, le=PREFETCH_MAX_PARALLELISM)
+    processes: int = Field(PREFETCH_PROCESSES, ge=0, le=PREFETCH_MAX_PROCESSES)
+
+    @model_validator(mode="after")
+    def _check_bbox(self) -> "PrefetchRequest":
+        if self.bbox is not None:
+            min_lat, min_lon, max_lat, max_lon = self.bbox
+            if not (-90 <= min_lat <= max_lat <= 90 and -180 <= min_lon <= max_lon <= 180):
+                raise ValueError("bbox must be [min_lat, min_lon, max_lat, max_lon] with min <= max within ±90/±180")
+        return self
+
+# Guard function for admin endpoints; without a configured token they are disabled
+def _require_admin(token: Optional[str]):
+    if not ADMIN_TOKEN:
+        raise HTTPException(status_code=503, detail="Admin endpoints are disabled (ADMIN_TOKEN not set)")
+    if token is None or not hmac.compare_digest(token, ADMIN_TOKEN):
+        raise HTTPException(status_code=403, detail="Invalid admin token")
+
+# Looks up a prefetch job or answers 404
+def _get_prefetch_job(job_id: str) -> PrefetchJob:
+    job = _prefetch_jobs.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Unknown prefetch job")
+    return job
+
+# Starts a bulk warm-up of the temps cache
+@app.post("/api/admin/prefetch", status_code=202)
+def start_prefetch(request: PrefetchRequest, x_admin_token: Optional[str] = Header(None)):
+    """Pre-warms the temps cache for a bounding box, ID prefix or station list.
+
+    The job runs in the background; poll `GET /api/admin/prefetch/{job_id}`
+    for progress. Stations whose full history is already cached are skipped,
+    so resubmitting the same selection resumes an interrupted job.
+
+    Raises:
+        HTTPException: 403 for a wrong admin token, 503 if no token is
+            configured, 400 for an invalid selection, 409 if another
+            prefetch job is still running.
+    """
+    _require_admin(x_admin_token)
+    _require_ready()
+
+    with _prefetch_lock:
+        if any(job.status in ("pending", "running") for job in _prefetch_jobs.values()):
+            raise HTTPException(status_code=409, detail="A prefetch job is already running")
+
+        try:
+            with get_pool().reader() as conn:
+                stations = select_stations(conn, request.bbox, request.prefix, request.station_ids)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+
+        job = PrefetchJob(stations, request.parallelism, request.processes)
+        finished = [jid for jid, j in _prefetch_jobs.items() if j.status not in ("pending", "running")]
+        for jid in finished[:max(0, len(finished) - PREFETCH_JOBS_KEPT + 1)]:
+            del _prefetch_jobs[jid]
+        _prefetch_jobs[job.job_id] = job
+        job.start()
+    print(f"[API] Prefetch job {job.job_id} started for {len(stations)} stations")
+    return job.stats()
+
+# Progress of a prefetch job
+@app.get("/api/admin/prefetch/{job_id}")
+def prefetch_status(job_id: str, x_admin_token: Optional[str] = Header(None)):
+    _require_admin(x_admin_token)
+    return _get_prefetch_job(job_id).stats()
+
+# Cancels a prefetch job (stations already in flight still finish)
+@app.delete("/api/admin/prefetch/{job_id}")
+def cancel_prefetch(job_id: str, x_admin_token: Optional[str] = Header(None)):
+    _require_admin(x_admin_token)
+    job = _get_prefetch_job(job_id)
+    job.cancel()
+    return job.stats()
+
+# Applies changed NOAA metadata files and swaps in a fresh search index
+def _refresh_station_metadata() -> dict:
+    result = refresh_station_metadata(get_pool().writer)
+    if result["changed"]:
+        reload_station_index()
+    return result
+
+# Conditional refresh of the stations and inventory files
+@app.post("/api/admin/stations/refresh")
+async def refresh_stations(x_admin_token: Optional[str] = Header(None)):
+    """Re-downloads ghcnd-stations.txt / ghcnd-inventory.txt only if they changed.
+
+    Changed files are applied as incremental diffs (R*Tree, coverage and the
+    in-memory search index follow); unchanged files cost one `304` each.
+
+    Raises:
+        HTTPException: 403 for a wrong admin token, 503 if no token is
+            configured, 502 if both mirrors fail.
+    """
+    _require_admin(x_admin_token)
+    _require_ready()
     try:
-        create_temps_schema(conn)
-        save_station_periods_to_db(conn, rows)
-        print("[BG] Save complete.")
-    finally:
-        conn.close()
+        return await asyncio.to_thread(_refresh_station_metadata)
+    except Exception as e:
+        print(f"[API] Station refresh failed: {e}")
+        raise HTTPException(status_code=502, detail=f"Station refresh failed: {e}")
+
+# Helper function to read cached periods, the spans still missing, whether
+# fully cached recent periods are past their TTL and their content version
+# (runs off the event loop)
+def _read_cached_periods(
+    station_id: str, start_year: Optional[int], end_year: Optional[int], with_rows: bool = True
+) -> Tuple[List[dict], List[Tuple[int, int]], Optional[float], bool, Optional[float]]:
+    with get_pool().reader() as conn:
+        missing = get_missing_spans(conn, station_id, start_year, end_year)
+        # Fully cached streamed responses read their rows from a cursor later
+        rows = get_station_periods(station_id, conn, start_year, end_year) if with_rows or missing else []
+        stale = not missing and touches_recent(end_year) and is_stale(conn, station_id)
+        lat = get_station_lat(conn, station_id) if missing or stale else None
+        changed_at = get_changed_at(conn, station_id) if not missing else None
+    return rows, missing, lat, stale, changed_at
+
+# Strong ETag of a fully cached temps response in one format
+def _temps_etag(station_id: str, start_year: Optional[int], end_year: Optional[int], fmt: str, version: Any) -> str:
+    return make_etag("temps", station_id, start_year, end_year, fmt, version)
+
+# Converts fetched period tuples into response rows
+def _period_dicts(raw_rows: List[Tuple]) -> List[dict]:
+    return [
+        {
+            "year": r[1],
+            "period": r[2],
+            "avg_tmax_c": r[3],
+            "avg_tmin_c": r[4],
+            "n_tmax": r[5],
+            "n_tmin": r[6],
+        }
+        for r in raw_rows
+    ]
+
+# Fetches the missing spans of a range, persists them and returns the merged
+# rows (runs on the fetch pool as a temps job)
+def _run_temps_job(station_id: str, start_year: Optional[int], end_year: Optional[int]) -> List[dict]:
+    rows, missing, lat, _, _ = _read_cached_periods(station_id, start_year, end_year)
+    if not missing:
+        return rows
+    raw_rows = _tracked_fetch(station_id, fetch_station_period_spans, station_id, missing, None, True, lat)
+    _write_queue.submit(
+        raw_rows,
+        coverage=[(station_id, a, b) for a, b in missing],
+        on_saved=_report_saved(station_id, len(raw_rows)),
+    )
+
+    # Aggregation also recomputes the season before each span, which may lie before the range
+    fetched = [r for r in _period_dicts(raw_rows) if not start_year or r["year"] >= start_year]
+    fetched_keys = {(r["year"], r["period"]) for r in fetched}
+    response_data = [r for r in rows if (r["year"], r["period"]) not in fetched_keys] + fetched
+    response_data.sort(key=lambda r: (r["year"], r["period"]))
+    return response_data
+
+# Starts (or joins) the temps job of a station and range
+def _submit_temps_job(station_id: str, start_year: Optional[int], end_year: Optional[int]) -> Tuple[Job, bool]:
+    try:
+        return _jobs.submit(
+            (station_id, start_year, end_year),
+            lambda: _fetch_pool.submit(_run_temps_job, station_id, start_year, end_year),
+        )
+    except JobsFull as e:
+        raise PoolSaturated(str(e))
+
+# Status (and once done, result or error) of a temps job
+def _job_payload(job: Job) -> dict:
+    station_id, start_year, end_year = job.key
+    payload = {**job.stats(), "station_id": station_id, "start_year": start_year, "end_year": end_year}
+    if job.status == "done":
+        payload["result"] = job.future.result()
+    elif job.status == "failed":
+        error = job.future.exception()
+        payload["error"] = {"status_code": 404 if isinstance(error, FileNotFoundError) else 500, "detail": str(error)}
+    return payload
+
+# Submits a temps fetch as an asynchronous job
+@app.post("/api/stations/{station_id}/temps/jobs", status_code=202)
+def submit_temps_job(
+    station_id: str,
+    response: Response,
+    start_year: Optional[int] = None,
+    end_year: Optional[int] = None,
+):
+    """Starts a temps fetch for a station and range as a job.
+
+    Identical submissions while the job runs, or shortly after it finished,
+    return the same job. Poll or await it via `GET /api/jobs/{job_id}`.
+
+    Raises:
+        HTTPException: 400 if start_year > end_year, 503 with Retry-After if
+            the fetch pool or the job registry is full.
+    """
+    if start_year is not None and end_year is not None and start_year > end_year:
+        raise HTTPException(
+            status_code=400, detail="start_year must be <= end_year")
+    try:
+        job, shared = _submit_temps_job(station_id, start_year, end_year)
+    except PoolSaturated:
+        raise HTTPException(
+            status_code=503,
+            detail="Too many stations being fetched, please retry",
+            headers={"Retry-After": str(FETCH_RETRY_AFTER)},
+        )
+    response.headers["Location"] = f"/api/jobs/{job.job_id}"
+    return {**_job_payload(job), "deduplicated": shared}
+
+# Polls or awaits a temps job
+@app.get("/api/jobs/{job_id}")
+async def temps_job_status(job_id: str, wait: float = 0):
+    """Returns the state of a temps job, with its rows once it is done.
+
+    Args:
+        job_id: ID returned by the submission or a 202 hand-off.
+        wait: Seconds to wait for the job to finish first (at most
+            `JOB_WAIT_MAX`), for long polling.
+
+    Raises:
+        HTTPException: 404 if the job is unknown or its result expired.
+    """
+    job = _jobs.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Unknown or expired job")
+    await job.wait(min(max(wait, 0.0), JOB_WAIT_MAX))
+    return ORJSONResponse(_job_payload(job))
+
+# Progress of a station's live fetch as Server-Sent Events
+@app.get("/api/stations/{station_id}/temps/progress")
+async def station_temps_progress(station_id: str, last_event_id: Optional[str] = Header(None)):
+    """Streams the phases of the station's live fetch as Server-Sent Events.
+
+    Every event carries its phase as SSE event type and the full event as
+    JSON data (see `progress.py`); the stream ends after `saved` or
+    `error`. Reconnecting clients resume after `Last-Event-ID`. Clients
+    waiting for a cold station subscribe here instead of sending the temps
+    request again.
+
+    Raises:
+        HTTPException: 404 if no fetch for the station is in flight or
+            recently finished.
+    """
+    channel = _progress.get(station_id)
+    if channel is None:
+        raise HTTPException(status_code=404, detail="No fetch in progress for this station")
+    last_id = int(last_event_id) if last_event_id and last_event_id.isdigit() else 0
+
+    async def _events() -> AsyncIterator[str]:
+        async for event in channel.subscribe(last_id, PROGRESS_HEARTBEAT):
+            if event is None:
+                yield ": keep-alive\n\n"
+            else:
+                yield f"id: {event['id']}\nevent: {event['phase']}\ndata: {json.dumps(event)}\n\n"
+
+    return StreamingResponse(
+        _events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+# Streams fully cached periods batch by batch. The rows (a few hundred per
+# station) are read first, so slow clients never hold a pooled reader
+def _stream_cached_periods(station_id: str, start_year: Optional[int], end_year: Optional[int]) -> Iterator[bytes]:
+    with get_pool().reader() as conn:
+        batches = list(iter_station_periods(station_id, conn, start_year, end_year))
+    for batch in batches:
+        yield ndjson_lines(batch)
+
+# Aggregates the next block of a live stream on the fetch pool (None when done).
+# Once the response has started, a saturated pool is waited out instead of
+# failing the stream; the first block is aggregated before, so it gets a 503
+async def _next_block(blocks: Iterator[List[Tuple]]) -> Optional[List[Tuple]]:
+    while True:
+        try:
+            return await _fetch_pool.run(next, blocks, None)
+        except PoolSaturated:
+            await asyncio.sleep(STREAM_SATURATED_RETRY)
+
+# Streams live periods block by block as they are aggregated, merged with the
+# cached rows in year order. The fetched rows are persisted once complete.
+async def _stream_live_periods(
+    station_id: str,
+    first: Optional[List[Tuple]],
+    blocks: Iterator[List[Tuple]],
+    missing: List[Tuple[int, int]],
+    cached_rows: List[dict],
+    start_year: Optional[int] = None,
+) -> AsyncIterator[bytes]:
+    cached = [tuple(r[f] for f in PERIOD_FIELDS) for r in cached_rows]
+    fetched: List[Tuple] = []
+    block = first
+    try:
+        while block is not None:
+            fetched.extend(block)
+            # The season before a span may lie before the requested range
+            rows = [r[1:] for r in block if not start_year or r[1] >= start_year]
+            if rows:
+                keys = {(r[0], r[1]) for r in rows}
+                last_year = rows[-1][0]
+                rows += [r for r in cached if r[0] <= last_year and (r[0], r[1]) not in keys]
+                cached = [r for r in cached if r[0] > last_year]
+                yield ndjson_lines(sorted(rows, key=lambda r: (r[0], r[1])))
+            block = await _next_block(blocks)
+    except (GeneratorExit, asyncio.CancelledError):
+        _progress.report(station_id, "error", detail="Client disconnected")
+        raise
+    if cached:
+        yield ndjson_lines(cached)
+    _progress.report(station_id, "aggregated", rows=len(fetched))
+    _write_queue.submit(
+        fetched,
+        coverage=[(station_id, a, b) for a, b in missing],
+        on_saved=_report_saved(station_id, len(fetched)),
+    )
+    print(f"[API] Streamed {len(fetched)} live rows for {station_id} (Write-Behind)")
 
 # Endpoint to get temperature data for a specific station
 @app.get("/api/stations/{station_id}/temps")
-def station_temps(
+async def station_temps(
     station_id: str,
-    background_tasks: BackgroundTasks,
-    response: Response,
     start_year: Optional[int] = None,
     end_year: Optional[int] = None,
+    fmt: Literal["rows", "columns", "ndjson"] = Query("rows", alias="format"),
+    accept: Optional[str] = Header(None),
+    if_none_match: Optional[str] = Header(None),
 ):
     """Retrieves temperature records for a specific weather station.
 
-    First checks the local SQLite cache. If no data exists for the requested
-    period, it fetches live data from external sources and saves it in the 
-    background.
+    Looks up which parts of the requested range the local SQLite cache
+    covers. Only the missing spans are computed live (all of them from one
+    download and parse) on the dedicated fetch pool, merged with the cached
+    rows and handed to the write-behind queue together with their coverage.
+    Cached reads run on the default executor, so they never queue behind
+    cold fetches. Cached recent years past their TTL are still served from
+    the cache while a background job revalidates them.
+
+    Fully cached responses carry a strong ETag and answer a matching
+    `If-None-Match` with 304. Complete historical ranges are immutable, so
+    their 304 needs no database access at all; live results are marked
+    `no-cache` until they are in the cache.
+
+    The body is rendered with orjson (see `responses.py`), either as rows
+    or, with `format=columns`, as one array per field. `format=ndjson` (or
+    `Accept: application/x-ndjson`) streams one row per line: cached rows
+    straight from the cursor, live rows per block of years as soon as
+    they are aggregated.
 
     Args:
         station_id: Unique NOAA station identifier.
-        background_tasks: FastAPI background task manager.
-        response: FastAPI response object for setting headers.
         start_year: Optional start year for filtering.
         end_year: Optional end year for filtering.
+        fmt: Response format, "rows" (default), "columns" or "ndjson".
+        accept: Accept header; `application/x-ndjson` selects streaming.
+        if_none_match: ETag(s) the client already has.
 
     Returns:
-        List of dictionaries containing aggregated temperature metrics.
+        Aggregated temperature metrics ordered by year and period, an empty
+        304, or a 202 with the job to poll if a cold fetch takes longer than
+        `TEMPS_LATENCY_BUDGET` seconds.
 
     Raises:
-        HTTPException: If start_year > end_year, or if retrieval completely fails.
+        HTTPException: If start_year > end_year, 503 with Retry-After if the
+            fetch pool is full, or if retrieval completely fails.
     """
-    # Browser Caching (1 day)
-    response.headers["Cache-Control"] = "public, max-age=86400"
-
     # Check if the year range is valid
     if start_year is not None and end_year is not None and start_year > end_year:
         raise HTTPException(
             status_code=400, detail="start_year must be <= end_year")
+    if fmt == "rows" and accept and NDJSON_MEDIA_TYPE in accept:
+        fmt = "ndjson"
+    stream = fmt == "ndjson"
+
+    # Tags of complete historical ranges are only issued once the range is
+    # cached and never change afterwards, so they are checked before any read.
+    # `*` is only honoured below, once the cache shows the station exists
+    immutable = is_immutable_range(end_year)
+    if immutable:
+        etag = _temps_etag(station_id, start_year, end_year, fmt, "immutable")
+        if etag_matches(if_none_match, etag, allow_wildcard=False):
+            return not_modified(etag, CACHE_IMMUTABLE)
 
-    # Connect to the database
-    conn = sqlite3.connect(DB_PATH)
-    conn.row_factory = sqlite3.Row
     try:
-        # Check if we already have data
-        create_temps_schema(conn) # Ensure schema exists
-        
+        # Check which parts of the range are already cached
         start_t = time.time()
-        rows = get_station_periods(station_id, conn, start_year, end_year)
-        
-        if rows:
+        rows, missing, lat, stale, changed_at = await asyncio.to_thread(
+            _read_cached_periods, station_id, start_year, end_year, not stream)
+
+        if not missing:
+            if stale and _schedule_revalidation(station_id, lat):
+                print(f"[API] Recent periods of {station_id} are stale, revalidating in background")
+            if immutable:
+                policy = CACHE_IMMUTABLE
+            else:
+                etag, policy = _temps_etag(station_id, start_year, end_year, fmt, changed_at), CACHE_RECENT
+            if etag_matches(if_none_match, etag):
+                return not_modified(etag, policy)
+            if stream:
+                return StreamingResponse(
+                    _stream_cached_periods(station_id, start_year, end_year),
+                    media_type=NDJSON_MEDIA_TYPE,
+                    headers=cache_headers(etag, policy),
+                )
             elapsed = time.time() - start_t
             print(f"[API] Serving {len(rows)} rows from DB cache (Time: {elapsed:.2f}s)")
-            return rows
-        print(f"[API] No DB data for {station_id}, fetching live...")
-        raw_rows = fetch_and_parse_station_periods(station_id, True, start_year, end_year)
-        response_data = []
-        for r in raw_rows:
-            response_data.append({
-                "station_id": r[0],
-                "year": r[1],
-                "period": r[2],
-                "avg_tmax_c": r[3],
-                "avg_tmin_c": r[4],
-                "n_tmax": r[5],
-                "n_tmin": r[6]
-            })
-        if raw_rows:
-             background_tasks.add_task(_background_save_to_db, raw_rows)
-
-        print(f"[API] Returning {len(response_data)} rows immediately (Write-Behind)")
-        return response_data
+            return temps_response(rows, fmt, cache_headers(etag, policy))
+        print(f"[API] Cache for {station_id} misses {missing}, fetching live...")
 
+        try:
+            if stream:
+                # Only the download/parse is shared; aggregation streams per request
+                arrays, _ = await _temps_flight.run(
+                    ("arrays", station_id),
+                    lambda: _fetch_pool.run(_tracked_fetch, station_id, require_station_arrays, station_id),
+                )
+                # Blocks are aggregated on the fetch pool, the first one before
+                # responding, so a saturated pool still answers 503
+                blocks = iter_station_period_blocks(station_id, arrays, missing, True, lat)
+                first = await _fetch_pool.run(next, blocks, None)
+                return StreamingResponse(
+                    _stream_live_periods(station_id, first, blocks, missing, rows, start_year),
+                    media_type=NDJSON_MEDIA_TYPE,
+                    headers=cache_headers(None, CACHE_REVALIDATE),
+                )
+            job, _ = _submit_temps_job(station_id, start_year, end_year)
+        except PoolSaturated:
+            print(f"[API] Fetch pool saturated, rejecting {station_id}")
+            raise HTTPException(
+                status_code=503,
+                detail="Too many stations being fetched, please retry",
+                headers={"Retry-After": str(FETCH_RETRY_AFTER)},
+            )
+
+        # Slow cold fetches continue as a job instead of running into proxy timeouts
+        if not await job.wait(TEMPS_LATENCY_BUDGET):
+            print(f"[API] {station_id} exceeds the latency budget, handing off to job {job.job_id}")
+            return JSONResponse(
+                _job_payload(job),
+                status_code=202,
+                headers={"Location": f"/api/jobs/{job.job_id}", "Retry-After": str(FETCH_RETRY_AFTER)},
+            )
+        response_data = job.future.result()
 
+        print(f"[API] Returning {len(response_data)} rows immediately (Write-Behind)")
+        # Not cached yet: clients must come back instead of keeping this copy
+        return temps_response(response_data, fmt, cache_headers(None, CACHE_REVALIDATE))
 
+    except HTTPException:
+        raise
     except FileNotFoundError as e:
         raise HTTPException(status_code=404, detail=str(e))
     except Exception as e:
         print(f"[API] Error: {e}")
         raise HTTPException(status_code=500, detail=str(e))
-    finally:
-        conn.close()
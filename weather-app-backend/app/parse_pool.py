@@ -0,0 +1,178 @@
+"""Process pool for the CPU-bound parse and aggregation steps of cold fetches.
+
+Parsing a station file and aggregating its periods is pandas/NumPy work
+that largely holds the GIL, so cold requests running on the fetch threads
+share one core. With `PARSE_PROCESSES` > 0 these steps run in a pool of
+worker processes instead, while downloads stay on the fetch threads:
+
+    fetch thread      download (S3 / NCEI, hedged)
+    worker process    parse file -> daily arrays      (shared memory back)
+    worker process    aggregate spans -> period rows  (pickled back)
+
+Workers are started with `spawn` and pre-import pandas/NumPy (`warm_up`),
+so the first cold request does not pay for process start-up. The daily
+arrays of a parsed station are returned through one shared-memory block
+instead of being pickled through the result pipe; period rows are small
+and pickled as usual. `PARSE_PROCESSES=0` (default) keeps everything
+in-process.
+
+Authors:
+    Lisa Fritsch, Jan Goliasch, Finja Sterner, Menko Hornstein
+"""
+from __future__ import annotations
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from multiprocessing.shared_memory import SharedMemory
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+
+# Worker processes for parsing and aggregation (0 = in-process)
+PARSE_PROCESSES = int(os.getenv("PARSE_PROCESSES", "0"))
+
+# Shared-memory block name plus (array name, dtype, shape, offset) per array
+SharedArrays = Tuple[str, List[Tuple[str, str, Tuple[int, ...], int]]]
+
+
+def _warm_up() -> None:
+    """Pre-imports the heavy modules in a fresh worker process."""
+    import numpy  # noqa: F401
+    import pandas  # noqa: F401
+    import app.import_temps  # noqa: F401
+
+
+def share_arrays(arrays: Dict[str, np.ndarray]) -> SharedArrays:
+    """Copies arrays into one new shared-memory block.
+
+    The block stays alive after this process closes it; the receiver
+    unlinks it in `receive_arrays`.
+    """
+    layout = []
+    offset = 0
+    for name, array in arrays.items():
+        layout.append((name, array.dtype.str, array.shape, offset))
+        offset += array.nbytes
+    shm = SharedMemory(create=True, size=max(offset, 1))
+    try:
+        for (name, dtype, shape, start), array in zip(layout, arrays.values()):
+            np.ndarray(shape, dtype, buffer=shm.buf, offset=start)[...] = array
+    except BaseException:
+        shm.close()
+        shm.unlink()
+        raise
+    shm.close()
+    return shm.name, layout
+
+
+def receive_arrays(shared: SharedArrays) -> Dict[str, np.ndarray]:
+    """Copies the arrays out of a block from `share_arrays` and unlinks it."""
+    name, layout = shared
+    shm = SharedMemory(name=name)
+    try:
+        return {
+            key: np.ndarray(shape, dtype, buffer=shm.buf, offset=start).copy()
+            for key, dtype, shape, start in layout
+        }
+    finally:
+        shm.close()
+        shm.unlink()
+
+
+def _call_sharing(fn: Callable[..., Optional[Dict[str, np.ndarray]]], *args: Any) -> Optional[SharedArrays]:
+    """Runs `fn` in a worker and hands its arrays back through shared memory."""
+    arrays = fn(*args)
+    return None if arrays is None else share_arrays(arrays)
+
+
+class ParsePool:
+    """Lazily started, self-healing pool of parse worker processes."""
+
+    def __init__(self, processes: int = PARSE_PROCESSES) -> None:
+        self.processes = max(1, int(processes))
+        self._lock = threading.Lock()
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._calls = 0
+        self._restarts = 0
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        with self._lock:
+            if self._executor is None:
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.processes,
+                    mp_context=multiprocessing.get_context("spawn"),
+                    initializer=_warm_up,
+                )
+            self._calls += 1
+            return self._executor
+
+    def warm_up(self) -> None:
+        """Starts all worker processes and waits until they are ready."""
+        executor = self._get_executor()
+        for future in [executor.submit(_warm_up) for _ in range(self.processes)]:
+            future.result()
+
+    def call(self, fn: Callable[..., Any], *args: Any) -> Any:
+        """Runs `fn(*args)` in a worker process and returns its result.
+
+        A crashed worker breaks the whole executor; it is replaced, so only
+        the calls that were running fail.
+        """
+        executor = self._get_executor()
+        try:
+            return executor.submit(fn, *args).result()
+        except BrokenProcessPool:
+            with self._lock:
+                if self._executor is executor:
+                    self._executor = None
+                    self._restarts += 1
+            executor.shutdown(wait=False)
+            raise
+
+    def call_arrays(self, fn: Callable[..., Optional[Dict[str, np.ndarray]]], *args: Any) -> Optional[Dict[str, np.ndarray]]:
+        """Like `call` for functions returning arrays, transferred via shared memory."""
+        shared = self.call(_call_sharing, fn, *args)
+        return None if shared is None else receive_arrays(shared)
+
+    def stats(self) -> dict:
+        """Returns pool counters for the metrics endpoint."""
+        with self._lock:
+            return {
+                "processes": self.processes,
+                "started": self._executor is not None,
+                "calls": self._calls,
+                "restarts": self._restarts,
+            }
+
+    def shutdown(self, wait: bool = True) -> None:
+        """Stops the worker processes; a later call starts new ones."""
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=wait)
+
+
+_pool: Optional[ParsePool] = None
+_pool_lock = threading.Lock()
+
+
+def get_parse_pool() -> Optional[ParsePool]:
+    """Returns the process-wide parse pool, or None if `PARSE_PROCESSES` is 0."""
+    global _pool
+    if PARSE_PROCESSES <= 0:
+        return None
+    with _pool_lock:
+        if _pool is None:
+            _pool = ParsePool(PARSE_PROCESSES)
+        return _pool
+
+
+def close_parse_pool() -> None:
+    """Stops and forgets the shared pool (application shutdown, tests)."""
+    global _pool
+    with _pool_lock:
+        pool, _pool = _pool, None
+    if pool is not None:
+        pool.shutdown(wait=False)
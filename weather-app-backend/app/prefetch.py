@@ -0,0 +1,294 @@
+"""Bulk prefetch (warm-up) of the temps cache for many stations.
+
+Selects stations by bounding box, station-ID prefix (e.g. `GM`, `US`) or
+an explicit list and computes their complete period history ahead of
+time, so first requests for these stations are served from SQLite.
+
+Every station is fetched exactly like a cold live request
+(`require_station_arrays`): daily store first, one download per station
+across workers (`fetch-<station>` lock), S3 with fallback to the NCEI DLY
+file. The job runs as a small pipeline:
+
+    1. Fetch      threads, at most `parallelism` stations in flight
+    2. Parse      process pool (`processes`) for parsing and aggregation;
+                  0 = like the API (`PARSE_PROCESSES`, in-process by default)
+    3. Save       one writer, rows plus full coverage per station
+                  (stations without data are counted as empty, not covered)
+
+Progress is resumable: a station counts as done once its full coverage
+is recorded in `station_temp_coverage`, so rerunning a job skips every
+station that was already finished.
+
+Usage (from weather-app-backend/):
+    python -m app.prefetch --prefix GM --parallelism 8 --processes 4
+    python -m app.prefetch --bbox 47 5 55 15
+    python -m app.prefetch --stations GM000003319 USW00094728
+
+Authors:
+    Lisa Fritsch, Jan Goliasch, Finja Sterner, Menko Hornstein
+"""
+from __future__ import annotations
+import argparse
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence, Tuple, Union
+
+from app.db import DB_PATH, get_pool
+from app.import_temps import (
+    COVERAGE_MAX_YEAR,
+    COVERAGE_MIN_YEAR,
+    StationDataUnavailable,
+    _aggregate_spans,
+    get_missing_spans,
+    require_station_arrays,
+    save_station_coverage,
+    save_station_periods_to_db,
+)
+from app.parse_pool import ParsePool
+
+# Default limits
+PREFETCH_PARALLELISM = int(os.getenv("PREFETCH_PARALLELISM", "8"))
+PREFETCH_PROCESSES = int(os.getenv("PREFETCH_PROCESSES", str(os.cpu_count() or 1)))
+
+# Number of recent errors kept per job
+MAX_ERRORS = 50
+
+
+def select_stations(
+    conn: sqlite3.Connection,
+    bbox: Optional[Sequence[float]] = None,
+    prefix: Optional[str] = None,
+    station_ids: Optional[Sequence[str]] = None,
+) -> List[Tuple[str, float]]:
+    """Returns (station_id, lat) of all stations matching every given filter.
+
+    Args:
+        conn: Connection to the stations database.
+        bbox: (min_lat, min_lon, max_lat, max_lon) in degrees.
+        prefix: Station-ID prefix, e.g. a country code like "GM".
+        station_ids: Explicit list of station IDs.
+
+    Raises:
+        ValueError: If no filter is given or the bounding box is malformed.
+    """
+    if bbox is None and not prefix and not station_ids:
+        raise ValueError("Select stations by bbox, prefix or station_ids")
+
+    sql = "SELECT s.station_id, s.lat FROM stations s"
+    where: List[str] = []
+    params: List[object] = []
+
+    if bbox is not None:
+        if len(bbox) != 4:
+            raise ValueError("bbox must be [min_lat, min_lon, max_lat, max_lon]")
+        min_lat, min_lon, max_lat, max_lon = (float(v) for v in bbox)
+        sql += " JOIN stations_rtree r ON r.id = s.rowid"
+        where.append("r.max_lat >= ? AND r.min_lat <= ? AND r.max_lon >= ? AND r.min_lon <= ?")
+        params += [min_lat, max_lat, min_lon, max_lon]
+
+    if prefix:
+        where.append("s.station_id GLOB ?")
+        params.append(prefix.replace("[", "[[]").replace("*", "[*]").replace("?", "[?]") + "*")
+
+    if station_ids:
+        where.append(f"s.station_id IN ({','.join('?' * len(station_ids))})")
+        params += list(station_ids)
+
+    sql += " WHERE " + " AND ".join(where) + " ORDER BY s.station_id;"
+    return [(r[0], float(r[1])) for r in conn.execute(sql, params).fetchall()]
+
+
+def prefetch_station(station_id: str, lat: Optional[float], pool: Optional[ParsePool] = None) -> List[Tuple]:
+    """Fetches a station like a cold live request and aggregates its complete history.
+
+    Returns:
+        The period tuples of all years.
+
+    Raises:
+        StationDataUnavailable: If neither source had temperature data.
+    """
+    arrays = require_station_arrays(station_id, pool)
+    spans = [(None, None)]
+    if pool is None:
+        return _aggregate_spans(station_id, arrays, spans, True, lat)
+    return pool.call(_aggregate_spans, station_id, arrays, spans, True, lat)
+
+
+class PrefetchJob:
+    """One bulk prefetch run with thread-safe progress counters."""
+
+    def __init__(
+        self,
+        stations: List[Tuple[str, float]],
+        parallelism: int = PREFETCH_PARALLELISM,
+        processes: int = PREFETCH_PROCESSES,
+        db_path: Union[str, Path] = DB_PATH,
+        job_id: Optional[str] = None,
+    ) -> None:
+        self.job_id = job_id or uuid.uuid4().hex[:12]
+        self.stations = stations
+        self.parallelism = max(1, int(parallelism))
+        self.processes = max(0, int(processes))
+        self.db_path = db_path
+        self.status = "pending"
+        self._lock = threading.Lock()
+        self._cancel = threading.Event()
+        self._started_at: Optional[float] = None
+        self._finished_at: Optional[float] = None
+        self._skipped = 0
+        self._done = 0
+        self._failed = 0
+        self._empty = 0
+        self._rows = 0
+        self._errors: List[dict] = []
+
+    def cancel(self) -> None:
+        """Stops scheduling new stations; running ones still finish."""
+        self._cancel.set()
+
+    def _pending_stations(self) -> List[Tuple[str, float]]:
+        """Drops stations whose full history is already cached (resume)."""
+        with get_pool(self.db_path).reader() as conn:
+            todo = [(sid, lat) for sid, lat in self.stations if get_missing_spans(conn, sid, None, None)]
+        with self._lock:
+            self._skipped = len(self.stations) - len(todo)
+        return todo
+
+    def _fail(self, station_id: str, error: BaseException) -> None:
+        # Reported through `stats()["errors"]` and the progress line
+        with self._lock:
+            self._failed += 1
+            self._errors.append({"station_id": station_id, "error": str(error)})
+            del self._errors[:-MAX_ERRORS]
+
+    def _empty_station(self) -> None:
+        # No coverage, so the station is not served as an empty cache hit
+        # and a later job or request tries it again
+        with self._lock:
+            self._done += 1
+            self._empty += 1
+
+    def _save(self, station_id: str, rows: List[Tuple]) -> None:
+        if not rows:
+            self._empty_station()
+            return
+        with get_pool(self.db_path).writer() as conn:
+            save_station_periods_to_db(conn, rows)
+            save_station_coverage(conn, [(station_id, COVERAGE_MIN_YEAR, COVERAGE_MAX_YEAR)])
+        with self._lock:
+            self._done += 1
+            self._rows += len(rows)
+
+    def run(self) -> dict:
+        """Runs the job to completion in the calling thread and returns its stats."""
+        with self._lock:
+            self.status = "running"
+            self._started_at = time.time()
+
+        pool = ParsePool(self.processes) if self.processes else None
+        try:
+            todo = self._pending_stations()
+            queue = list(reversed(todo))
+
+            with ThreadPoolExecutor(max_workers=self.parallelism, thread_name_prefix="prefetch") as fetch:
+                running: Dict[Future, str] = {}
+
+                def refill() -> None:
+                    # Keep at most `parallelism` stations in flight
+                    while queue and len(running) < self.parallelism and not self._cancel.is_set():
+                        sid, lat = queue.pop()
+                        running[fetch.submit(prefetch_station, sid, lat, pool)] = sid
+
+                refill()
+                while running:
+                    finished, _ = wait(list(running), return_when=FIRST_COMPLETED)
+                    for fut in finished:
+                        sid = running.pop(fut)
+                        try:
+                            self._save(sid, fut.result())
+                        except StationDataUnavailable:
+                            self._empty_station()
+                        except Exception as e:
+                            self._fail(sid, e)
+                    refill()
+                    print(f"[PREFETCH] {self.progress_line()}", flush=True)
+
+            status = "cancelled" if self._cancel.is_set() else "done"
+        except Exception as e:
+            print(f"[PREFETCH] Job {self.job_id} failed: {e}", flush=True)
+            with self._lock:
+                self._errors.append({"station_id": None, "error": str(e)})
+            status = "failed"
+        finally:
+            if pool is not None:
+                pool.shutdown()
+
+        with self._lock:
+            self.status = status
+            self._finished_at = time.time()
+        return self.stats()
+
+    def start(self) -> threading.Thread:
+        """Runs the job on a background thread (admin API)."""
+        thread = threading.Thread(target=self.run, name=f"prefetch-{self.job_id}", daemon=True)
+        thread.start()
+        return thread
+
+    def stats(self) -> dict:
+        """Returns progress counters and throughput."""
+        with self._lock:
+            if self._started_at is None:
+                elapsed = 0.0
+            else:
+                elapsed = (self._finished_at or time.time()) - self._started_at
+            processed = self._done + self._failed
+            return {
+                "job_id": self.job_id,
+                "status": self.status,
+                "total": len(self.stations),
+                "skipped": self._skipped,
+                "done": self._done,
+                "empty": self._empty,
+                "failed": self._failed,
+                "remaining": max(0, len(self.stations) - self._skipped - processed),
+                "rows": self._rows,
+                "elapsed_s": round(elapsed, 2),
+                "stations_per_second": round(processed / elapsed, 3) if elapsed > 0 else 0.0,
+                "parallelism": self.parallelism,
+                "processes": self.processes,
+                "errors": list(self._errors),
+            }
+
+    def progress_line(self) -> str:
+        """One-line progress summary for logs and the CLI."""
+        s = self.stats()
+        return (f"{s['done'] + s['failed']}/{s['total'] - s['skipped']} stations "
+                f"({s['skipped']} skipped, {s['failed']} failed), "
+                f"{s['rows']} rows, {s['stations_per_second']} stations/s")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--bbox", type=float, nargs=4, metavar=("MIN_LAT", "MIN_LON", "MAX_LAT", "MAX_LON"))
+    parser.add_argument("--prefix", help="Station-ID prefix, e.g. GM or US")
+    parser.add_argument("--stations", nargs="+", help="Explicit station IDs")
+    parser.add_argument("--parallelism", type=int, default=PREFETCH_PARALLELISM, help="Stations in flight")
+    parser.add_argument("--processes", type=int, default=PREFETCH_PROCESSES, help="Parse processes (0 = like the API)")
+    args = parser.parse_args()
+
+    with get_pool().reader() as conn:
+        stations = select_stations(conn, args.bbox, args.prefix, args.stations)
+    print(f"[PREFETCH] {len(stations)} stations selected", flush=True)
+
+    job = PrefetchJob(stations, args.parallelism, args.processes)
+    stats = job.run()
+    print(f"[PREFETCH] {stats['status']}: {job.progress_line()}", flush=True)
+
+
+if __name__ == "__main__":
+    main()
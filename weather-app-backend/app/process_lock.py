@@ -0,0 +1,104 @@
+"""Advisory file locks that coordinate several API worker processes.
+
+With `uvicorn --workers N` (or gunicorn) every worker runs its own
+lifespan, single-flight and job registry. The shared state that must not
+be built twice lives on disk (SQLite database, daily store), so the
+workers coordinate through `flock` locks on files in `LOCK_DIR`:
+
+    bootstrap        one worker creates the schema and imports stations,
+                     the others wait and then find the shared DB ready
+    fetch-<station>  one worker downloads and parses a cold station, the
+                     others wait and then read its daily store
+
+`flock` locks belong to an open file, so they exclude threads of the same
+process as well, and the kernel releases them when a worker dies. Lock
+files are never deleted: removing a file somebody still waits on would
+let a third process lock a new file of the same name.
+
+Authors:
+    Lisa Fritsch, Jan Goliasch, Finja Sterner, Menko Hornstein
+"""
+from __future__ import annotations
+import fcntl
+import os
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import IO, Iterator, Optional
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+LOCK_DIR = Path(os.getenv("LOCK_DIR", str(BASE_DIR / "data" / "locks")))
+
+# Seconds between attempts while another process holds a lock
+LOCK_POLL_SECONDS = 0.05
+
+# How long a worker waits for the bootstrap of another worker
+BOOTSTRAP_LOCK_TIMEOUT = float(os.getenv("BOOTSTRAP_LOCK_TIMEOUT", "1800"))
+
+# How long a cold fetch waits for another worker fetching the same station
+FETCH_LOCK_TIMEOUT = float(os.getenv("FETCH_LOCK_TIMEOUT", "120"))
+
+
+class LockTimeout(Exception):
+    """Raised when a required lock could not be acquired in time."""
+
+
+class FileLock:
+    """Exclusive advisory lock on one file, across processes and threads."""
+
+    def __init__(self, path: Path) -> None:
+        self.path = path
+        self._file: Optional[IO[bytes]] = None
+
+    @property
+    def locked(self) -> bool:
+        return self._file is not None
+
+    def acquire(self, timeout: Optional[float] = None) -> bool:
+        """Waits up to `timeout` seconds (None = forever) for the lock.
+
+        Returns:
+            True once the lock is held, False if the timeout expired.
+        """
+        if self._file is not None:
+            raise RuntimeError(f"{self.path.name} is already held by this lock")
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        f = open(self.path, "ab")
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            try:
+                fcntl.flock(f.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+                self._file = f
+                return True
+            except BlockingIOError:
+                if deadline is not None and time.monotonic() >= deadline:
+                    f.close()
+                    return False
+                time.sleep(LOCK_POLL_SECONDS)
+
+    def release(self) -> None:
+        """Releases the lock if it is held."""
+        f, self._file = self._file, None
+        if f is not None:
+            fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+            f.close()
+
+
+def named_lock(name: str) -> FileLock:
+    """Returns the lock `name` shared by all workers (file `LOCK_DIR/<name>.lock`)."""
+    return FileLock(LOCK_DIR / f"{name}.lock")
+
+
+@contextmanager
+def holding(name: str, timeout: Optional[float] = None) -> Iterator[bool]:
+    """Holds the lock `name` for the block if it can be acquired in time.
+
+    Yields whether the lock is held, so callers decide whether to go on
+    without it.
+    """
+    lock = named_lock(name)
+    acquired = lock.acquire(timeout)
+    try:
+        yield acquired
+    finally:
+        lock.release()
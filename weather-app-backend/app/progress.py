@@ -0,0 +1,152 @@
+"""Progress events of cold station fetches, for Server-Sent Events.
+
+A cold fetch downloads, parses and aggregates a station's whole history,
+which can take many seconds when S3 fails and NCEI is slow. Every live
+fetch opens a progress channel for its station and reports its phases:
+
+    started     fetch accepted by the fetch pool
+    s3          S3 download attempt started
+    fallback    S3 failed or was empty, NCEI DLY attempt started
+    download    {"source", "bytes", "total"} while a file streams in
+    parsed      {"rows"} daily values parsed
+    aggregated  {"rows"} periods computed
+    saved       {"rows"} periods committed by the write-behind queue (last)
+    error       {"detail"} the fetch failed (last)
+
+Code deep inside the fetch reports by station ID through `report`, so no
+channel object has to be threaded through the loaders; without an open
+channel a report is a no-op. Publishers run on worker threads, subscribers
+are coroutines: they are woken through their event loop. Finished channels
+stay readable for `PROGRESS_KEEP_SECONDS`, so a client that subscribes
+just after the fetch still sees how it ended.
+
+Authors:
+    Lisa Fritsch, Jan Goliasch, Finja Sterner, Menko Hornstein
+"""
+from __future__ import annotations
+import asyncio
+import os
+import threading
+import time
+from typing import AsyncIterator, Dict, List, Optional, Tuple
+
+# Seconds a finished channel is kept for late subscribers
+PROGRESS_KEEP_SECONDS = float(os.getenv("PROGRESS_KEEP_SECONDS", "60"))
+
+# Phases that end a channel
+FINAL_PHASES = ("saved", "error")
+
+
+class ProgressChannel:
+    """Ordered event log of one station fetch."""
+
+    def __init__(self, station_id: str) -> None:
+        self.station_id = station_id
+        self.events: List[dict] = []
+        self.finished_at: Optional[float] = None
+        self._lock = threading.Lock()
+        self._waiters: List[Tuple[asyncio.AbstractEventLoop, asyncio.Event]] = []
+
+    @property
+    def done(self) -> bool:
+        return self.finished_at is not None
+
+    def publish(self, phase: str, **data) -> None:
+        """Appends an event and wakes all subscribers (thread-safe)."""
+        with self._lock:
+            if self.finished_at is not None:
+                return
+            event = {"id": len(self.events) + 1, "phase": phase, "time": round(time.time(), 3), **data}
+            self.events.append(event)
+            if phase in FINAL_PHASES:
+                self.finished_at = time.time()
+            waiters, self._waiters = self._waiters, []
+        for loop, woken in waiters:
+            loop.call_soon_threadsafe(woken.set)
+
+    def since(self, last_id: int) -> List[dict]:
+        """Returns the events after `last_id`."""
+        with self._lock:
+            return self.events[last_id:]
+
+    async def subscribe(self, last_id: int = 0, heartbeat: float = 15.0) -> AsyncIterator[Optional[dict]]:
+        """Yields the events after `last_id` until the channel is done.
+
+        Yields None after `heartbeat` seconds without an event, so the
+        caller can keep idle connections alive.
+        """
+        loop = asyncio.get_running_loop()
+        while True:
+            woken = asyncio.Event()
+            with self._lock:
+                events = self.events[last_id:]
+                done = self.finished_at is not None
+                if not events and not done:
+                    self._waiters.append((loop, woken))
+            for event in events:
+                last_id = event["id"]
+                yield event
+            if done and not events:
+                return
+            if not events:
+                try:
+                    await asyncio.wait_for(woken.wait(), heartbeat)
+                except asyncio.TimeoutError:
+                    yield None
+
+
+class ProgressRegistry:
+    """Progress channels by station; one open channel per station."""
+
+    def __init__(self, keep_seconds: float = PROGRESS_KEEP_SECONDS) -> None:
+        self.keep_seconds = keep_seconds
+        self._lock = threading.Lock()
+        self._channels: Dict[str, ProgressChannel] = {}
+
+    def open(self, station_id: str) -> ProgressChannel:
+        """Returns the station's open channel, replacing a finished one."""
+        with self._lock:
+            self._prune()
+            channel = self._channels.get(station_id)
+            if channel is None or channel.done:
+                channel = ProgressChannel(station_id)
+                self._channels[station_id] = channel
+            return channel
+
+    def get(self, station_id: str) -> Optional[ProgressChannel]:
+        """Returns the station's open or recently finished channel."""
+        with self._lock:
+            self._prune()
+            return self._channels.get(station_id)
+
+    def report(self, station_id: str, phase: str, **data) -> None:
+        """Publishes to the station's open channel, if any."""
+        with self._lock:
+            channel = self._channels.get(station_id)
+        if channel is not None:
+            channel.publish(phase, **data)
+
+    def stats(self) -> dict:
+        """Returns the number of open and finished channels."""
+        with self._lock:
+            self._prune()
+            finished = sum(1 for c in self._channels.values() if c.done)
+            return {"open": len(self._channels) - finished, "finished": finished}
+
+    def _prune(self) -> None:
+        cutoff = time.time() - self.keep_seconds
+        for sid in [s for s, c in self._channels.items() if c.done and c.finished_at < cutoff]:
+            del self._channels[sid]
+
+
+_registry = ProgressRegistry()
+
+
+def get_progress_registry() -> ProgressRegistry:
+    """Returns the process-wide progress registry."""
+    return _registry
+
+
+def report(station_id: str, phase: str, **data) -> None:
+    """Publishes a progress event for a station fetch (no-op without a channel)."""
+    _registry.report(station_id, phase, **data)
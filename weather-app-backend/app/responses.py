@@ -0,0 +1,54 @@
+"""Fast JSON rendering of temps responses.
+
+Returning plain dicts from an endpoint sends every row through Pydantic's
+`jsonable_encoder` and the standard `json` encoder. Temps responses are
+rendered directly with orjson instead and returned as a ready `Response`,
+which FastAPI passes through untouched.
+
+Formats (`?format=`):
+
+    rows     [{"year": 1950, "period": "annual", ...}, ...]   (default)
+    columns  {"year": [1950, ...], "period": ["annual", ...], ...}
+    ndjson   {"year": 1950, "period": "annual", ...}\n...         (streamed)
+
+The columnar format names every field once instead of once per row and
+maps directly onto chart series. NDJSON (also chosen by
+`Accept: application/x-ndjson`) is streamed, so a chart can draw the
+first years while later ones are still read or aggregated.
+
+Authors:
+    Lisa Fritsch, Jan Goliasch, Finja Sterner, Menko Hornstein
+"""
+from __future__ import annotations
+from typing import Any, Dict, Iterable, List, Mapping, Optional, Sequence
+
+import orjson
+from fastapi.responses import ORJSONResponse
+
+# Fields of a temps row, in response order
+PERIOD_FIELDS = ("year", "period", "avg_tmax_c", "avg_tmin_c", "n_tmax", "n_tmin")
+
+TEMPS_FORMATS = ("rows", "columns", "ndjson")
+
+NDJSON_MEDIA_TYPE = "application/x-ndjson"
+
+
+def period_columns(rows: List[dict]) -> Dict[str, list]:
+    """Transposes temps rows into one list per field."""
+    return {field: [r[field] for r in rows] for field in PERIOD_FIELDS}
+
+
+def temps_response(rows: List[dict], fmt: str = "rows", headers: Optional[Mapping[str, str]] = None) -> ORJSONResponse:
+    """Renders temps rows in the requested format with orjson."""
+    content = period_columns(rows) if fmt == "columns" else rows
+    return ORJSONResponse(content, headers=dict(headers) if headers else None)
+
+
+def ndjson_lines(rows: Iterable[Sequence]) -> bytes:
+    """Renders period tuples (year, period, avg_tmax_c, ...) as NDJSON lines."""
+    return b"".join(orjson.dumps(dict(zip(PERIOD_FIELDS, r))) + b"\n" for r in rows)
+
+
+def ndjson_line(obj: Any) -> bytes:
+    """Renders one object as an NDJSON line."""
+    return orjson.dumps(obj) + b"\n"
@@ -0,0 +1,73 @@
+"""Single-flight deduplication of concurrent identical calls.
+
+If several callers request the same key at the same time (e.g. a link to
+one cold station is shared and opened by many users), only the first
+caller executes the function. All others wait for that in-flight call and
+share its result or exception. Callers are coroutines on the event loop;
+blocking work is handed to a thread pool inside `fn`.
+
+Authors:
+    Lisa Fritsch, Jan Goliasch, Finja Sterner, Menko Hornstein
+"""
+from __future__ import annotations
+import asyncio
+import threading
+from typing import Any, Awaitable, Callable, Dict, Hashable, Tuple
+
+
+class SingleFlight:
+    """Coalesces concurrent calls with the same key into one execution."""
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._tasks: Dict[Hashable, asyncio.Task] = {}
+        self._requests = 0
+        self._executions = 0
+        self._coalesced = 0
+
+    async def run(self, key: Hashable, fn: Callable[[], Awaitable[Any]]) -> Tuple[Any, bool]:
+        """Awaits `fn()` unless a task for `key` is already in flight.
+
+        The work runs as its own task, so a disconnecting leader does not
+        cancel it for the callers that are still waiting.
+
+        Args:
+            key: Identifies identical work, e.g. (station_id, start_year, end_year).
+            fn: Zero-argument coroutine function doing the work.
+
+        Returns:
+            A tuple (result, shared). `shared` is True if the result was
+            produced by another caller's task.
+
+        Raises:
+            Exception: Whatever `fn` raised, re-raised in every waiting caller.
+        """
+        with self._lock:
+            self._requests += 1
+            task = self._tasks.get(key)
+            if task is not None:
+                self._coalesced += 1
+                shared = True
+            else:
+                task = asyncio.ensure_future(fn())
+                self._tasks[key] = task
+                self._executions += 1
+                shared = False
+
+        if not shared:
+            def _forget(_task: asyncio.Task) -> None:
+                with self._lock:
+                    self._tasks.pop(key, None)
+            task.add_done_callback(_forget)
+
+        return await asyncio.shield(task), shared
+
+    def stats(self) -> dict:
+        """Returns counters for monitoring how many requests were coalesced."""
+        with self._lock:
+            return {
+                "requests": self._requests,
+                "executions": self._executions,
+                "coalesced": self._coalesced,
+                "in_flight": len(self._tasks),
+            }
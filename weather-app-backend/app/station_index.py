@@ -0,0 +1,427 @@
+"""Process-resident station index for fast vectorized station searches.
+
+Loads all stations and their TMAX/TMIN inventory year ranges once from the
+SQLite database into contiguous NumPy arrays (sorted by latitude). Radius
+searches then only need a binary search for the latitude band plus one
+vectorized Haversine pass over the candidates and never touch SQLite.
+Nearest-neighbour searches use a KD-tree over 3D unit vectors, where the
+chord length is monotonic in the great-circle distance.
+
+Every API worker process holds its own index. A station metadata refresh
+bumps `changed_at` in `source_files`; each worker compares that version
+with the one its index was loaded at (at most every `INDEX_CHECK_SECONDS`)
+and reloads, so all workers serve the same stations and search ETags.
+
+Authors:
+    Lisa Fritsch, Jan Goliasch, Finja Sterner, Menko Hornstein
+"""
+from __future__ import annotations
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Union
+
+import numpy as np
+from scipy.spatial import cKDTree
+
+from app.db import DB_PATH, get_pool
+from app.stations_search import EARTH_RADIUS_KM, MISSING
+
+# Seconds between checks whether another worker refreshed the station metadata
+INDEX_CHECK_SECONDS = float(os.getenv("INDEX_CHECK_SECONDS", "5"))
+
+
+def haversine_distances(lat: float, lon: float, lats: np.ndarray, lons: np.ndarray) -> np.ndarray:
+    """Vectorized great-circle distance from one point to many points.
+
+    Args:
+        lat: Latitude of the query point.
+        lon: Longitude of the query point.
+        lats: Latitudes of the target points.
+        lons: Longitudes of the target points.
+
+    Returns:
+        Array of distances in kilometers.
+    """
+    lat1_rad = np.radians(lat)
+    lat2_rad = np.radians(lats)
+    dlat = lat2_rad - lat1_rad
+    dlon = np.radians(lons) - np.radians(lon)
+
+    a = np.sin(dlat / 2) ** 2 + np.cos(lat1_rad) * np.cos(lat2_rad) * np.sin(dlon / 2) ** 2
+    return EARTH_RADIUS_KM * 2 * np.arcsin(np.sqrt(np.clip(a, 0.0, 1.0)))
+
+
+def to_unit_vectors(lats: np.ndarray, lons: np.ndarray) -> np.ndarray:
+    """Converts latitudes/longitudes in degrees to 3D unit vectors of shape (n, 3)."""
+    lat_rad = np.radians(lats)
+    lon_rad = np.radians(lons)
+    cos_lat = np.cos(lat_rad)
+    return np.column_stack((cos_lat * np.cos(lon_rad), cos_lat * np.sin(lon_rad), np.sin(lat_rad)))
+
+
+def chord_length(distance_km: float) -> float:
+    """Converts a great-circle distance to the chord length on the unit sphere."""
+    angle = min(distance_km / EARTH_RADIUS_KM, np.pi)
+    return float(2.0 * np.sin(angle / 2.0))
+
+
+class StationIndex:
+    """Immutable, latitude-sorted in-memory copy of the station table.
+
+    Attributes:
+        station_ids: Station identifiers.
+        names: Station names.
+        lat: Latitudes in degrees (ascending).
+        lon: Longitudes in degrees.
+        tmax_start, tmax_end, tmin_start, tmin_end: Inventory year ranges per
+            element, `MISSING` if the station has no such element.
+        min_year, max_year: Overall inventory year range, `MISSING` if none.
+        version: Content fingerprint; equal data gives equal versions in every process.
+        db_path, source_version: Database and metadata version (`read_index_version`)
+            the index was loaded from; None if it was built in memory.
+    """
+
+    def __init__(
+        self,
+        station_ids: np.ndarray,
+        names: np.ndarray,
+        lat: np.ndarray,
+        lon: np.ndarray,
+        tmax_start: np.ndarray,
+        tmax_end: np.ndarray,
+        tmin_start: np.ndarray,
+        tmin_end: np.ndarray,
+    ) -> None:
+        order = np.argsort(lat, kind="stable")
+        self.station_ids = np.ascontiguousarray(station_ids[order])
+        self.names = names[order]
+        self.lat = np.ascontiguousarray(lat[order], dtype=np.float64)
+        self.lon = np.ascontiguousarray(lon[order], dtype=np.float64)
+        self.tmax_start = np.ascontiguousarray(tmax_start[order], dtype=np.int32)
+        self.tmax_end = np.ascontiguousarray(tmax_end[order], dtype=np.int32)
+        self.tmin_start = np.ascontiguousarray(tmin_start[order], dtype=np.int32)
+        self.tmin_end = np.ascontiguousarray(tmin_end[order], dtype=np.int32)
+
+        # MIN(start_year) / MAX(end_year) over the inventory, ignoring missing elements
+        starts = np.where(self.tmax_start == MISSING, np.iinfo(np.int32).max, self.tmax_start)
+        starts = np.minimum(starts, np.where(self.tmin_start == MISSING, np.iinfo(np.int32).max, self.tmin_start))
+        self.min_year = np.where(starts == np.iinfo(np.int32).max, MISSING, starts).astype(np.int32)
+        self.max_year = np.maximum(self.tmax_end, self.tmin_end).astype(np.int32)
+
+        self._tree = cKDTree(to_unit_vectors(self.lat, self.lon))
+        self.version = self._content_version()
+        self.db_path: Optional[Path] = None
+        self.source_version: Optional[float] = None
+
+    def _content_version(self) -> str:
+        """Fingerprint of everything a search can return (used for ETags)."""
+        h = hashlib.blake2b(digest_size=8)
+        for column in (self.station_ids, self.lat, self.lon,
+                       self.tmax_start, self.tmax_end, self.tmin_start, self.tmin_end):
+            h.update(np.ascontiguousarray(column).tobytes())
+        h.update("\x00".join(self.names.tolist()).encode())
+        return h.hexdigest()
+
+    def __len__(self) -> int:
+        return len(self.station_ids)
+
+    @classmethod
+    def from_db(cls, db_path: Union[str, Path] = DB_PATH) -> "StationIndex":
+        """Loads the index from the `stations` and `station_coverage` tables.
+
+        Args:
+            db_path: Path to the SQLite database.
+
+        Returns:
+            A new StationIndex.
+
+        Raises:
+            FileNotFoundError: If the specified SQLite database does not exist.
+        """
+        db_path = Path(db_path)
+        if not db_path.exists():
+            raise FileNotFoundError(f"Database file not found at {db_path}")
+
+        sql = """
+        SELECT s.station_id, s.name, s.lat, s.lon,
+               c.tmax_start, c.tmax_end, c.tmin_start, c.tmin_end
+        FROM stations s
+        LEFT JOIN station_coverage c ON c.station_id = s.station_id
+        """
+        with get_pool(db_path).reader() as conn:
+            # Read before the rows, so a concurrent refresh at worst causes one more reload
+            source_version = read_index_version(conn)
+            rows = conn.execute(sql).fetchall()
+
+        def year_col(i: int) -> np.ndarray:
+            return np.array([MISSING if r[i] is None else r[i] for r in rows], dtype=np.int32)
+
+        index = cls(
+            station_ids=np.array([r[0] for r in rows], dtype="U11"),
+            names=np.array([(r[1] or "").strip() for r in rows], dtype=object),
+            lat=np.array([r[2] for r in rows], dtype=np.float64),
+            lon=np.array([r[3] for r in rows], dtype=np.float64),
+            tmax_start=year_col(4),
+            tmax_end=year_col(5),
+            tmin_start=year_col(6),
+            tmin_end=year_col(7),
+        )
+        index.db_path = db_path
+        index.source_version = source_version
+        return index
+
+    def _year_mask(self, idx: np.ndarray, start_year: int, end_year: int) -> np.ndarray:
+        """Same semantics as the SQL year filter: one element covers the whole range."""
+        return (
+            ((self.tmax_start[idx] <= start_year) & (self.tmax_end[idx] >= end_year))
+            | ((self.tmin_start[idx] <= start_year) & (self.tmin_end[idx] >= end_year))
+        )
+
+    def _to_items(self, idx: np.ndarray, dist: np.ndarray) -> List[Dict[str, Any]]:
+        """Converts index positions and distances to API result dictionaries."""
+        results: List[Dict[str, Any]] = []
+        for i, d in zip(idx.tolist(), dist.tolist()):
+            min_year = int(self.min_year[i])
+            max_year = int(self.max_year[i])
+            results.append(
+                {
+                    "station_id": str(self.station_ids[i]),
+                    "name": self.names[i],
+                    "lat": float(self.lat[i]),
+                    "lon": float(self.lon[i]),
+                    "distance_km": round(d, 3),
+                    "start_year": None if min_year == MISSING else min_year,
+                    "end_year": None if max_year == MISSING else max_year,
+                }
+            )
+        return results
+
+    def search(
+        self,
+        lat: float,
+        lon: float,
+        radius_km: float,
+        limit: int = 25,
+        start_year: Optional[int] = None,
+        end_year: Optional[int] = None,
+    ) -> List[Dict[str, Any]]:
+        """Finds up to `limit` stations within `radius_km`, like `find_stations_nearby`.
+
+        Args:
+            lat: Center latitude.
+            lon: Center longitude.
+            radius_km: Search radius in kilometers (capped at 100 km).
+            limit: Maximum number of stations to return. Defaults to 25.
+            start_year: Optional start year for filtering stations with data.
+            end_year: Optional end year for filtering stations with data.
+
+        Returns:
+            List of dictionaries detailing matching stations, ordered by distance.
+        """
+        if radius_km <= 0:
+            return []
+
+        radius_km = min(radius_km, 100.0)
+        limit = max(1, min(int(limit), 1000))
+
+        # Latitude band via binary search on the sorted latitudes
+        delta_lat = np.degrees(radius_km / EARTH_RADIUS_KM)
+        lo = np.searchsorted(self.lat, lat - delta_lat, side="left")
+        hi = np.searchsorted(self.lat, lat + delta_lat, side="right")
+        idx = np.arange(lo, hi)
+
+        if start_year is not None and end_year is not None:
+            idx = idx[self._year_mask(idx, start_year, end_year)]
+
+        dist = haversine_distances(lat, lon, self.lat[idx], self.lon[idx])
+        inside = dist <= radius_km
+        idx, dist = idx[inside], dist[inside]
+
+        order = np.lexsort((self.station_ids[idx], np.round(dist, 3)))[:limit]
+        return self._to_items(idx[order], dist[order])
+
+
+    def search_batch(
+        self,
+        queries: Iterable[Dict[str, Any]],
+        chunk_size: int = 1024,
+    ) -> Iterator[List[Dict[str, Any]]]:
+        """Resolves many radius searches, yielding one result list per query in input order.
+
+        Queries are processed in chunks with a single KD-tree ball query per
+        chunk, so memory stays bounded by `chunk_size` regardless of batch size.
+
+        Args:
+            queries: Dicts with the `search` arguments (lat, lon, radius_km and
+                optional limit, start_year, end_year).
+            chunk_size: Number of queries resolved per tree lookup.
+
+        Yields:
+            The same list `search` would return, for each query in order.
+        """
+        chunk: List[Dict[str, Any]] = []
+        for q in queries:
+            chunk.append(q)
+            if len(chunk) >= chunk_size:
+                yield from self._search_chunk(chunk)
+                chunk = []
+        if chunk:
+            yield from self._search_chunk(chunk)
+
+    def _search_chunk(self, chunk: List[Dict[str, Any]]) -> Iterator[List[Dict[str, Any]]]:
+        """Runs one vectorized ball query for a chunk of radius searches."""
+        lats = np.array([q["lat"] for q in chunk], dtype=np.float64)
+        lons = np.array([q["lon"] for q in chunk], dtype=np.float64)
+        radii = np.array([min(q["radius_km"], 100.0) for q in chunk], dtype=np.float64)
+
+        chords = np.array([chord_length(r) * (1 + 1e-9) + 1e-12 if r > 0 else 0.0 for r in radii])
+        candidates = self._tree.query_ball_point(to_unit_vectors(lats, lons), r=chords)
+
+        for q, lat, lon, radius_km, cand in zip(chunk, lats, lons, radii, candidates):
+            if radius_km <= 0:
+                yield []
+                continue
+            limit = max(1, min(int(q.get("limit", 25)), 1000))
+            start_year = q.get("start_year")
+            end_year = q.get("end_year")
+
+            idx = np.asarray(cand, dtype=np.intp)
+            if start_year is not None and end_year is not None:
+                idx = idx[self._year_mask(idx, start_year, end_year)]
+
+            dist = haversine_distances(lat, lon, self.lat[idx], self.lon[idx])
+            inside = dist <= radius_km
+            idx, dist = idx[inside], dist[inside]
+
+            order = np.lexsort((self.station_ids[idx], np.round(dist, 3)))[:limit]
+            yield self._to_items(idx[order], dist[order])
+
+    def nearest(
+        self,
+        lat: float,
+        lon: float,
+        k: int = 10,
+        max_distance_km: Optional[float] = None,
+        start_year: Optional[int] = None,
+        end_year: Optional[int] = None,
+    ) -> List[Dict[str, Any]]:
+        """Finds the `k` stations closest to a coordinate, regardless of density.
+
+        Args:
+            lat: Center latitude.
+            lon: Center longitude.
+            k: Number of stations to return (1..1000). Defaults to 10.
+            max_distance_km: Optional upper bound for the distance.
+            start_year: Optional start year for filtering stations with data.
+            end_year: Optional end year for filtering stations with data.
+
+        Returns:
+            List of dictionaries detailing the nearest stations, ordered by distance.
+        """
+        k = max(1, min(int(k), 1000))
+        n = len(self)
+        if n == 0 or (max_distance_km is not None and max_distance_km <= 0):
+            return []
+
+        upper = np.inf
+        if max_distance_km is not None:
+            # Small slack so stations exactly on the boundary survive float rounding
+            upper = chord_length(max_distance_km) * (1 + 1e-9) + 1e-12
+
+        year_filter = start_year is not None and end_year is not None
+        point = to_unit_vectors(np.array([lat]), np.array([lon]))[0]
+
+        # With a year filter some neighbours get discarded, so widen the query until
+        # we have k survivors or the tree is exhausted
+        k_query = k * 4 if year_filter else k
+        while True:
+            k_query = min(k_query, n)
+            _, idx = self._tree.query(point, k=k_query, distance_upper_bound=upper)
+            idx = np.atleast_1d(idx)
+            exhausted = k_query == n or idx[-1] == n
+            idx = idx[idx < n]
+            if year_filter:
+                idx = idx[self._year_mask(idx, start_year, end_year)]
+            if len(idx) >= k or exhausted:
+                break
+            k_query *= 4
+
+        dist = haversine_distances(lat, lon, self.lat[idx], self.lon[idx])
+        if max_distance_km is not None:
+            inside = dist <= max_distance_km
+            idx, dist = idx[inside], dist[inside]
+
+        order = np.lexsort((self.station_ids[idx], np.round(dist, 3)))[:k]
+        return self._to_items(idx[order], dist[order])
+
+
+_index: Optional[StationIndex] = None
+_index_lock = threading.Lock()
+_check_lock = threading.Lock()
+_checked_at = 0.0
+
+
+def read_index_version(conn: sqlite3.Connection) -> Optional[float]:
+    """Returns the version of the station metadata: the last `changed_at` in `source_files`.
+
+    None if no refresh has stored validators yet.
+    """
+    try:
+        return conn.execute("SELECT MAX(changed_at) FROM source_files;").fetchone()[0]
+    except sqlite3.OperationalError:
+        return None
+
+
+def get_station_index() -> Optional[StationIndex]:
+    """Returns the currently loaded station index, or None before the first load.
+
+    Reloads the index first if another worker refreshed the station
+    metadata since it was loaded (checked at most every `INDEX_CHECK_SECONDS`,
+    by one thread at a time; the others keep using the current index).
+    """
+    global _checked_at
+    index = _index
+    if index is None or index.db_path is None or time.monotonic() - _checked_at < INDEX_CHECK_SECONDS:
+        return index
+    if not _check_lock.acquire(blocking=False):
+        return index
+    try:
+        _checked_at = time.monotonic()
+        with get_pool(index.db_path).reader() as conn:
+            version = read_index_version(conn)
+        if version == index.source_version:
+            return index
+        print(f"[INDEX] Station metadata changed ({index.source_version} -> {version}), reloading", flush=True)
+        return reload_station_index(index.db_path)
+    except Exception as e:
+        print(f"[INDEX] Version check failed: {e}", flush=True)
+        return index
+    finally:
+        _check_lock.release()
+
+
+def reload_station_index(db_path: Union[str, Path] = DB_PATH) -> StationIndex:
+    """Builds a fresh index from the DB and swaps it in atomically.
+
+    Searches running concurrently keep using the previous index object until
+    they finish; new searches see the new one.
+
+    Args:
+        db_path: Path to the SQLite database.
+
+    Returns:
+        The newly loaded StationIndex.
+    """
+    global _index, _checked_at
+    with _index_lock:
+        start_t = time.time()
+        new_index = StationIndex.from_db(db_path)
+        _index = new_index
+        _checked_at = time.monotonic()
+        elapsed = time.time() - start_t
+        print(f"[INDEX] Loaded {len(new_index)} stations in {elapsed:.2f}s", flush=True)
+    return new_index
@@ -1,24 +1,22 @@
 """Provides geospatial search utilities for finding weather stations.
 
 Calculates distances using the Haversine formula and performs bounding
-box queries against the SQLite database to locate nearby stations.
+box queries against the R*Tree index in the SQLite database to locate
+nearby stations.
 
 Authors:
     Lisa Fritsch, Jan Goliasch, Finja Sterner, Menko Hornstein
 """
 from __future__ import annotations
 import math
-import sqlite3
 from pathlib import Path
 from typing import Any, Dict, List, Tuple, Union, Optional
 
+from app.db import DB_PATH, get_pool
+
 # Radius of the Earth in kilometers
 EARTH_RADIUS_KM = 6371.0
 
-# Base directory of the project
-BASE_DIR = Path(__file__).resolve().parent.parent
-DB_PATH = BASE_DIR / "weather.sqlite3"
-
 MISSING = -9999
 
 # Haversine distance
@@ -79,6 +77,8 @@ def normalize_lon(lon: float) -> float:
 
 def _lon_ranges(min_lon: float, max_lon: float) -> List[Tuple[float, float]]:
     """Calculates longitude ranges, handling wrap-around at the antimeridian."""
+    if max_lon - min_lon >= 360.0:
+        return [(-180.0, 180.0)]
     min_lon = normalize_lon(min_lon)
     max_lon = normalize_lon(max_lon)
     if min_lon <= max_lon:
@@ -123,34 +123,37 @@ def find_stations_nearby(
         raise FileNotFoundError(f"Database file not found at {db_path}")
 
     min_lat, max_lat, min_lon, max_lon = bounding_box(lat, lon, radius_km)
-    
-    sql = """
+
+    # One R*Tree range query per longitude range (two when crossing the antimeridian)
+    candidate_sql = """
     SELECT s.station_id, s.name, s.lat, s.lon,
-           (SELECT MIN(start_year) FROM station_inventory i WHERE i.station_id = s.station_id) as min_year,
-           (SELECT MAX(end_year) FROM station_inventory i WHERE i.station_id = s.station_id) as max_year
-    FROM stations s
-    WHERE s.lat BETWEEN ? AND ?
-      AND s.lon BETWEEN ? AND ?
+           c.min_year, c.max_year
+    FROM stations_rtree r
+    CROSS JOIN stations s ON s.rowid = r.id
+    LEFT JOIN station_coverage c ON c.station_id = s.station_id
+    WHERE r.max_lat >= ? AND r.min_lat <= ?
+      AND r.max_lon >= ? AND r.min_lon <= ?
     """
-    params = [min_lat, max_lat, min_lon, max_lon]
-
-    # If year filtering is requested, check existence of data in range
-    if start_year is not None and end_year is not None:
-        sql += """
-        AND EXISTS (
-             SELECT 1 FROM station_inventory i
-             WHERE i.station_id = s.station_id
-               AND i.start_year <= ? AND i.end_year >= ?
-        )
+
+    # If year filtering is requested, one element has to cover the whole range
+    year_filter = start_year is not None and end_year is not None
+    if year_filter:
+        candidate_sql += """
+        AND ((c.tmax_start <= ? AND c.tmax_end >= ?)
+          OR (c.tmin_start <= ? AND c.tmin_end >= ?))
         """
-        params.extend([start_year, end_year])
-    
-    conn = sqlite3.connect(db_path)
-    conn.row_factory = sqlite3.Row
-    try:
+
+    parts: List[str] = []
+    params: List[Any] = []
+    for range_min_lon, range_max_lon in _lon_ranges(min_lon, max_lon):
+        parts.append(candidate_sql)
+        params.extend([min_lat, max_lat, range_min_lon, range_max_lon])
+        if year_filter:
+            params.extend([start_year, end_year, start_year, end_year])
+    sql = " UNION ALL ".join(parts)
+
+    with get_pool(db_path).reader() as conn:
         rows = conn.execute(sql, params).fetchall()
-    finally:
-        conn.close()
 
     results: List[Dict[str, Any]] = []
     for row in rows:
@@ -0,0 +1,90 @@
+"""Bounded worker pools for slow, blocking work outside the request threads.
+
+Cold station fetches (download, parse, aggregate) run on a dedicated pool
+instead of the Starlette threadpool, so cached requests never queue behind
+them. The pool admits at most `max_workers + max_queue` jobs; further jobs
+are rejected with `PoolSaturated` so the API can answer 503 right away
+instead of piling up requests.
+
+Authors:
+    Lisa Fritsch, Jan Goliasch, Finja Sterner, Menko Hornstein
+"""
+from __future__ import annotations
+import asyncio
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Callable, Optional
+
+
+class PoolSaturated(Exception):
+    """Raised when a bounded pool has no free worker and its queue is full."""
+
+
+class BoundedExecutor:
+    """Thread pool with a hard limit on running plus queued jobs."""
+
+    def __init__(self, max_workers: int, max_queue: int = 0, name: str = "worker") -> None:
+        self.max_workers = max(1, int(max_workers))
+        self.max_pending = self.max_workers + max(0, int(max_queue))
+        self.name = name
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._lock = threading.Lock()
+        self._pending = 0
+        self._completed = 0
+        self._rejected = 0
+
+    def submit(self, fn: Callable[..., Any], *args: Any, **kwargs: Any) -> Future:
+        """Schedules `fn(*args, **kwargs)` if there is capacity left.
+
+        Raises:
+            PoolSaturated: If running plus queued jobs already reach the limit.
+        """
+        with self._lock:
+            if self._pending >= self.max_pending:
+                self._rejected += 1
+                raise PoolSaturated(f"{self.name} pool is full ({self.max_pending} jobs)")
+            self._pending += 1
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(
+                    max_workers=self.max_workers, thread_name_prefix=self.name)
+            executor = self._executor
+
+        try:
+            future = executor.submit(fn, *args, **kwargs)
+        except BaseException:
+            self._release(None)
+            raise
+        future.add_done_callback(self._release)
+        return future
+
+    async def run(self, fn: Callable[..., Any], *args: Any, **kwargs: Any) -> Any:
+        """Awaitable variant of `submit` for use inside async endpoints.
+
+        If the awaiting request is cancelled, the job still finishes and frees
+        its slot afterwards.
+        """
+        return await asyncio.wrap_future(self.submit(fn, *args, **kwargs))
+
+    def _release(self, _future: Any) -> None:
+        with self._lock:
+            self._pending -= 1
+            if _future is not None:
+                self._completed += 1
+
+    def stats(self) -> dict:
+        """Returns pool utilization counters for the metrics endpoint."""
+        with self._lock:
+            return {
+                "workers": self.max_workers,
+                "max_pending": self.max_pending,
+                "pending": self._pending,
+                "completed": self._completed,
+                "rejected": self._rejected,
+            }
+
+    def shutdown(self, wait: bool = True) -> None:
+        """Shuts down the worker threads; a later submit starts new ones."""
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=wait)
@@ -0,0 +1,209 @@
+"""Serialized write-behind queue for aggregated temperature rows.
+
+Cold requests hand their freshly aggregated rows to one dedicated writer
+thread instead of opening their own connection and transaction. The writer
+merges rows from many requests into a single `INSERT OR REPLACE`
+transaction, flushing when enough rows are buffered or a time threshold
+has passed, and drains everything that is left on shutdown.
+
+Authors:
+    Lisa Fritsch, Jan Goliasch, Finja Sterner, Menko Hornstein
+"""
+from __future__ import annotations
+import os
+import queue
+import threading
+import time
+from pathlib import Path
+from typing import Callable, List, Optional, Tuple, Union
+
+from app.db import DB_PATH, get_pool
+from app.import_temps import save_station_coverage, save_station_periods_to_db
+
+# Flush thresholds and queue bound
+WRITE_BATCH_ROWS = int(os.getenv("WRITE_BATCH_ROWS", "5000"))
+WRITE_FLUSH_INTERVAL = float(os.getenv("WRITE_FLUSH_INTERVAL", "0.5"))
+WRITE_QUEUE_SIZE = int(os.getenv("WRITE_QUEUE_SIZE", "1000"))
+
+_STOP = object()
+
+
+class WriteBehindQueue:
+    """Bounded queue feeding a single writer thread that commits in batches."""
+
+    def __init__(
+        self,
+        db_path: Union[str, Path] = DB_PATH,
+        batch_rows: int = WRITE_BATCH_ROWS,
+        flush_interval: float = WRITE_FLUSH_INTERVAL,
+        max_queue: int = WRITE_QUEUE_SIZE,
+    ) -> None:
+        self.db_path = db_path
+        self.batch_rows = max(1, int(batch_rows))
+        self.flush_interval = float(flush_interval)
+        self._queue: "queue.Queue[object]" = queue.Queue(maxsize=max(1, int(max_queue)))
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+        self._closed = False
+        self._started_at = time.time()
+        self._rows_written = 0
+        self._batches = 0
+        self._dropped = 0
+        self._errors = 0
+        self._last_flush_ms: Optional[float] = None
+
+    def start(self) -> None:
+        """Starts the writer thread (no-op if it is already running).
+
+        Also reopens a queue closed by `stop`.
+        """
+        with self._lock:
+            self._closed = False
+            self._start_thread()
+
+    def _start_thread(self) -> None:
+        """Starts the writer thread if it is not running. Caller holds `_lock`."""
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._started_at = time.time()
+        self._thread = threading.Thread(target=self._run, name="write-behind", daemon=True)
+        self._thread.start()
+
+    def submit(
+        self,
+        rows: List[Tuple],
+        coverage: Optional[List[Tuple[str, int, int]]] = None,
+        on_saved: Optional[Callable[[bool], None]] = None,
+    ) -> bool:
+        """Queues rows for the next batch without blocking the caller.
+
+        Args:
+            rows: Tuples as produced by `fetch_and_parse_station_periods`.
+            coverage: (station_id, start_year, end_year) spans the rows
+                complete. Recorded in the same flush, after the rows.
+            on_saved: Called on the writer thread with True once the rows
+                are committed, or with False if they were dropped or the
+                flush failed.
+
+        Returns:
+            False if the queue was full or already stopped and the rows were
+            dropped. The data is then simply fetched live again on a later
+            request.
+        """
+        if not rows and not coverage:
+            if on_saved is not None:
+                on_saved(True)
+            return True
+        with self._lock:
+            # Checked under the lock that `stop` closes the queue with, so no
+            # rows can land behind the stop marker
+            reason = "closed" if self._closed else None
+            if reason is None:
+                self._start_thread()
+                try:
+                    self._queue.put_nowait((rows, coverage or [], on_saved))
+                    return True
+                except queue.Full:
+                    reason = "full"
+            self._dropped += 1
+        print(f"[WRITE] Queue {reason}, dropped {len(rows)} rows", flush=True)
+        if on_saved is not None:
+            on_saved(False)
+        return False
+
+    def stop(self, timeout: Optional[float] = None) -> None:
+        """Flushes everything still queued and stops the writer thread.
+
+        Closes the queue first: later submissions are dropped instead of
+        starting a new writer thread, until `start` is called again.
+        """
+        with self._lock:
+            self._closed = True
+            thread = self._thread
+        if thread is None or not thread.is_alive():
+            return
+        self._queue.put(_STOP)
+        thread.join(timeout=timeout)
+        with self._lock:
+            self._thread = None
+
+    def _run(self) -> None:
+        batch: List[Tuple] = []
+        spans: List[Tuple[str, int, int]] = []
+        callbacks: List[Callable[[bool], None]] = []
+        deadline: Optional[float] = None
+        while True:
+            timeout = None if deadline is None else max(0.0, deadline - time.monotonic())
+            try:
+                item = self._queue.get(timeout=timeout)
+            except queue.Empty:
+                item = None
+
+            if item is _STOP:
+                self._notify(callbacks, self._flush(batch, spans))
+                return
+            if item is not None:
+                if deadline is None:
+                    deadline = time.monotonic() + self.flush_interval
+                rows, coverage, on_saved = item
+                batch.extend(rows)
+                spans.extend(coverage)
+                if on_saved is not None:
+                    callbacks.append(on_saved)
+
+            if deadline is not None and (len(batch) >= self.batch_rows or time.monotonic() >= deadline):
+                self._notify(callbacks, self._flush(batch, spans))
+                batch = []
+                spans = []
+                callbacks = []
+                deadline = None
+
+    @staticmethod
+    def _notify(callbacks: List[Callable[[bool], None]], ok: bool) -> None:
+        for on_saved in callbacks:
+            try:
+                on_saved(ok)
+            except Exception as e:
+                print(f"[WRITE] on_saved callback failed: {e}", flush=True)
+
+    def _flush(self, batch: List[Tuple], spans: Optional[List[Tuple[str, int, int]]] = None) -> bool:
+        """Writes one merged batch, then the coverage spans it completes.
+
+        Returns:
+            False if the write failed.
+        """
+        if not batch and not spans:
+            return True
+        start_t = time.perf_counter()
+        try:
+            with get_pool(self.db_path).writer() as conn:
+                if batch:
+                    save_station_periods_to_db(conn, batch)
+                if spans:
+                    save_station_coverage(conn, spans)
+        except Exception as e:
+            with self._lock:
+                self._errors += 1
+            print(f"[WRITE] Flush of {len(batch)} rows failed: {e}", flush=True)
+            return False
+        elapsed_ms = (time.perf_counter() - start_t) * 1000
+        with self._lock:
+            self._rows_written += len(batch)
+            self._batches += 1
+            self._last_flush_ms = round(elapsed_ms, 2)
+        print(f"[WRITE] Flushed {len(batch)} rows in {elapsed_ms:.1f}ms", flush=True)
+        return True
+
+    def stats(self) -> dict:
+        """Returns queue depth and write throughput for the metrics endpoint."""
+        with self._lock:
+            uptime = max(time.time() - self._started_at, 1e-9)
+            return {
+                "queue_depth": self._queue.qsize(),
+                "rows_written": self._rows_written,
+                "batches": self._batches,
+                "rows_per_second": round(self._rows_written / uptime, 2),
+                "last_flush_ms": self._last_flush_ms,
+                "dropped": self._dropped,
+                "errors": self._errors,
+            }
@@ -0,0 +1,68 @@
+"""Benchmarks the period aggregation before and after vectorizing its tail.
+
+Compares the legacy `_process_weather_data` (groupby, then `to_dict`
+records, `clean_val` per value and a `json.dumps` re-check per row) with
+the current single-pass implementation on synthetic daily frames of
+growing station history, and checks that both return identical tuples.
+
+Usage (from weather-app-backend/):
+    python -m benchmarks.bench_aggregation [--years 30 80 150] [--repeat 5]
+
+Authors:
+    Lisa Fritsch, Jan Goliasch, Finja Sterner, Menko Hornstein
+"""
+from __future__ import annotations
+import argparse
+import time
+from typing import Callable
+
+import numpy as np
+import pandas as pd
+
+from app.import_temps import _process_weather_data
+from tests.legacy_reference import legacy_process
+
+
+def synthetic_daily(station_id: str, first_year: int, years: int, seed: int = 42) -> pd.DataFrame:
+    """Builds a loader-shaped daily frame with ~5% missing days."""
+    rng = np.random.default_rng(seed)
+    year = np.repeat(np.arange(first_year, first_year + years), 12 * 31 * 2)
+    month = np.tile(np.repeat(np.arange(1, 13), 31 * 2), years)
+    element = np.tile(np.array(["TMAX", "TMIN"], dtype=object), years * 12 * 31)
+    value = rng.integers(-300, 400, size=len(year)).astype(np.float64)
+    keep = rng.random(len(year)) > 0.05
+    return pd.DataFrame({
+        "station_id": station_id,
+        "year": year[keep],
+        "month": month[keep],
+        "element": element[keep],
+        "value": value[keep],
+    })
+
+
+def _best_of(fn: Callable[[], object], repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - t0)
+    return best * 1000
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--years", type=int, nargs="+", default=[30, 80, 150])
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    for years in args.years:
+        df = synthetic_daily("SYN00000001", 2025 - years, years)
+        for lat in (48.1, -33.9):
+            assert legacy_process(df.copy(), None, None, lat=lat) == _process_weather_data(df.copy(), None, None, lat=lat)
+        before = _best_of(lambda: legacy_process(df.copy(), None, None, lat=48.1), args.repeat)
+        after = _best_of(lambda: _process_weather_data(df.copy(), None, None, lat=48.1), args.repeat)
+        print(f"years={years:<4} rows={len(df):<8} before={before:8.1f} ms   after={after:8.1f} ms   x{before / after:4.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,68 @@
+"""Benchmarks the .dly parser before and after the NumPy byte decoder.
+
+Compares the legacy `pd.read_fwf` + double `melt` path with the current
+`_parse_dly_bytes` on large real-format `.dly` files, checks that both
+produce identical frames and prints the parse time of each.
+
+Uses every `data/dly/*.dly` file that has been downloaded, plus a synthetic
+station with ~150 years of TMAX/TMIN/PRCP/SNOW/SNWD records.
+
+Usage (from weather-app-backend/):
+    python -m benchmarks.bench_dly_parser [--years 150] [--repeat 3]
+
+Authors:
+    Lisa Fritsch, Jan Goliasch, Finja Sterner, Menko Hornstein
+"""
+from __future__ import annotations
+import argparse
+import tempfile
+import time
+from pathlib import Path
+from typing import Callable, List
+
+import pandas as pd
+
+from app.import_temps import DATA_DIR, _parse_dly_bytes
+from tests.legacy_reference import legacy_parse, synthetic_dly
+
+
+def _best_of(fn: Callable[[], pd.DataFrame], repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - t0)
+    return best * 1000
+
+
+def _bench_file(path: Path, repeat: int) -> None:
+    data = path.read_bytes()
+    records = data.count(b"\n")
+    print(f"{path.name}: {len(data) / 1e6:.1f} MB, {records} records")
+    for start_year, end_year, ignore_qflag in [(None, None, True), (None, None, False), (1990, 2000, True)]:
+        old = legacy_parse(path, start_year, end_year, ignore_qflag)
+        new = _parse_dly_bytes(data, start_year, end_year, ignore_qflag)
+        pd.testing.assert_frame_equal(old, new, check_index_type=False)
+
+        before = _best_of(lambda: legacy_parse(path, start_year, end_year, ignore_qflag), repeat)
+        after = _best_of(lambda: _parse_dly_bytes(path.read_bytes(), start_year, end_year, ignore_qflag), repeat)
+        label = f"years={start_year}-{end_year} ignore_qflag={ignore_qflag}"
+        print(f"  {label:<42} before={before:9.1f} ms   after={after:8.1f} ms   x{before / after:5.1f}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--years", type=int, default=150)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    files: List[Path] = sorted(DATA_DIR.glob("*.dly"))
+    with tempfile.TemporaryDirectory() as tmp:
+        synthetic = Path(tmp) / "SYN00000001.dly"
+        synthetic.write_text(synthetic_dly("SYN00000001", 2025 - args.years, args.years))
+        for path in [synthetic] + files:
+            _bench_file(path, args.repeat)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,92 @@
+"""Benchmarks cold-request throughput of the parse pool from 1 to N workers.
+
+Simulates concurrent cold requests for distinct synthetic stations: each
+request parses a real-format `.dly` file into store arrays and aggregates
+its complete history. Runs them once on fetch threads only (the path with
+`PARSE_PROCESSES=0`) and once with parse and aggregation in a warmed-up
+`ParsePool`, for 1..N workers each, and prints stations per second.
+
+Thread throughput stays flat because parsing holds the GIL; process
+throughput should grow with the number of cores.
+
+Usage (from weather-app-backend/):
+    python -m benchmarks.bench_parse_pool [--stations 16] [--years 100] [--max-workers 8]
+
+Authors:
+    Lisa Fritsch, Jan Goliasch, Finja Sterner, Menko Hornstein
+"""
+from __future__ import annotations
+import argparse
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List, Optional
+
+import numpy as np
+
+from app.daily_store import daily_arrays_from_frame
+from app.import_temps import _aggregate_spans, _parse_dly_bytes
+from app.parse_pool import ParsePool
+from benchmarks.bench_dly_parser import synthetic_dly
+
+SPANS = [(None, None)]
+LAT = 48.1
+
+
+def parse_dly_arrays(data: bytes) -> Optional[Dict[str, np.ndarray]]:
+    """Parse step of a cold request (`_parse_station_file` without the file read)."""
+    df = _parse_dly_bytes(data, None, None, False)
+    return None if df.empty else daily_arrays_from_frame(df)
+
+
+def _cold_in_thread(station_id: str, data: bytes) -> int:
+    arrays = parse_dly_arrays(data)
+    return len(_aggregate_spans(station_id, arrays, SPANS, True, LAT))
+
+
+def _cold_in_pool(pool: ParsePool) -> Callable[[str, bytes], int]:
+    def _run(station_id: str, data: bytes) -> int:
+        arrays = pool.call_arrays(parse_dly_arrays, data)
+        return len(pool.call(_aggregate_spans, station_id, arrays, SPANS, True, LAT))
+    return _run
+
+
+def _throughput(cold: Callable[[str, bytes], int], files: Dict[str, bytes], threads: int) -> float:
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as executor:
+        rows = list(executor.map(cold, files.keys(), files.values()))
+    assert all(rows)
+    return len(files) / (time.perf_counter() - start)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--stations", type=int, default=16)
+    parser.add_argument("--years", type=int, default=100)
+    parser.add_argument("--max-workers", type=int, default=os.cpu_count() or 1)
+    args = parser.parse_args()
+
+    files = {
+        f"SYN{i:08d}": synthetic_dly(f"SYN{i:08d}", 2025 - args.years, args.years, seed=i).encode()
+        for i in range(args.stations)
+    }
+    counts: List[int] = sorted({1, 2, 4, 8, 16, args.max_workers} & set(range(1, args.max_workers + 1)))
+    print(f"{args.stations} cold stations x {args.years} years, {os.cpu_count()} CPUs")
+
+    base_threads = base_procs = None
+    for n in counts:
+        threads = _throughput(_cold_in_thread, files, n)
+        pool = ParsePool(n)
+        try:
+            pool.warm_up()
+            procs = _throughput(_cold_in_pool(pool), files, n)
+        finally:
+            pool.shutdown()
+        base_threads = base_threads or threads
+        base_procs = base_procs or procs
+        print(f"  workers={n:<3} threads={threads:7.2f}/s (x{threads / base_threads:4.1f})"
+              f"   processes={procs:7.2f}/s (x{procs / base_procs:4.1f})")
+
+
+if __name__ == "__main__":
+    main()
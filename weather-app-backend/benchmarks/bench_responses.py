@@ -0,0 +1,68 @@
+"""Benchmarks serialization and compression of temps responses.
+
+Renders the periods of a synthetic station history the way the endpoint
+did before (`jsonable_encoder` + standard `JSONResponse`) and with the
+current orjson path in both formats, then compresses every body with
+gzip and brotli at the configured levels. Prints payload bytes and the
+best-of time per step.
+
+Usage (from weather-app-backend/):
+    python -m benchmarks.bench_responses [--years 30 80 150] [--repeat 20]
+
+Authors:
+    Lisa Fritsch, Jan Goliasch, Finja Sterner, Menko Hornstein
+"""
+from __future__ import annotations
+import argparse
+import time
+from typing import Callable, List
+
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+
+from app.compression import Compressor
+from app.import_temps import _process_weather_data
+from app.responses import PERIOD_FIELDS, temps_response
+from benchmarks.bench_aggregation import synthetic_daily
+
+
+def synthetic_rows(years: int) -> List[dict]:
+    """Period rows as `get_station_periods` returns them."""
+    df = synthetic_daily("SYN00000001", 2025 - years, years)
+    return [dict(zip(PERIOD_FIELDS, r[1:])) for r in _process_weather_data(df, None, None, lat=48.1)]
+
+
+def _best_of(fn: Callable[[], bytes], repeat: int) -> tuple:
+    best = float("inf")
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        out = fn()
+        best = min(best, time.perf_counter() - t0)
+    return out, best * 1000
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--years", type=int, nargs="+", default=[30, 80, 150])
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    renderers = {
+        "json rows": lambda rows: JSONResponse(jsonable_encoder(rows)).body,
+        "orjson rows": lambda rows: temps_response(rows).body,
+        "orjson columns": lambda rows: temps_response(rows, "columns").body,
+    }
+    for years in args.years:
+        rows = synthetic_rows(years)
+        print(f"years={years} rows={len(rows)}")
+        for name, render in renderers.items():
+            body, ms = _best_of(lambda: render(rows), args.repeat)
+            line = f"  {name:<15} {len(body):>8} B  {ms:7.2f} ms"
+            for encoding in ("gzip", "br"):
+                packed, cms = _best_of(lambda: Compressor(encoding).chunk(body, final=True), args.repeat)
+                line += f"   {encoding:<4} {len(packed):>7} B {cms:6.2f} ms"
+            print(line)
+
+
+if __name__ == "__main__":
+    main()
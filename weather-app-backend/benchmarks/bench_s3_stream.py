@@ -0,0 +1,119 @@
+"""Benchmarks S3 csv.gz ingestion before and after streaming.
+
+Compares the legacy `pd.read_csv` over the whole file (every element, every
+year, filtered afterwards) with the streaming `_parse_s3_stream`. Prints
+parse time and peak traced memory for station histories of growing length
+and checks that both paths aggregate to the same periods.
+
+Uses every `data/s3_csv/*.csv.gz` file that has been downloaded, plus
+synthetic stations with GHCN-like element mixes.
+
+Usage (from weather-app-backend/):
+    python -m benchmarks.bench_s3_stream [--years 30 60 120] [--window 1990 2000]
+
+Authors:
+    Lisa Fritsch, Jan Goliasch, Finja Sterner, Menko Hornstein
+"""
+from __future__ import annotations
+import argparse
+import gzip
+import random
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+from typing import Callable, List, Optional, Tuple
+
+import pandas as pd
+
+from app.import_temps import S3_CHUNK_SIZE, S3_DATA_DIR, _parse_s3_stream, _process_weather_data
+
+ELEMENTS = ["TMAX", "TMIN", "PRCP", "SNOW", "SNWD", "TAVG", "AWND", "WSF2"]
+
+
+def synthetic_csv_gz(path: Path, station_id: str, first_year: int, years: int, seed: int = 42) -> None:
+    """Writes a by_station csv.gz with one row per element and day."""
+    rnd = random.Random(seed)
+    lines = []
+    for year in range(first_year, first_year + years):
+        for month in range(1, 13):
+            for day in range(1, 29):
+                for element in ELEMENTS:
+                    qflag = "I" if rnd.random() < 0.01 else ""
+                    lines.append(f"{station_id},{year}{month:02d}{day:02d},{element},{rnd.randint(-300, 400)},,{qflag},S,0700")
+    path.write_bytes(gzip.compress(("\n".join(lines) + "\n").encode()))
+
+
+def legacy_load(path: Path, start_year: Optional[int], end_year: Optional[int], ignore_qflag: bool) -> pd.DataFrame:
+    """The pre-streaming loader: parse the whole file, then filter."""
+    names = ["station_id", "date", "element", "value", "mflag", "qflag", "sflag", "obstime"]
+    df = pd.read_csv(path, names=names, header=None, usecols=["station_id", "date", "element", "value", "qflag"],
+                     dtype={"station_id": str, "date": str, "element": str, "value": float})
+    if df.empty:
+        return pd.DataFrame()
+    df["year"] = df["date"].str.slice(0, 4).astype(int)
+    df["month"] = df["date"].str.slice(4, 6).astype(int)
+    if start_year:
+        df = df[df["year"] >= start_year]
+    if end_year:
+        df = df[df["year"] <= end_year]
+    df = df[df["element"].isin(["TMAX", "TMIN"])]
+    if ignore_qflag:
+        mask_valid = df["qflag"].isna() | (df["qflag"].astype(str).str.strip() == "")
+        df = df[mask_valid]
+    return df[["station_id", "year", "month", "element", "value"]]
+
+
+def stream_load(path: Path, start_year: Optional[int], end_year: Optional[int], ignore_qflag: bool) -> pd.DataFrame:
+    def chunks():
+        with open(path, "rb") as f:
+            while True:
+                chunk = f.read(S3_CHUNK_SIZE)
+                if not chunk:
+                    return
+                yield chunk
+    return _parse_s3_stream(path.name.split(".")[0], chunks(), start_year, end_year, ignore_qflag)
+
+
+def _measure(fn: Callable[[], pd.DataFrame]) -> Tuple[pd.DataFrame, float, float]:
+    """Returns the result, wall time (untraced run) and traced peak memory."""
+    t0 = time.perf_counter()
+    df = fn()
+    elapsed = time.perf_counter() - t0
+    tracemalloc.start()
+    fn()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return df, elapsed * 1000, peak / 1e6
+
+
+def _bench_file(path: Path, window: Tuple[Optional[int], Optional[int]]) -> None:
+    print(f"{path.name}: {path.stat().st_size / 1e6:.1f} MB compressed")
+    for start_year, end_year in [(None, None), window]:
+        old, old_ms, old_mb = _measure(lambda: legacy_load(path, start_year, end_year, True))
+        new, new_ms, new_mb = _measure(lambda: stream_load(path, start_year, end_year, True))
+        assert _process_weather_data(old.copy(), start_year, end_year) == \
+            _process_weather_data(new.copy(), start_year, end_year)
+        label = f"years={start_year}-{end_year}"
+        print(f"  {label:<20} before={old_ms:8.1f} ms {old_mb:7.1f} MB   "
+              f"after={new_ms:8.1f} ms {new_mb:7.1f} MB   rows={len(new)}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--years", type=int, nargs="+", default=[30, 60, 120])
+    parser.add_argument("--window", type=int, nargs=2, default=[1990, 2000])
+    args = parser.parse_args()
+
+    files: List[Path] = sorted(S3_DATA_DIR.glob("*.csv.gz"))
+    with tempfile.TemporaryDirectory() as tmp:
+        for years in args.years:
+            path = Path(tmp) / f"SYN{years:08d}.csv.gz"
+            synthetic_csv_gz(path, path.name.split(".")[0], 2025 - years, years)
+            files.insert(0, path)
+        for path in files:
+            _bench_file(path, tuple(args.window))
+
+
+if __name__ == "__main__":
+    main()
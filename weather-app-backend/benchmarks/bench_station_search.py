@@ -0,0 +1,139 @@
+"""Benchmarks the station radius search before and after the R*Tree index.
+
+Compares p50/p99 latency of the legacy lat/lon `BETWEEN` query (which can
+only use one of `idx_stations_lat` / `idx_stations_lon`) with the current
+`find_stations_nearby` implementation backed by `stations_rtree`.
+
+Uses `data/ghcnd-stations.txt` when it has been downloaded, otherwise a
+synthetic list of ~125k stations with GHCN-like clustering.
+
+Usage (from weather-app-backend/):
+    python -m benchmarks.bench_station_search [--queries 2000] [--radius 100]
+
+Authors:
+    Lisa Fritsch, Jan Goliasch, Finja Sterner, Menko Hornstein
+"""
+from __future__ import annotations
+import argparse
+import random
+import sqlite3
+import tempfile
+import time
+from pathlib import Path
+from typing import Callable, List, Tuple
+
+from app.import_stations import (
+    STATIONS_TXT, create_schema, import_stations, rebuild_station_coverage, rebuild_station_rtree,
+)
+from app.stations_search import bounding_box, find_stations_nearby, haversine_distance
+
+SYNTHETIC_STATIONS = 125_000
+
+
+def _synthetic_stations(n: int, seed: int = 42) -> List[Tuple[str, float, float]]:
+    """Generates stations clustered like GHCN (dense US/Europe, sparse elsewhere)."""
+    rnd = random.Random(seed)
+    clusters = [
+        ((25.0, 49.0), (-125.0, -67.0), 0.55),  # USA
+        ((36.0, 60.0), (-10.0, 30.0), 0.15),    # Europe
+        ((-40.0, -10.0), (113.0, 153.0), 0.12), # Australia
+    ]
+    rows = []
+    for i in range(n):
+        r = rnd.random()
+        acc = 0.0
+        lat_rng, lon_rng = (-60.0, 75.0), (-180.0, 180.0)
+        for c_lat, c_lon, weight in clusters:
+            acc += weight
+            if r < acc:
+                lat_rng, lon_rng = c_lat, c_lon
+                break
+        rows.append((f"SYN{i:08d}", rnd.uniform(*lat_rng), rnd.uniform(*lon_rng)))
+    return rows
+
+
+def _build_db(db_path: Path) -> int:
+    """Creates the benchmark DB from the real station list or synthetic data."""
+    conn = sqlite3.connect(db_path)
+    create_schema(conn)
+    if STATIONS_TXT.exists():
+        import_stations(conn, STATIONS_TXT)
+    else:
+        rows = _synthetic_stations(SYNTHETIC_STATIONS)
+        conn.executemany(
+            "INSERT INTO stations (station_id, lat, lon, name) VALUES (?, ?, ?, ?)",
+            [(sid, lat, lon, sid) for sid, lat, lon in rows],
+        )
+        conn.executemany(
+            "INSERT INTO station_inventory (station_id, element, start_year, end_year) VALUES (?, 'TMAX', 1950, 2020)",
+            [(sid,) for sid, _, _ in rows],
+        )
+        rebuild_station_rtree(conn)
+        rebuild_station_coverage(conn)
+        conn.commit()
+    count = conn.execute("SELECT COUNT(*) FROM stations;").fetchone()[0]
+    conn.close()
+    return count
+
+
+def _legacy_search(lat: float, lon: float, radius_km: float, db_path: Path) -> list:
+    """The pre-R*Tree search: BETWEEN query on the separate lat/lon indexes."""
+    min_lat, max_lat, min_lon, max_lon = bounding_box(lat, lon, radius_km)
+    sql = """
+    SELECT s.station_id, s.name, s.lat, s.lon,
+           (SELECT MIN(start_year) FROM station_inventory i WHERE i.station_id = s.station_id) as min_year,
+           (SELECT MAX(end_year) FROM station_inventory i WHERE i.station_id = s.station_id) as max_year
+    FROM stations s
+    WHERE s.lat BETWEEN ? AND ?
+      AND s.lon BETWEEN ? AND ?
+    """
+    conn = sqlite3.connect(db_path)
+    try:
+        rows = conn.execute(sql, [min_lat, max_lat, min_lon, max_lon]).fetchall()
+    finally:
+        conn.close()
+    hits = [(haversine_distance(lat, lon, r[2], r[3]), r[0]) for r in rows]
+    return sorted(h for h in hits if h[0] <= radius_km)[:25]
+
+
+def _percentiles(samples: List[float]) -> Tuple[float, float]:
+    samples = sorted(samples)
+    p50 = samples[int(0.50 * (len(samples) - 1))]
+    p99 = samples[int(0.99 * (len(samples) - 1))]
+    return p50 * 1000, p99 * 1000
+
+
+def _run(name: str, fn: Callable[[float, float], object], points: List[Tuple[float, float]]) -> None:
+    timings = []
+    for lat, lon in points:
+        t0 = time.perf_counter()
+        fn(lat, lon)
+        timings.append(time.perf_counter() - t0)
+    p50, p99 = _percentiles(timings)
+    print(f"{name:<10} p50={p50:8.3f} ms   p99={p99:8.3f} ms")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--queries", type=int, default=2000)
+    parser.add_argument("--radius", type=float, default=100.0)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = Path(tmp) / "bench.sqlite3"
+        count = _build_db(db_path)
+        print(f"Stations: {count}, queries: {args.queries}, radius: {args.radius} km")
+
+        # Query points are sampled from station coordinates so dense areas dominate
+        conn = sqlite3.connect(db_path)
+        coords = conn.execute("SELECT lat, lon FROM stations;").fetchall()
+        conn.close()
+        rnd = random.Random(7)
+        points = [rnd.choice(coords) for _ in range(args.queries)]
+
+        _run("before", lambda la, lo: _legacy_search(la, lo, args.radius, db_path), points)
+        _run("after", lambda la, lo: find_stations_nearby(la, lo, args.radius, db_path=db_path), points)
+
+
+if __name__ == "__main__":
+    main()
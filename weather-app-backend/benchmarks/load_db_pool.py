@@ -0,0 +1,129 @@
+"""Load test for mixed read/write traffic against the temps cache.
+
+Compares the old access pattern (a new `sqlite3.connect` per operation,
+rollback journal, schema creation on every read) with the shared
+connection pool from `app.db` (WAL, tuned pragmas, pooled readers and a
+single writer). Reader threads query `get_station_periods`, writer threads
+save aggregated rows like the write-behind task.
+
+Usage (from weather-app-backend/):
+    python -m benchmarks.load_db_pool [--seconds 5] [--readers 8] [--writers 2]
+
+Authors:
+    Lisa Fritsch, Jan Goliasch, Finja Sterner, Menko Hornstein
+"""
+from __future__ import annotations
+import argparse
+import random
+import sqlite3
+import tempfile
+import threading
+import time
+from pathlib import Path
+from typing import Callable, Dict, List, Tuple
+
+from app.db import ConnectionPool
+from app.import_temps import create_schema, get_station_periods, save_station_periods_to_db
+
+STATIONS = [f"BENCH{i:06d}" for i in range(200)]
+PERIODS = ["annual", "spring", "summer", "autumn", "winter"]
+
+
+def _rows(station_id: str, years: range) -> List[Tuple]:
+    return [(station_id, y, p, 10.0, 2.0, 12, 12) for y in years for p in PERIODS]
+
+
+def _seed(db_path: Path) -> None:
+    conn = sqlite3.connect(db_path)
+    create_schema(conn)
+    for sid in STATIONS:
+        save_station_periods_to_db(conn, _rows(sid, range(1950, 2020)))
+    conn.close()
+
+
+def _legacy_ops(db_path: Path) -> Tuple[Callable[[str], None], Callable[[str], None]]:
+    def read(sid: str) -> None:
+        conn = sqlite3.connect(db_path)
+        conn.row_factory = sqlite3.Row
+        try:
+            create_schema(conn)
+            get_station_periods(sid, conn, 1960, 2000)
+        finally:
+            conn.close()
+
+    def write(sid: str) -> None:
+        conn = sqlite3.connect(db_path)
+        try:
+            create_schema(conn)
+            save_station_periods_to_db(conn, _rows(sid, range(2020, 2024)))
+        finally:
+            conn.close()
+
+    return read, write
+
+
+def _pool_ops(pool: ConnectionPool) -> Tuple[Callable[[str], None], Callable[[str], None]]:
+    def read(sid: str) -> None:
+        with pool.reader() as conn:
+            get_station_periods(sid, conn, 1960, 2000)
+
+    def write(sid: str) -> None:
+        with pool.writer() as conn:
+            save_station_periods_to_db(conn, _rows(sid, range(2020, 2024)))
+
+    return read, write
+
+
+def _load(read: Callable[[str], None], write: Callable[[str], None],
+          seconds: float, readers: int, writers: int) -> Dict[str, int]:
+    counts = {"reads": 0, "writes": 0, "errors": 0}
+    lock = threading.Lock()
+    deadline = time.perf_counter() + seconds
+
+    def worker(op: Callable[[str], None], key: str) -> None:
+        rnd = random.Random()
+        done = errors = 0
+        while time.perf_counter() < deadline:
+            try:
+                op(rnd.choice(STATIONS))
+                done += 1
+            except sqlite3.OperationalError:
+                errors += 1
+        with lock:
+            counts[key] += done
+            counts["errors"] += errors
+
+    threads = [threading.Thread(target=worker, args=(read, "reads")) for _ in range(readers)]
+    threads += [threading.Thread(target=worker, args=(write, "writes")) for _ in range(writers)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return counts
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--seconds", type=float, default=5.0)
+    parser.add_argument("--readers", type=int, default=8)
+    parser.add_argument("--writers", type=int, default=2)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        legacy_db = Path(tmp) / "legacy.sqlite3"
+        pool_db = Path(tmp) / "pool.sqlite3"
+        _seed(legacy_db)
+        _seed(pool_db)
+
+        pool = ConnectionPool(pool_db, readers=args.readers)
+        try:
+            for name, (read, write) in (("connect", _legacy_ops(legacy_db)), ("pool", _pool_ops(pool))):
+                c = _load(read, write, args.seconds, args.readers, args.writers)
+                print(f"{name:<8} reads/s={c['reads'] / args.seconds:9.1f}   "
+                      f"writes/s={c['writes'] / args.seconds:8.1f}   errors={c['errors']}")
+        finally:
+            pool.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,7 +1,14 @@
 
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
 import pytest
 from fastapi.testclient import TestClient
 from app.main import app
+from app.db import close_pools
+from app.http_client import close_http_client
+from app.jobs import JobRegistry
 
 @pytest.fixture
 def client():
@@ -10,3 +17,117 @@ def client():
     This allows us to make mock HTTP requests to our API without running the server.
     """
     return TestClient(app)
+
+@pytest.fixture(autouse=True)
+def reset_db_pools():
+    """
+    Closes all pooled SQLite connections after each test.
+    Prevents connections (or mocks of them) from leaking between tests.
+    """
+    yield
+    close_pools()
+
+@pytest.fixture(autouse=True)
+def daily_store_dir(tmp_path, monkeypatch):
+    """
+    Points the raw daily store at a per-test directory.
+    Keeps tests from reading or writing data/daily of the working tree.
+    """
+    path = tmp_path / "daily"
+    monkeypatch.setattr("app.daily_store.DAILY_DIR", path)
+    return path
+
+@pytest.fixture(autouse=True)
+def lock_dir(tmp_path, monkeypatch):
+    """
+    Points the cross-process file locks at a per-test directory.
+    Keeps tests from creating data/locks in the working tree.
+    """
+    path = tmp_path / "locks"
+    monkeypatch.setattr("app.process_lock.LOCK_DIR", path)
+    return path
+
+@pytest.fixture(autouse=True)
+def fresh_jobs(monkeypatch):
+    """
+    Gives every test an empty temps job registry.
+    Keeps finished jobs (and their results) from being reused across tests.
+    """
+    jobs = JobRegistry()
+    monkeypatch.setattr("app.main._jobs", jobs)
+    return jobs
+
+class StubServer:
+    """
+    Local stand-in for the NOAA mirrors, served over HTTP/1.1 with keep-alive.
+    Routes map a path to a list of (status, body, delay, headers) responses; the last one repeats.
+    A matching If-None-Match is answered with 304 like a real server.
+    """
+
+    def __init__(self):
+        self.routes = {}
+        self.hits = []
+        self.request_headers = []
+        self.peers = set()
+        self.active = 0
+        self.max_active = 0
+        self.lock = threading.Lock()
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, *args):
+                pass
+
+            def do_GET(self):
+                with stub.lock:
+                    stub.hits.append(self.path)
+                    stub.request_headers.append(dict(self.headers))
+                    stub.peers.add(self.client_address)
+                    stub.active += 1
+                    stub.max_active = max(stub.max_active, stub.active)
+                    responses = stub.routes.get(self.path, [(404, b"", 0, {})])
+                    status, body, delay, headers = responses.pop(0) if len(responses) > 1 else responses[0]
+                if headers.get("ETag") and self.headers.get("If-None-Match") == headers["ETag"]:
+                    status, body = 304, b""
+                try:
+                    time.sleep(delay)
+                    self.send_response(status)
+                    for name, value in headers.items():
+                        self.send_header(name, value)
+                    self.send_header("Content-Length", str(len(body)))
+                    self.end_headers()
+                    self.wfile.write(body)
+                finally:
+                    with stub.lock:
+                        stub.active -= 1
+
+        self.httpd = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.httpd.daemon_threads = True
+        self.url = f"http://127.0.0.1:{self.httpd.server_address[1]}"
+        threading.Thread(target=self.httpd.serve_forever, args=(0.05,), daemon=True).start()
+
+    def route(self, path, *responses):
+        """Registers responses as (status, body[, delay[, headers]]) tuples."""
+        defaults = (0, {})
+        self.routes[path] = [tuple(r) + defaults[len(r) - 2:] for r in responses]
+
+    def count(self, path):
+        return self.hits.count(path)
+
+    def close(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+@pytest.fixture
+def http_server():
+    """
+    Starts a local HTTP server and gives every test a fresh shared HTTP client.
+    Downloads are tested against real sockets without touching the network.
+    """
+    server = StubServer()
+    close_http_client()
+    yield server
+    close_http_client()
+    server.close()
@@ -0,0 +1,205 @@
+"""Reference implementations the optimized code paths are checked against.
+
+Keeps the pre-optimization versions of rewritten functions, unchanged, so
+the equivalence tests can compare old and new output on the same input.
+The benchmarks import them from here to time both versions.
+
+Authors:
+    Lisa Fritsch, Jan Goliasch, Finja Sterner, Menko Hornstein
+"""
+from __future__ import annotations
+import random
+from pathlib import Path
+from typing import List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from app.import_temps import MISSING
+
+ELEMENTS = ["TMAX", "TMIN", "PRCP", "SNOW", "SNWD"]
+QFLAGS = "DGIKLMNORSTWXZ"
+
+
+def synthetic_dly(station_id: str, first_year: int, years: int, seed: int = 42) -> str:
+    """Builds the text of a real-format .dly file (269 bytes per record)."""
+    rnd = random.Random(seed)
+    lines = []
+    for year in range(first_year, first_year + years):
+        for month in range(1, 13):
+            for element in ELEMENTS:
+                parts = [f"{station_id:<11}{year:04d}{month:02d}{element}"]
+                for _ in range(31):
+                    if rnd.random() < 0.05:
+                        value, qflag = MISSING, " "
+                    else:
+                        value = rnd.randint(-350, 450)
+                        qflag = rnd.choice(QFLAGS) if rnd.random() < 0.01 else " "
+                    parts.append(f"{value:5d} {qflag}7")
+                lines.append("".join(parts))
+    return "\n".join(lines) + "\n"
+
+
+def legacy_parse(path: Path, start_year: Optional[int], end_year: Optional[int], ignore_qflag: bool) -> pd.DataFrame:
+    """The pre-NumPy parser: `read_fwf` over all lines followed by two melts."""
+    colspecs = [(0, 11), (11, 15), (15, 17), (17, 21)]
+    names = ["station_id", "year", "month", "element"]
+    for i in range(1, 32):
+        start = 21 + (i - 1) * 8
+        colspecs.append((start, start + 5))
+        colspecs.append((start + 6, start + 7))
+        names.append(f"v{i}")
+        names.append(f"q{i}")
+
+    df = pd.read_fwf(
+        path,
+        colspecs=colspecs,
+        names=names,
+        header=None,
+        dtype={"station_id": str, "year": int, "month": int, "element": str},
+    )
+    if df.empty:
+        return pd.DataFrame()
+
+    if start_year:
+        df = df[df["year"] >= start_year]
+    if end_year:
+        df = df[df["year"] <= end_year]
+
+    df = df[df["element"].isin(["TMAX", "TMIN"])]
+
+    id_vars = ["station_id", "year", "month", "element"]
+    val_vars = [f"v{i}" for i in range(1, 32)]
+    df_v = df.melt(id_vars=id_vars, value_vars=val_vars, var_name="day_raw", value_name="value")
+
+    q_vars = [f"q{i}" for i in range(1, 32)]
+    df_q = df.melt(id_vars=id_vars, value_vars=q_vars, var_name="day_q_raw", value_name="qflag")
+
+    df_v["qflag"] = df_q["qflag"]
+    df_v = df_v[df_v["value"] != MISSING]
+
+    if ignore_qflag:
+        mask_valid = df_v["qflag"].isna() | (df_v["qflag"].astype(str).str.strip() == "")
+        df_v = df_v[mask_valid]
+
+    return df_v
+
+
+def legacy_process(df_v: pd.DataFrame, start_year: Optional[int], end_year: Optional[int], lat: Optional[float] = None) -> List[Tuple]:
+    """The pre-vectorized aggregation: `to_dict` records, `clean_val` and a `json` scrub."""
+    if df_v.empty:
+        return []
+
+    # Daily integers are tenths of a degree Celsius
+    df_v["value"] = df_v["value"] / 10.0
+
+    # 1. Daily -> Monthly Average
+    # We group by month so that missing days do not distort the year average
+    grp_monthly = df_v.groupby(["station_id", "year", "month", "element"]).agg(
+        value=("value", "mean")
+    ).reset_index()
+
+    # We create a dummy "count" column of 1 for the period logic
+    grp_monthly["count"] = 1
+
+    # Season mapping depends on hemisphere
+    is_southern = lat == "unknown" or (lat is not None and lat < 0)
+    
+    if is_southern:
+        # Southern Hemisphere seasons
+        season_map = {
+            3: "autumn", 4: "autumn", 5: "autumn",
+            6: "winter", 7: "winter", 8: "winter",
+            9: "spring", 10: "spring", 11: "spring",
+            12: "summer", 1: "summer", 2: "summer"
+        }
+    else:
+        # Northern Hemisphere seasons (default)
+        season_map = {
+            3: "spring", 4: "spring", 5: "spring",
+            6: "summer", 7: "summer", 8: "summer",
+            9: "autumn", 10: "autumn", 11: "autumn",
+            12: "winter", 1: "winter", 2: "winter"
+        }
+
+    grp_monthly["season"] = grp_monthly["month"].map(season_map)
+    
+    grp_monthly["season_year"] = grp_monthly["year"]
+    
+    # "Winter" spans crossing year boundary in Northern Hemisphere (Dec Y, Jan Y+1, Feb Y+1) 
+    # and "Summer" spans crossing year boundary in Southern Hemisphere (Dec Y, Jan Y+1, Feb Y+1)
+    boundary_season = "summer" if is_southern else "winter"
+    
+    mask_cross = grp_monthly["season"] == boundary_season
+    mask_jan_feb = mask_cross & grp_monthly["month"].isin([1, 2])
+    grp_monthly.loc[mask_jan_feb, "season_year"] -= 1
+
+    # 2. Annual Aggregation
+    grp_annual = grp_monthly.groupby(["station_id", "year", "element"]).agg(
+        mean=("value", "mean"),
+        count=("count", "sum")
+    )
+    grp_annual = grp_annual.unstack("element") 
+    grp_annual.columns = [f"{x}_{y}" for x, y in grp_annual.columns]
+    grp_annual = grp_annual.reset_index()
+    grp_annual["period"] = "annual"
+    
+    # 3. Seasonal Aggregation
+    grp_seasonal = grp_monthly.groupby(["station_id", "season_year", "season", "element"]).agg(
+        mean=("value", "mean"),
+        count=("count", "sum")
+    )
+    grp_seasonal = grp_seasonal.unstack("element")
+    grp_seasonal.columns = [f"{x}_{y}" for x, y in grp_seasonal.columns]
+    grp_seasonal = grp_seasonal.reset_index()
+    grp_seasonal = grp_seasonal.rename(columns={"season_year": "year", "season": "period"})
+    
+    final_df = pd.concat([grp_annual, grp_seasonal], ignore_index=True)
+    
+    expected_cols = ["mean_TMAX", "mean_TMIN", "count_TMAX", "count_TMIN"]
+    for c in expected_cols:
+        if c not in final_df.columns:
+            final_df[c] = np.nan
+            
+    final_df["count_TMAX"] = final_df["count_TMAX"].fillna(0).astype(int)
+    final_df["count_TMIN"] = final_df["count_TMIN"].fillna(0).astype(int)
+    
+    results = []
+    recs = final_df.to_dict(orient="records")
+    
+    def clean_val(v):
+        try:
+            f = float(v)
+            if np.isnan(f) or np.isinf(f):
+                return None
+            return f
+        except (ValueError, TypeError):
+            return None
+
+    for r in recs:
+        y = r["year"]
+        if start_year and y < start_year: continue
+        if end_year and y > end_year: continue
+        
+        results.append((
+            r["station_id"],
+            int(r["year"]),
+            r["period"],
+            clean_val(r.get("mean_TMAX")),
+            clean_val(r.get("mean_TMIN")),
+            int(r.get("count_TMAX", 0)),
+            int(r.get("count_TMIN", 0)),
+        ))
+    
+    import json
+    for i, row in enumerate(results):
+        try:
+            json.dumps(row[3], allow_nan=False)
+            json.dumps(row[4], allow_nan=False)
+        except (ValueError, TypeError) as e:
+            lst = list(row)
+            lst[3] = None
+            lst[4] = None
+            results[i] = tuple(lst)
+            
+    return results
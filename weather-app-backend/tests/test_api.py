@@ -1,4 +1,12 @@
+import json
+import threading
+import time
 import pytest
+from contextlib import contextmanager
+from app.http_cache import CACHE_RECENT
+from app.main import _revalidating, revalidate_station
+from app.progress import report as report_progress
+from app.responses import ndjson_lines
 
 # -------------------------------------------------------------------
 # 1. Basic Endpoints
@@ -28,7 +36,7 @@ def test_search_stations_validation_error(client):
 # -------------------------------------------------------------------
 # 2. Station Search & Temps endpoints
 # -------------------------------------------------------------------
-from unittest.mock import patch, MagicMock
+from unittest.mock import ANY, patch, MagicMock
 
 def test_search_stations_valid_coords(client):
     """
@@ -54,14 +62,47 @@ def test_search_stations_valid_coords(client):
         assert len(data) == 1
         assert data[0]["station_id"] == "TEST001"
 
+def test_search_stations_rejects_inverted_year_range(client):
+    """
+    Verifies validation of the year filters of search requests.
+    ENSURE: start_year > end_year answers 422 for radius and nearest searches.
+    """
+    body = {"lat": 50.0, "lon": 8.0, "start_year": 2000, "end_year": 1990}
+    assert client.post("/api/stations/search", json={**body, "radius_km": 10}).status_code == 422
+    assert client.post("/api/stations/nearest", json=body).status_code == 422
+
+def test_search_stations_uses_station_index(client):
+    """
+    Verifies that the search endpoint is served from the in-memory index once it is loaded.
+    ENSURE: The SQLite search path is not used.
+    """
+    mock_index = MagicMock()
+    mock_index.search.return_value = [
+        {"station_id": "IDX001", "name": "Index Station", "lat": 52.5, "lon": 13.4, "distance_km": 1.0}
+    ]
+    with patch("app.main.get_station_index", return_value=mock_index), \
+         patch("app.main.find_stations_nearby") as mock_find:
+        client.app.state.stations_ready = True
+        client.app.state.stations_error = None
+
+        response = client.post("/api/stations/search", json={
+            "lat": 52.5, "lon": 13.4, "radius_km": 10
+        })
+
+        assert response.status_code == 200
+        assert response.json()[0]["station_id"] == "IDX001"
+        assert not mock_find.called
+
 def test_station_temps_db_cache(client):
     """
     Verifies retrieval of temperature data when it is already present in the database (cache hit).
     ENSURE: API serves data from the database without triggering external requests.
     """
-    # Mock sqlite3 and DB helper to simulate existing data
-    with patch("app.main.sqlite3.connect"), \
-         patch("app.main.create_temps_schema"), \
+    # Mock the connection pool and DB helpers to simulate a fully covered range
+    with patch("app.main.get_pool"), \
+         patch("app.main.get_missing_spans", return_value=[]), \
+         patch("app.main.is_stale", return_value=False), \
+         patch("app.main.fetch_station_period_spans") as mock_fetch, \
          patch("app.main.get_station_periods") as mock_get:
          
         # Mock cached return data (list of dictionaries)
@@ -76,16 +117,19 @@ def test_station_temps_db_cache(client):
         assert len(data) == 1
         assert data[0]["year"] == 2023
         assert data[0]["avg_tmax_c"] == 15.5
+        assert not mock_fetch.called
 
 def test_station_temps_live_fallback(client):
     """
     Verifies fallback to live data fetch when the database is empty (cache miss).
     ENSURE: API triggers external fetch, parses result, and returns HTTP 200.
     """
-    with patch("app.main.sqlite3.connect"), \
-         patch("app.main.create_temps_schema"), \
+    with patch("app.main.get_pool"), \
+         patch("app.main.get_missing_spans", return_value=[(0, 9999)]), \
+         patch("app.main.get_station_lat", return_value=48.1), \
          patch("app.main.get_station_periods") as mock_get, \
-         patch("app.main.fetch_and_parse_station_periods") as mock_fetch:
+         patch("app.main.fetch_station_period_spans") as mock_fetch, \
+         patch("app.main._write_queue") as mock_queue:
          
         # DB returns empty
         mock_get.return_value = []
@@ -102,22 +146,481 @@ def test_station_temps_live_fallback(client):
         assert len(data) == 1
         assert data[0]["year"] == 2022
         assert data[0]["period"] == "summer"
+        # Fetched rows are handed to the write-behind queue with their coverage
+        mock_fetch.assert_called_once_with("TEST001", [(0, 9999)], None, True, 48.1)
+        mock_queue.submit.assert_called_once_with(
+            mock_fetch.return_value, coverage=[("TEST001", 0, 9999)], on_saved=ANY)
+
+def test_station_temps_partial_cache(client):
+    """
+    Verifies that a partially cached range only fetches the missing spans.
+    ENSURE: Cached and fetched rows are merged and ordered by year and period.
+    """
+    with patch("app.main.get_pool"), \
+         patch("app.main.get_missing_spans", return_value=[(1990, 1999), (2011, 2020)]), \
+         patch("app.main.get_station_lat", return_value=-33.9), \
+         patch("app.main.get_station_periods") as mock_get, \
+         patch("app.main.fetch_station_period_spans") as mock_fetch, \
+         patch("app.main._write_queue") as mock_queue:
+
+        mock_get.return_value = [
+            {"year": 2005, "period": "annual", "avg_tmax_c": 20.0, "avg_tmin_c": 10.0, "n_tmax": 12, "n_tmin": 12}
+        ]
+        mock_fetch.return_value = [
+            ("TEST001", 2015, "annual", 21.0, 11.0, 12, 12),
+            ("TEST001", 1995, "annual", 19.0, 9.0, 12, 12),
+        ]
+
+        response = client.get("/api/stations/TEST001/temps?start_year=1990&end_year=2020")
+
+        assert response.status_code == 200
+        assert [r["year"] for r in response.json()] == [1995, 2005, 2015]
+        mock_fetch.assert_called_once_with("TEST001", [(1990, 1999), (2011, 2020)], None, True, -33.9)
+        mock_queue.submit.assert_called_once_with(
+            mock_fetch.return_value, coverage=[("TEST001", 1990, 1999), ("TEST001", 2011, 2020)], on_saved=ANY)
+
+def test_station_temps_stale_while_revalidate(client):
+    """
+    Verifies that stale recent periods are served from cache and revalidated in the background.
+    ENSURE: The cached rows are returned, one revalidation is scheduled, historical ranges never trigger one.
+    """
+    cached = [{"year": 2024, "period": "annual", "avg_tmax_c": 15.0, "avg_tmin_c": 5.0, "n_tmax": 12, "n_tmin": 12}]
+    with patch("app.main.get_pool"), \
+         patch("app.main.get_missing_spans", return_value=[]), \
+         patch("app.main.get_station_periods", return_value=cached), \
+         patch("app.main.get_station_lat", return_value=52.5), \
+         patch("app.main.is_stale", return_value=True), \
+         patch("app.main.fetch_station_period_spans") as mock_fetch, \
+         patch("app.main._revalidate_pool.submit") as mock_submit:
+
+        response = client.get("/api/stations/TEST001/temps")
+        assert response.status_code == 200
+        assert response.json() == cached
+        assert not mock_fetch.called
+        mock_submit.assert_called_once_with(revalidate_station, "TEST001", 52.5)
+
+        # A revalidation is already in flight for this station
+        client.get("/api/stations/TEST001/temps")
+        assert mock_submit.call_count == 1
+
+        client.get("/api/stations/TEST002/temps?start_year=1950&end_year=1980")
+        assert mock_submit.call_count == 1
+
+    _revalidating.clear()
+
+def test_station_temps_etag_historical_range(client):
+    """
+    Verifies conditional requests for a complete historical range.
+    ENSURE: The response is immutable with a strong ETag; a matching If-None-Match is a 304 without touching SQLite.
+    """
+    cached = [{"year": 1960, "period": "annual", "avg_tmax_c": 15.0, "avg_tmin_c": 5.0, "n_tmax": 12, "n_tmin": 12}]
+    url = "/api/stations/TEST001/temps?start_year=1950&end_year=1980"
+    with patch("app.main.get_pool") as mock_pool, \
+         patch("app.main.get_missing_spans", return_value=[]), \
+         patch("app.main.get_station_periods", return_value=cached):
+
+        response = client.get(url)
+        assert response.status_code == 200
+        assert response.headers["Cache-Control"] == "public, max-age=31536000, immutable"
+        etag = response.headers["ETag"]
+
+        mock_pool.reset_mock()
+        response = client.get(url, headers={"If-None-Match": f'W/"other", {etag}'})
+        assert response.status_code == 304
+        assert response.headers["ETag"] == etag
+        assert response.content == b""
+        assert not mock_pool.called
+
+        # Other parameters give another tag
+        response = client.get("/api/stations/TEST001/temps?start_year=1951&end_year=1980",
+                              headers={"If-None-Match": etag})
+        assert response.status_code == 200
+
+def test_station_temps_wildcard_etag_requires_cached_station(client):
+    """
+    Verifies `If-None-Match: *` on a historical range.
+    ENSURE: An unknown station still answers 404; a cached one answers 304.
+    """
+    url = "/api/stations/NOPE001/temps?start_year=1950&end_year=1980"
+    with patch("app.main.get_pool"), \
+         patch("app.main.get_missing_spans", return_value=[(1950, 1980)]), \
+         patch("app.main.get_station_periods", return_value=[]), \
+         patch("app.main.fetch_station_period_spans", side_effect=FileNotFoundError("unknown station")):
+        assert client.get(url, headers={"If-None-Match": "*"}).status_code == 404
+
+    cached = [{"year": 1960, "period": "annual", "avg_tmax_c": 15.0, "avg_tmin_c": 5.0, "n_tmax": 12, "n_tmin": 12}]
+    with patch("app.main.get_pool"), \
+         patch("app.main.get_missing_spans", return_value=[]), \
+         patch("app.main.get_station_periods", return_value=cached):
+        assert client.get(url, headers={"If-None-Match": "*"}).status_code == 304
+
+def test_station_temps_etag_recent_range(client):
+    """
+    Verifies that the ETag of a range touching recent years follows the data version.
+    ENSURE: Same version -> 304 with a short max-age; a revalidation that changed the data -> 200 with a new tag.
+    """
+    cached = [{"year": 2024, "period": "annual", "avg_tmax_c": 15.0, "avg_tmin_c": 5.0, "n_tmax": 12, "n_tmin": 12}]
+    with patch("app.main.get_pool"), \
+         patch("app.main.get_missing_spans", return_value=[]), \
+         patch("app.main.get_station_periods", return_value=cached), \
+         patch("app.main.is_stale", return_value=False), \
+         patch("app.main.get_changed_at", return_value=1000.0) as mock_changed:
+
+        response = client.get("/api/stations/TEST001/temps")
+        assert response.status_code == 200
+        assert response.headers["Cache-Control"] == CACHE_RECENT
+        etag = response.headers["ETag"]
+
+        response = client.get("/api/stations/TEST001/temps", headers={"If-None-Match": etag})
+        assert response.status_code == 304
+
+        mock_changed.return_value = 2000.0
+        response = client.get("/api/stations/TEST001/temps", headers={"If-None-Match": etag})
+        assert response.status_code == 200
+        assert response.headers["ETag"] != etag
+
+def test_station_temps_live_result_not_cacheable(client):
+    """
+    Verifies the cache policy of live results that are not yet in the cache.
+    ENSURE: no-cache without an ETag.
+    """
+    with patch("app.main.get_pool"), \
+         patch("app.main.get_missing_spans", return_value=[(0, 9999)]), \
+         patch("app.main.get_station_lat", return_value=48.1), \
+         patch("app.main.get_station_periods", return_value=[]), \
+         patch("app.main.fetch_station_period_spans", return_value=[("TEST001", 2022, "summer", 25.0, 15.0, 90, 90)]), \
+         patch("app.main._write_queue"):
+
+        response = client.get("/api/stations/TEST001/temps")
+        assert response.status_code == 200
+        assert response.headers["Cache-Control"] == "no-cache"
+        assert "ETag" not in response.headers
+
+def test_station_temps_columnar_format(client):
+    """
+    Verifies the columnar temps format.
+    ENSURE: One array per field in row order; the format has its own ETag; unknown formats are rejected.
+    """
+    cached = [
+        {"year": 1960, "period": "annual", "avg_tmax_c": 15.0, "avg_tmin_c": 5.0, "n_tmax": 12, "n_tmin": 12},
+        {"year": 1961, "period": "annual", "avg_tmax_c": None, "avg_tmin_c": 4.0, "n_tmax": 0, "n_tmin": 12},
+    ]
+    url = "/api/stations/TEST001/temps?start_year=1950&end_year=1980"
+    with patch("app.main.get_pool"), \
+         patch("app.main.get_missing_spans", return_value=[]), \
+         patch("app.main.get_station_periods", return_value=cached):
+
+        rows = client.get(url)
+        columns = client.get(url + "&format=columns")
+        assert rows.json() == cached
+        assert columns.json() == {
+            "year": [1960, 1961],
+            "period": ["annual", "annual"],
+            "avg_tmax_c": [15.0, None],
+            "avg_tmin_c": [5.0, 4.0],
+            "n_tmax": [12, 0],
+            "n_tmin": [12, 12],
+        }
+        assert rows.headers["ETag"] != columns.headers["ETag"]
+        assert client.get(url + "&format=csv").status_code == 422
+
+def test_station_temps_ndjson_streams_cached_rows(client):
+    """
+    Verifies the streamed NDJSON mode for fully cached ranges.
+    ENSURE: Rows come from the cursor batches (no full list read), one JSON object per line; Accept selects it too.
+    """
+    batches = [[(1960, "annual", 15.0, 5.0, 12, 12)], [(1961, "annual", None, 4.0, 0, 12)]]
+    url = "/api/stations/TEST001/temps?start_year=1950&end_year=1980"
+    with patch("app.main.get_pool"), \
+         patch("app.main.get_missing_spans", return_value=[]), \
+         patch("app.main.get_station_periods") as mock_get, \
+         patch("app.main.iter_station_periods", side_effect=lambda *a: iter(batches)):
+
+        for response in (client.get(url + "&format=ndjson"),
+                         client.get(url, headers={"Accept": "application/x-ndjson"})):
+            assert response.status_code == 200
+            assert response.headers["Content-Type"] == "application/x-ndjson"
+            assert "ETag" in response.headers
+            lines = [json.loads(line) for line in response.text.splitlines()]
+            assert [(r["year"], r["avg_tmax_c"]) for r in lines] == [(1960, 15.0), (1961, None)]
+        assert not mock_get.called
+
+def test_station_temps_ndjson_releases_reader_before_streaming(client):
+    """
+    Verifies that a streamed cached response does not hold a pooled reader while sending.
+    ENSURE: The reader is returned before the first line is serialized.
+    """
+    held = []
+
+    @contextmanager
+    def reader():
+        held.append(True)
+        try:
+            yield MagicMock()
+        finally:
+            held.pop()
+
+    def lines(batch):
+        assert not held, "reader still held while streaming"
+        return ndjson_lines(batch)
+
+    pool = MagicMock()
+    pool.reader.side_effect = reader
+    batches = [[(1960, "annual", 15.0, 5.0, 12, 12)], [(1961, "annual", None, 4.0, 0, 12)]]
+    with patch("app.main.get_pool", return_value=pool), \
+         patch("app.main.get_missing_spans", return_value=[]), \
+         patch("app.main.iter_station_periods", side_effect=lambda *a: iter(batches)), \
+         patch("app.main.ndjson_lines", side_effect=lines):
+        response = client.get("/api/stations/TEST001/temps?start_year=1950&end_year=1980&format=ndjson")
+
+    assert response.status_code == 200
+    assert [json.loads(line)["year"] for line in response.text.splitlines()] == [1960, 1961]
+
+def test_station_temps_ndjson_streams_live_blocks(client):
+    """
+    Verifies the streamed NDJSON mode for a partially cached range.
+    ENSURE: Aggregated blocks and cached rows are merged in year order; the fetched rows are persisted afterwards.
+    """
+    cached = [{"year": 1962, "period": "annual", "avg_tmax_c": 1.0, "avg_tmin_c": 0.0, "n_tmax": 12, "n_tmin": 12}]
+    blocks = [
+        [("TEST001", 1960, "annual", 15.0, 5.0, 12, 12), ("TEST001", 1961, "annual", 16.0, 6.0, 12, 12)],
+        [("TEST001", 1963, "annual", 17.0, 7.0, 12, 12)],
+    ]
+    with patch("app.main.get_pool"), \
+         patch("app.main.get_missing_spans", return_value=[(1960, 1961), (1963, 1965)]), \
+         patch("app.main.get_station_lat", return_value=48.1), \
+         patch("app.main.get_station_periods", return_value=cached), \
+         patch("app.main.require_station_arrays", return_value={"date": []}) as mock_load, \
+         patch("app.main.iter_station_period_blocks", return_value=iter(blocks)) as mock_blocks, \
+         patch("app.main._write_queue") as mock_queue:
+
+        response = client.get("/api/stations/TEST001/temps?start_year=1960&end_year=1965&format=ndjson")
+
+        assert response.status_code == 200
+        assert response.headers["Cache-Control"] == "no-cache"
+        assert [json.loads(line)["year"] for line in response.text.splitlines()] == [1960, 1961, 1962, 1963]
+        mock_load.assert_called_once_with("TEST001")
+        mock_blocks.assert_called_once_with("TEST001", {"date": []}, [(1960, 1961), (1963, 1965)], True, 48.1)
+        mock_queue.submit.assert_called_once_with(
+            blocks[0] + blocks[1], coverage=[("TEST001", 1960, 1961), ("TEST001", 1963, 1965)], on_saved=ANY)
+
+def test_station_temps_ndjson_live_blocks_use_fetch_pool(client):
+    """
+    Verifies that live NDJSON aggregation runs on the bounded fetch pool.
+    ENSURE: Every block is aggregated there; a saturated pool answers 503 with Retry-After before streaming.
+    """
+    from app.worker_pool import PoolSaturated
+    blocks = [[("TEST001", 1960, "annual", 15.0, 5.0, 12, 12)], [("TEST001", 1961, "annual", 16.0, 6.0, 12, 12)]]
+    calls = []
+
+    async def run(fn, *args):
+        calls.append(fn)
+        return fn(*args)
+
+    async def saturated(fn, *args):
+        if fn is next:
+            raise PoolSaturated("fetch pool is full")
+        return fn(*args)
+
+    url = "/api/stations/TEST001/temps?start_year=1960&end_year=1961&format=ndjson"
+    with patch("app.main.get_pool"), \
+         patch("app.main.get_missing_spans", return_value=[(1960, 1961)]), \
+         patch("app.main.get_station_lat", return_value=48.1), \
+         patch("app.main.get_station_periods", return_value=[]), \
+         patch("app.main.require_station_arrays", return_value={"date": []}), \
+         patch("app.main.iter_station_period_blocks", side_effect=lambda *a: iter(blocks)), \
+         patch("app.main._write_queue"):
+
+        with patch("app.main._fetch_pool.run", side_effect=run):
+            response = client.get(url)
+        assert response.status_code == 200
+        assert [json.loads(line)["year"] for line in response.text.splitlines()] == [1960, 1961]
+        # Both blocks plus the step that finds the blocks exhausted
+        assert calls.count(next) == 3
+
+        with patch("app.main._fetch_pool.run", side_effect=saturated):
+            response = client.get(url)
+        assert response.status_code == 503
+        assert "Retry-After" in response.headers
+
+def test_search_stations_etag(client):
+    """
+    Verifies conditional search requests against the in-memory index.
+    ENSURE: A matching tag skips the search; a reloaded index with new content invalidates it.
+    """
+    mock_index = MagicMock(version="v1")
+    mock_index.search.return_value = []
+    body = {"lat": 52.5, "lon": 13.4, "radius_km": 10}
+    with patch("app.main.get_station_index", return_value=mock_index):
+        client.app.state.stations_ready = True
+        client.app.state.stations_error = None
+
+        etag = client.post("/api/stations/search", json=body).headers["ETag"]
+        response = client.post("/api/stations/search", json=body, headers={"If-None-Match": etag})
+        assert response.status_code == 304
+        assert mock_index.search.call_count == 1
+
+        mock_index.version = "v2"
+        response = client.post("/api/stations/search", json=body, headers={"If-None-Match": etag})
+        assert response.status_code == 200
 
 def test_station_temps_missing_station(client):
     """
     Verifies proper error handling when external data sources cannot be found.
     ENSURE: API returns HTTP 404 when the external fetch raises FileNotFoundError.
     """
-    with patch("app.main.sqlite3.connect"), \
-         patch("app.main.create_temps_schema"), \
+    with patch("app.main.get_pool"), \
+         patch("app.main.get_missing_spans", return_value=[(0, 9999)]), \
          patch("app.main.get_station_periods", return_value=[]), \
-         patch("app.main.fetch_and_parse_station_periods") as mock_fetch:
+         patch("app.main.fetch_station_period_spans") as mock_fetch:
          
         mock_fetch.side_effect = FileNotFoundError("Station not found anywhere")
         
         response = client.get("/api/stations/INVALID/temps")
         assert response.status_code == 404
 
+def test_station_temps_failed_fetch_not_cached(client):
+    """
+    Verifies that a fetch without any loadable data is never recorded as cached.
+    ENSURE: JSON and NDJSON requests answer 404 and nothing is handed to the write-behind queue.
+    """
+    with patch("app.main.get_pool"), \
+         patch("app.main.get_missing_spans", return_value=[(1950, 2000)]), \
+         patch("app.main.get_station_lat", return_value=None), \
+         patch("app.main.get_station_periods", return_value=[]), \
+         patch("app.import_temps.load_station_arrays", return_value=None), \
+         patch("app.main._write_queue") as mock_queue:
+
+        assert client.get("/api/stations/FAIL001/temps?start_year=1950&end_year=2000").status_code == 404
+        response = client.get("/api/stations/FAIL001/temps?start_year=1950&end_year=2000&format=ndjson")
+        assert response.status_code == 404
+        assert not mock_queue.submit.called
+
+def test_station_temps_progress_stream(client):
+    """
+    Verifies the Server-Sent Events progress channel of live fetches.
+    ENSURE: A live fetch publishes its phases until saved; the SSE stream replays them, resumes after
+    Last-Event-ID and answers 404 for stations without a fetch.
+    """
+    def fetch(station_id, spans, conn, ignore_qflag, lat):
+        report_progress(station_id, "parsed", rows=10)
+        return [("PROG001", 2022, "summer", 25.0, 15.0, 90, 90)]
+
+    with patch("app.main.get_pool"), \
+         patch("app.main.get_missing_spans", return_value=[(0, 9999)]), \
+         patch("app.main.get_station_lat", return_value=48.1), \
+         patch("app.main.get_station_periods", return_value=[]), \
+         patch("app.main.fetch_station_period_spans", side_effect=fetch), \
+         patch("app.main._write_queue") as mock_queue:
+        mock_queue.submit.side_effect = lambda rows, coverage, on_saved: on_saved(True)
+
+        assert client.get("/api/stations/PROG001/temps/progress").status_code == 404
+        assert client.get("/api/stations/PROG001/temps").status_code == 200
+
+    response = client.get("/api/stations/PROG001/temps/progress")
+    assert response.status_code == 200
+    assert response.headers["Content-Type"].startswith("text/event-stream")
+    events = [block.splitlines() for block in response.text.strip().split("\n\n")]
+    assert [e[1] for e in events] == ["event: started", "event: parsed", "event: saved"]
+    assert json.loads(events[2][2][len("data: "):])["rows"] == 1
+
+    response = client.get("/api/stations/PROG001/temps/progress", headers={"Last-Event-ID": "2"})
+    assert response.text.startswith("id: 3\nevent: saved\n")
+
+def test_station_temps_pool_saturated(client):
+    """
+    Verifies back-pressure on the cold path when the fetch pool is full.
+    ENSURE: API returns HTTP 503 with a Retry-After header.
+    """
+    from app.worker_pool import PoolSaturated
+    with patch("app.main.get_pool"), \
+         patch("app.main.get_missing_spans", return_value=[(0, 9999)]), \
+         patch("app.main.get_station_periods", return_value=[]), \
+         patch("app.main._fetch_pool.submit", side_effect=PoolSaturated("full")):
+
+        response = client.get("/api/stations/BUSY001/temps")
+        assert response.status_code == 503
+        assert "Retry-After" in response.headers
+
+def test_station_temps_job_submit_and_poll(client):
+    """
+    Verifies the asynchronous job API for temps fetches.
+    ENSURE: Submission answers 202 with a Location, identical submissions share the job,
+    polling returns the merged rows once done and 404 for unknown jobs.
+    """
+    with patch("app.main.get_pool"), \
+         patch("app.main.get_missing_spans", return_value=[(0, 9999)]), \
+         patch("app.main.get_station_lat", return_value=48.1), \
+         patch("app.main.get_station_periods", return_value=[]), \
+         patch("app.main.fetch_station_period_spans") as mock_fetch, \
+         patch("app.main._write_queue") as mock_queue:
+        mock_fetch.return_value = [("JOB001", 2022, "summer", 25.0, 15.0, 90, 90)]
+
+        response = client.post("/api/stations/JOB001/temps/jobs")
+        assert response.status_code == 202
+        job = response.json()
+        assert response.headers["Location"] == f"/api/jobs/{job['job_id']}"
+        assert (job["station_id"], job["deduplicated"]) == ("JOB001", False)
+
+        response = client.get(f"/api/jobs/{job['job_id']}?wait=5")
+        assert response.status_code == 200
+        assert response.json()["status"] == "done"
+        assert [r["year"] for r in response.json()["result"]] == [2022]
+
+        again = client.post("/api/stations/JOB001/temps/jobs").json()
+        assert (again["job_id"], again["deduplicated"]) == (job["job_id"], True)
+        mock_fetch.assert_called_once_with("JOB001", [(0, 9999)], None, True, 48.1)
+        mock_queue.submit.assert_called_once()
+
+    assert client.get("/api/jobs/unknown").status_code == 404
+    assert client.post("/api/stations/JOB001/temps/jobs?start_year=2000&end_year=1990").status_code == 400
+
+def test_station_temps_hands_off_slow_fetch_to_job(client):
+    """
+    Verifies the latency budget of the synchronous temps endpoint.
+    ENSURE: A fetch exceeding the budget answers 202 with the job to poll; the job still finishes.
+    """
+    release = threading.Event()
+
+    def slow_fetch(station_id, spans, conn, ignore_qflag, lat):
+        release.wait(5)
+        return [("SLOW001", 2022, "summer", 25.0, 15.0, 90, 90)]
+
+    with patch("app.main.get_pool"), \
+         patch("app.main.get_missing_spans", return_value=[(0, 9999)]), \
+         patch("app.main.get_station_lat", return_value=None), \
+         patch("app.main.get_station_periods", return_value=[]), \
+         patch("app.main.fetch_station_period_spans", side_effect=slow_fetch), \
+         patch("app.main._write_queue"), \
+         patch("app.main.TEMPS_LATENCY_BUDGET", 0.05):
+
+        response = client.get("/api/stations/SLOW001/temps")
+        assert response.status_code == 202
+        assert "Retry-After" in response.headers
+        location = response.headers["Location"]
+        assert response.json()["status"] == "running"
+
+        release.set()
+        response = client.get(f"{location}?wait=5")
+        assert response.json()["status"] == "done"
+        assert response.json()["result"][0]["period"] == "summer"
+
+def test_station_temps_job_reports_failure(client):
+    """
+    Verifies the status of failed jobs.
+    ENSURE: A missing station is reported as failed with status code 404.
+    """
+    with patch("app.main.get_pool"), \
+         patch("app.main.get_missing_spans", return_value=[(0, 9999)]), \
+         patch("app.main.get_station_periods", return_value=[]), \
+         patch("app.main.fetch_station_period_spans", side_effect=FileNotFoundError("Station not found")):
+
+        job_id = client.post("/api/stations/GONE001/temps/jobs").json()["job_id"]
+        body = client.get(f"/api/jobs/{job_id}?wait=5").json()
+
+    assert body["status"] == "failed"
+    assert body["error"] == {"status_code": 404, "detail": "Station not found"}
+
 # -------------------------------------------------------------------
 # 3. Lifecycle & App State Tests
 # -------------------------------------------------------------------
@@ -130,7 +633,8 @@ async def test_startup_event_initialization_error():
     from app.main import app, lifespan
     import asyncio
     
-    with patch("app.main.ensure_stations_imported", side_effect=Exception("Boot Failure")):
+    with patch("app.main._init_db"), \
+         patch("app.main.ensure_stations_imported", side_effect=Exception("Boot Failure")):
         async with lifespan(app):
             # Await the background task spawned by startup_event
             pending = asyncio.all_tasks()
@@ -144,6 +648,29 @@ async def test_startup_event_initialization_error():
             assert app.state.stations_ready is False
             assert app.state.stations_error == "Boot Failure"
 
+def test_bootstrap_waits_for_other_worker():
+    """
+    Verifies the cross-process bootstrap lock.
+    ENSURE: A worker does not touch the database while another one bootstraps, then finds it ready.
+    """
+    from app.main import _bootstrap_shared_db
+    from app.process_lock import named_lock
+
+    other = named_lock("bootstrap")
+    other.acquire()
+    result = {}
+    with patch("app.main._init_db") as mock_init, \
+         patch("app.main.ensure_stations_imported", return_value={"imported": False, "stations_count": 3}):
+        worker = threading.Thread(target=lambda: result.update(info=_bootstrap_shared_db()))
+        worker.start()
+        time.sleep(0.2)
+        assert not mock_init.called
+        other.release()
+        worker.join(5)
+
+    assert mock_init.called
+    assert result["info"] == {"imported": False, "stations_count": 3}
+
 def test_require_ready_guard_logic():
     """
     Verifies that the _require_ready guard raises correct HTTP exceptions based on app state.
@@ -165,3 +692,98 @@ def test_require_ready_guard_logic():
     assert exc.value.status_code == 503
 
 
+
+def test_nearest_stations_endpoint(client):
+    """
+    Verifies that the nearest endpoint forwards the request to the station index.
+    ENSURE: 200 with index results, 503 while the index is not loaded.
+    """
+    client.app.state.stations_ready = True
+    client.app.state.stations_error = None
+
+    mock_index = MagicMock()
+    mock_index.nearest.return_value = [
+        {"station_id": "NEAR01", "name": "Ocean Buoy", "lat": 0.0, "lon": -30.0, "distance_km": 812.4}
+    ]
+    with patch("app.main.get_station_index", return_value=mock_index):
+        response = client.post("/api/stations/nearest", json={"lat": 0.0, "lon": -30.0, "k": 1})
+        assert response.status_code == 200
+        assert response.json()[0]["station_id"] == "NEAR01"
+        assert mock_index.nearest.call_args.kwargs["k"] == 1
+
+    with patch("app.main.get_station_index", return_value=None):
+        response = client.post("/api/stations/nearest", json={"lat": 0.0, "lon": -30.0})
+        assert response.status_code == 503
+
+def test_search_stations_batch_streams_ndjson(client):
+    """
+    Verifies that the batch endpoint streams one NDJSON line per query in input order.
+    """
+    import json
+    client.app.state.stations_ready = True
+    client.app.state.stations_error = None
+
+    mock_index = MagicMock()
+    mock_index.search_batch.side_effect = lambda queries: ([{"station_id": f"S{q['lat']:.0f}"}] for q in queries)
+    with patch("app.main.get_station_index", return_value=mock_index):
+        response = client.post("/api/stations/search/batch", json=[
+            {"lat": 1, "lon": 0, "radius_km": 10},
+            {"lat": 2, "lon": 0, "radius_km": 10},
+        ])
+
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("application/x-ndjson")
+    lines = [json.loads(line) for line in response.text.splitlines()]
+    assert [line["index"] for line in lines] == [0, 1]
+    assert lines[1]["stations"][0]["station_id"] == "S2"
+
+def test_metrics_endpoint_reports_coalescing(client):
+    """
+    Verifies that the metrics endpoint exposes the single-flight counters.
+    """
+    response = client.get("/api/metrics")
+    assert response.status_code == 200
+    stats = response.json()["temps_fetch"]
+    assert {"requests", "executions", "coalesced", "in_flight"} <= set(stats)
+    assert {"requests", "bytes", "hosts"} <= set(response.json()["http"])
+
+def test_metrics_temps_fetch_counts_both_fetch_paths(client):
+    """
+    Verifies that "temps_fetch" combines streamed loads with sync requests and temps jobs.
+    ENSURE: Requests coalesced into a shared job count as coalesced just like shared streams.
+    """
+    stream = {"requests": 5, "executions": 3, "coalesced": 2, "in_flight": 1}
+    jobs = {"jobs": 4, "running": 1, "submitted": 4, "deduplicated": 3}
+    with patch("app.main._temps_flight.stats", return_value=stream), \
+         patch("app.main._jobs.stats", return_value=jobs):
+        stats = client.get("/api/metrics").json()["temps_fetch"]
+
+    assert (stats["requests"], stats["executions"], stats["coalesced"], stats["in_flight"]) == (12, 7, 5, 2)
+    assert stats["stream"] == stream
+    assert stats["jobs"] == {"requests": 7, "executions": 4, "coalesced": 3, "in_flight": 1}
+
+def test_admin_station_refresh_reloads_index(client):
+    """
+    Verifies the conditional station metadata refresh endpoint.
+    ENSURE: The search index is only reloaded when the refresh changed data; failures answer 502.
+    """
+    client.app.state.stations_ready = True
+    client.app.state.stations_error = None
+
+    admin = {"X-Admin-Token": "secret"}
+    changed = {"stations": {"added": 1, "updated": 0, "removed": 0, "unchanged": 5}, "inventory": None, "changed": True}
+    with patch("app.main.ADMIN_TOKEN", "secret"), \
+         patch("app.main.get_pool"), \
+         patch("app.main.refresh_station_metadata", return_value=changed), \
+         patch("app.main.reload_station_index") as mock_reload:
+        response = client.post("/api/admin/stations/refresh", headers=admin)
+        assert response.status_code == 200
+        assert response.json()["stations"]["added"] == 1
+        mock_reload.assert_called_once()
+
+    with patch("app.main.ADMIN_TOKEN", "secret"), \
+         patch("app.main.get_pool"), \
+         patch("app.main.refresh_station_metadata", side_effect=IOError("offline")), \
+         patch("app.main.reload_station_index") as mock_reload:
+        assert client.post("/api/admin/stations/refresh", headers=admin).status_code == 502
+        assert not mock_reload.called
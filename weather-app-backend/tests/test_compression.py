@@ -0,0 +1,85 @@
+import gzip
+import brotli
+import pytest
+from fastapi import FastAPI
+from fastapi.responses import PlainTextResponse, StreamingResponse
+from fastapi.testclient import TestClient
+from app.compression import CompressionMiddleware, choose_encoding
+
+BODY = b"0123456789" * 200
+
+
+@pytest.fixture
+def compressed_client():
+    app = FastAPI()
+    app.add_middleware(CompressionMiddleware, minimum_size=1000)
+
+    @app.get("/big")
+    def big():
+        return PlainTextResponse(BODY, headers={"ETag": '"t1"'})
+
+    @app.get("/small")
+    def small():
+        return PlainTextResponse(BODY[:100])
+
+    @app.get("/stream")
+    def stream():
+        return StreamingResponse(iter([b"line 1\n", b"line 2\n"]), media_type="application/x-ndjson")
+
+    return TestClient(app)
+
+# -------------------------------------------------------------------
+# 1. Negotiation
+# -------------------------------------------------------------------
+
+def test_choose_encoding():
+    """
+    Verifies Accept-Encoding negotiation.
+    ENSURE: Brotli is preferred, q=0 disables an encoding, unsupported lists give None.
+    """
+    assert choose_encoding("gzip, deflate, br") == "br"
+    assert choose_encoding("gzip, br;q=0") == "gzip"
+    assert choose_encoding("*") == "br"
+    assert choose_encoding("deflate") is None
+    assert choose_encoding("") is None
+
+# -------------------------------------------------------------------
+# 2. Middleware
+# -------------------------------------------------------------------
+
+@pytest.mark.parametrize("encoding,decompress", [("br", brotli.decompress), ("gzip", gzip.decompress)])
+def test_large_response_is_compressed(compressed_client, encoding, decompress):
+    """
+    Verifies compression of bodies above the threshold.
+    ENSURE: The body round-trips, Content-Length and Vary are set, the strong ETag is weakened.
+    """
+    r = compressed_client.get("/big", headers={"Accept-Encoding": encoding})
+    assert r.headers["Content-Encoding"] == encoding
+    assert r.headers["Vary"] == "Accept-Encoding"
+    assert r.headers["ETag"] == 'W/"t1"'
+    assert r.content == BODY
+    assert int(r.headers["Content-Length"]) < len(BODY) // 5
+
+
+def test_small_and_unaccepted_responses_pass_through(compressed_client):
+    """
+    Verifies that small bodies and clients without a supported encoding get the plain body.
+    """
+    r = compressed_client.get("/small", headers={"Accept-Encoding": "br"})
+    assert "Content-Encoding" not in r.headers
+    assert r.content == BODY[:100]
+
+    r = compressed_client.get("/big", headers={"Accept-Encoding": "identity"})
+    assert "Content-Encoding" not in r.headers
+    assert r.headers["ETag"] == '"t1"'
+
+
+def test_streamed_response_is_compressed_per_chunk(compressed_client):
+    """
+    Verifies streamed responses regardless of their size.
+    ENSURE: The stream is compressed without Content-Length and decodes to all lines.
+    """
+    r = compressed_client.get("/stream", headers={"Accept-Encoding": "gzip"})
+    assert r.headers["Content-Encoding"] == "gzip"
+    assert "Content-Length" not in r.headers
+    assert r.text == "line 1\nline 2\n"
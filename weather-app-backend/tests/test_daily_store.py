@@ -0,0 +1,83 @@
+from concurrent.futures import ThreadPoolExecutor
+from unittest.mock import patch
+
+import numpy as np
+import pandas as pd
+import pytest
+from app.daily_store import (
+    daily_arrays_from_frame,
+    daily_frame,
+    daily_path,
+    has_daily,
+    load_daily,
+    save_daily,
+)
+
+
+def _dly_frame():
+    """Melted DLY loader frame (day_raw, NaN for blank qflags)."""
+    return pd.DataFrame({
+        "station_id": ["STAT1"] * 4,
+        "year": [1999, 2000, 2000, 2001],
+        "month": [12, 1, 2, 3],
+        "element": ["TMAX", "TMIN", "TMAX", "TMIN"],
+        "day_raw": ["v31", "v1", "v15", "v2"],
+        "value": [120, -35, 80, 10],
+        "qflag": [np.nan, "G", np.nan, " "],
+    })
+
+
+def test_arrays_from_dly_frame():
+    arrays = daily_arrays_from_frame(_dly_frame())
+
+    assert arrays["date"].tolist() == [19991231, 20000101, 20000215, 20010302]
+    assert arrays["element"].tolist() == [0, 1, 0, 1]
+    assert arrays["value"].dtype == np.int16
+    assert arrays["qflag"].tolist() == [b"", b"G", b"", b""]
+
+
+def test_save_and_load_roundtrip(tmp_path):
+    arrays = daily_arrays_from_frame(_dly_frame())
+    assert not has_daily("STAT1", tmp_path)
+
+    path = save_daily("STAT1", arrays, tmp_path)
+
+    assert path == daily_path("STAT1", tmp_path)
+    assert has_daily("STAT1", tmp_path)
+    assert [p.name for p in path.parent.iterdir()] == [path.name]
+    loaded = load_daily("STAT1", tmp_path)
+    for name, values in arrays.items():
+        np.testing.assert_array_equal(loaded[name], values)
+
+
+def test_concurrent_and_failed_saves_leave_no_temp_files(tmp_path):
+    arrays = daily_arrays_from_frame(_dly_frame())
+    with ThreadPoolExecutor(8) as pool:
+        paths = list(pool.map(lambda _: save_daily("STAT1", arrays, tmp_path), range(32)))
+
+    assert set(paths) == {daily_path("STAT1", tmp_path)}
+    np.testing.assert_array_equal(load_daily("STAT1", tmp_path)["value"], arrays["value"])
+
+    with patch("app.daily_store.np.savez", side_effect=OSError("disk full")):
+        with pytest.raises(OSError):
+            save_daily("STAT2", arrays, tmp_path)
+    assert [p.name for p in paths[0].parent.iterdir()] == [paths[0].name]
+
+
+def test_load_missing_station(tmp_path):
+    assert load_daily("NOPE", tmp_path) is None
+
+
+def test_daily_frame_filters_years_and_qflags():
+    arrays = daily_arrays_from_frame(_dly_frame())
+
+    df = daily_frame("STAT1", arrays, 2000, 2000, ignore_qflag=True)
+    assert list(df.columns) == ["station_id", "year", "month", "element", "value"]
+    assert df["month"].tolist() == [2]
+    assert df["value"].tolist() == [80.0]
+
+    df = daily_frame("STAT1", arrays, None, None, ignore_qflag=False)
+    assert df["element"].tolist() == ["TMAX", "TMIN", "TMAX", "TMIN"]
+    assert df["year"].tolist() == [1999, 2000, 2000, 2001]
+
+    assert daily_frame("STAT1", arrays, 2005, None, ignore_qflag=False).empty
@@ -0,0 +1,101 @@
+import pytest
+import sqlite3
+import threading
+from app.db import ConnectionPool, get_pool, close_pools
+from app.import_temps import create_schema, save_station_periods_to_db, get_station_periods
+
+
+@pytest.fixture
+def pool(tmp_path):
+    pool = ConnectionPool(tmp_path / "pool.sqlite3", readers=2)
+    with pool.writer() as conn:
+        create_schema(conn)
+    yield pool
+    pool.close()
+
+# -------------------------------------------------------------------
+# 1. Pragmas & Modes
+# -------------------------------------------------------------------
+
+def test_pool_uses_wal_and_tuned_pragmas(pool):
+    """
+    Verifies that pooled connections run in WAL mode with the tuned pragmas.
+    """
+    with pool.reader() as conn:
+        assert conn.execute("PRAGMA journal_mode;").fetchone()[0] == "wal"
+        assert conn.execute("PRAGMA synchronous;").fetchone()[0] == 1  # NORMAL
+        assert conn.execute("PRAGMA temp_store;").fetchone()[0] == 2   # MEMORY
+        assert conn.execute("PRAGMA query_only;").fetchone()[0] == 1
+
+
+def test_reader_rejects_writes(pool):
+    """
+    Verifies that reader connections are read-only.
+    """
+    with pool.reader() as conn:
+        with pytest.raises(sqlite3.OperationalError):
+            save_station_periods_to_db(conn, [("STAT1", 2020, "annual", 1.0, 0.0, 1, 1)])
+
+# -------------------------------------------------------------------
+# 2. Reader / Writer Behaviour
+# -------------------------------------------------------------------
+
+def test_readers_are_reused(pool):
+    """
+    Verifies that reader connections are returned to the pool and reused.
+    """
+    with pool.reader() as first:
+        pass
+    with pool.reader() as second:
+        assert second is first
+
+
+def test_writer_rolls_back_on_error(pool):
+    """
+    Verifies that uncommitted writes are rolled back when the block raises.
+    """
+    with pytest.raises(RuntimeError):
+        with pool.writer() as conn:
+            conn.execute(
+                "INSERT INTO station_temp_period (station_id, year, period, n_tmax, n_tmin) "
+                "VALUES ('STAT1', 2020, 'annual', 0, 0)")
+            raise RuntimeError("boom")
+
+    with pool.reader() as conn:
+        assert get_station_periods("STAT1", conn) == []
+
+
+def test_reader_sees_committed_writes_while_writer_is_busy(pool):
+    """
+    Verifies that WAL readers are not blocked by an open write transaction.
+    """
+    with pool.writer() as conn:
+        save_station_periods_to_db(conn, [("STAT1", 2020, "annual", 1.0, 0.0, 1, 1)])
+
+    result = []
+    with pool.writer() as conn:
+        conn.execute(
+            "INSERT INTO station_temp_period (station_id, year, period, n_tmax, n_tmin) "
+            "VALUES ('STAT1', 2021, 'annual', 0, 0)")
+
+        def read():
+            with pool.reader() as rconn:
+                result.extend(get_station_periods("STAT1", rconn))
+
+        t = threading.Thread(target=read)
+        t.start()
+        t.join(timeout=5)
+        conn.commit()
+
+    assert [r["year"] for r in result] == [2020]
+
+
+def test_get_pool_is_shared_per_path(tmp_path):
+    """
+    Verifies that get_pool returns one pool per database file.
+    """
+    a = get_pool(tmp_path / "a.sqlite3")
+    assert get_pool(tmp_path / "a.sqlite3") is a
+    assert get_pool(tmp_path / "b.sqlite3") is not a
+    close_pools()
+    assert get_pool(tmp_path / "a.sqlite3") is not a
@@ -0,0 +1,166 @@
+import gzip
+import os
+import sqlite3
+import time
+import pytest
+from unittest.mock import patch
+from app.db import get_pool
+from app.daily_store import daily_path, load_daily
+from app.freshness import TEMPS_TTL_SECONDS, is_stale, revalidate_station, save_freshness, touches_recent
+from app.import_temps import StationDataUnavailable, create_schema, get_station_periods, save_station_periods_to_db
+from app.process_lock import holding
+
+S3_PATH = "/csv.gz/by_station/STAT1.csv.gz"
+
+
+@pytest.fixture
+def db_path(tmp_path):
+    path = tmp_path / "freshness.sqlite3"
+    conn = sqlite3.connect(path)
+    create_schema(conn)
+    conn.close()
+    return path
+
+
+@pytest.fixture
+def sources(http_server, tmp_path):
+    with patch("app.freshness.S3_BASE_URL", http_server.url), \
+         patch("app.freshness.DLY_BASE_URL", http_server.url), \
+         patch("app.freshness.S3_DATA_DIR", tmp_path / "s3"), \
+         patch("app.freshness.DATA_DIR", tmp_path / "dly"), \
+         patch("app.import_temps.S3_DATA_DIR", tmp_path / "s3"), \
+         patch("app.import_temps.DATA_DIR", tmp_path / "dly"):
+        yield http_server
+
+
+def _csv_gz(values):
+    """One TMAX observation per (year, month) -> value in tenths of a degree."""
+    lines = [f"STAT1,{y}{m:02d}15,TMAX,{v},,,S," for (y, m), v in sorted(values.items())]
+    return gzip.compress(("\n".join(lines) + "\n").encode())
+
+# -------------------------------------------------------------------
+# 1. Staleness
+# -------------------------------------------------------------------
+
+def test_touches_recent():
+    """
+    Verifies which requested ranges reach into the mutable recent years.
+    ENSURE: Open ranges and ranges ending in the previous or current year count as recent.
+    """
+    now = time.mktime((2026, 6, 1, 0, 0, 0, 0, 0, -1))
+    assert touches_recent(None, now)
+    assert touches_recent(2025, now)
+    assert not touches_recent(2024, now)
+
+
+def test_is_stale_uses_metadata_and_daily_store(db_path, daily_store_dir):
+    """
+    Verifies the freshness sources in order: metadata row, daily store mtime, unknown.
+    ENSURE: Unknown stations are stale; the TTL is applied to the newest known fetch time.
+    """
+    now = time.time()
+    with get_pool(db_path).writer() as conn:
+        assert is_stale(conn, "STAT1", now)
+
+        daily_store_dir.mkdir()
+        daily_path("STAT1").write_bytes(b"")
+        assert not is_stale(conn, "STAT1", now)
+        old = now - TEMPS_TTL_SECONDS - 60
+        os.utime(daily_path("STAT1"), (old, old))
+        assert is_stale(conn, "STAT1", now)
+
+        save_freshness(conn, "STAT1", "http://x", None, None, now - 60, changed=False)
+        assert not is_stale(conn, "STAT1", now)
+
+# -------------------------------------------------------------------
+# 2. Revalidation
+# -------------------------------------------------------------------
+
+def test_revalidate_station_updates_recent_years_only(db_path, sources):
+    """
+    Verifies a revalidation round trip against a conditional source.
+    ENSURE: Changed data rewrites recent periods only; an unchanged source answers 304 and writes nothing.
+    """
+    sources.route(S3_PATH, (200, _csv_gz({(2000, 1): 100, (2024, 12): 50, (2025, 1): 200}), 0, {"ETag": '"v1"'}))
+    with get_pool(db_path).writer() as conn:
+        save_station_periods_to_db(conn, [
+            ("STAT1", 2000, "annual", 99.0, None, 12, 0),
+            ("STAT1", 2025, "annual", 99.0, None, 12, 0),
+        ])
+
+    res = revalidate_station("STAT1", lat=52.5, db_path=db_path, recent_from=2025)
+
+    assert res == {"station_id": "STAT1", "status": "updated", "rows": 2}
+    assert load_daily("STAT1")["date"].tolist() == [20000115, 20241215, 20250115]
+    with get_pool(db_path).reader() as conn:
+        periods = {(r["year"], r["period"]): r["avg_tmax_c"] for r in get_station_periods("STAT1", conn)}
+        freshness = conn.execute("SELECT source_url, etag, changed_at FROM station_temp_freshness").fetchone()
+    # Historical years untouched except the winter that runs from December 2024 into 2025
+    assert periods == {(2000, "annual"): 99.0, (2024, "winter"): 12.5, (2025, "annual"): 20.0}
+    assert freshness[0] == f"{sources.url}{S3_PATH}" and freshness[1] == '"v1"'
+
+    res = revalidate_station("STAT1", lat=52.5, db_path=db_path, recent_from=2025)
+    assert res["status"] == "not_modified"
+    assert sources.request_headers[-1]["If-None-Match"] == '"v1"'
+    with get_pool(db_path).reader() as conn:
+        row = conn.execute("SELECT checked_at, changed_at FROM station_temp_freshness").fetchone()
+    assert row[0] > row[1] == freshness[2]
+
+
+def test_revalidate_station_falls_back_to_dly(db_path, sources):
+    """
+    Verifies that stations without an S3 file are revalidated from the NCEI DLY file.
+    ENSURE: The DLY source is remembered for the next conditional request.
+    """
+    line = f"{'STAT1':<11}202501TMAX" + "  150   " + "-9999   " * 30
+    sources.route("/STAT1.dly", (200, (line + "\n").encode(), 0, {"ETag": '"d1"'}))
+
+    assert revalidate_station("STAT1", db_path=db_path, recent_from=2025)["status"] == "updated"
+    assert revalidate_station("STAT1", db_path=db_path, recent_from=2025)["status"] == "not_modified"
+    assert sources.count(S3_PATH) == 1
+
+
+
+def test_revalidate_station_falls_through_empty_s3_file(db_path, sources):
+    """
+    Verifies revalidation of a station whose S3 file has no temperature rows.
+    ENSURE: The DLY file is used and remembered, so later revalidations ask the DLY source.
+    """
+    prcp = gzip.compress(b"STAT1,20250115,PRCP,12,,,S,\n")
+    sources.route(S3_PATH, (200, prcp, 0, {"ETag": '"s1"'}))
+    line = f"{'STAT1':<11}202501TMAX" + "  150   " + "-9999   " * 30
+    sources.route("/STAT1.dly", (200, (line + "\n").encode(), 0, {"ETag": '"d1"'}))
+
+    res = revalidate_station("STAT1", db_path=db_path, recent_from=2025)
+    assert res["status"] == "updated" and res["rows"] > 0
+    with get_pool(db_path).reader() as conn:
+        source_url = conn.execute("SELECT source_url FROM station_temp_freshness").fetchone()[0]
+    assert source_url == f"{sources.url}/STAT1.dly"
+
+    assert revalidate_station("STAT1", db_path=db_path, recent_from=2025)["status"] == "not_modified"
+    assert sources.count(S3_PATH) == 1
+    assert sources.request_headers[-1]["If-None-Match"] == '"d1"'
+
+    # Neither source has temperatures: nothing is recorded
+    sources.route("/csv.gz/by_station/STAT2.csv.gz", (200, prcp))
+    sources.route("/STAT2.dly", (200, b"\n"))
+    with pytest.raises(StationDataUnavailable):
+        revalidate_station("STAT2", db_path=db_path, recent_from=2025)
+    with get_pool(db_path).reader() as conn:
+        assert conn.execute("SELECT COUNT(*) FROM station_temp_freshness WHERE station_id = 'STAT2'").fetchone()[0] == 0
+
+
+def test_revalidate_station_skips_when_another_worker_holds_the_station(db_path, sources):
+    """
+    Verifies that concurrent revalidations of one station across workers are deduplicated.
+    ENSURE: While the station's fetch lock is held elsewhere, nothing is downloaded or written.
+    """
+    sources.route(S3_PATH, (200, _csv_gz({(2025, 1): 200}), 0, {"ETag": '"v1"'}))
+
+    with holding("fetch-STAT1") as locked:
+        assert locked
+        res = revalidate_station("STAT1", db_path=db_path, recent_from=2025)
+
+    assert res == {"station_id": "STAT1", "status": "skipped", "rows": 0}
+    assert sources.count(S3_PATH) == 0
+    assert revalidate_station("STAT1", db_path=db_path, recent_from=2025)["status"] == "updated"
@@ -0,0 +1,38 @@
+from app.http_cache import cache_headers, etag_matches, make_etag
+
+# -------------------------------------------------------------------
+# 1. Validators
+# -------------------------------------------------------------------
+
+def test_make_etag_is_deterministic():
+    """
+    Verifies that tags only depend on their parts.
+    ENSURE: Equal parts give the same strong tag, different parts a different one.
+    """
+    etag = make_etag("temps", "STAT1", 1950, 1980, "immutable")
+    assert etag == make_etag("temps", "STAT1", 1950, 1980, "immutable")
+    assert etag != make_etag("temps", "STAT1", 1950, 1981, "immutable")
+    assert etag.startswith('"') and etag.endswith('"') and not etag.startswith("W/")
+
+
+def test_etag_matches_header_forms():
+    """
+    Verifies If-None-Match parsing.
+    ENSURE: Lists, weak prefixes and `*` match; missing headers and other tags do not.
+    """
+    etag = make_etag("x")
+    assert etag_matches(etag, etag)
+    assert etag_matches(f'"a", W/{etag}', etag)
+    assert etag_matches("*", etag)
+    assert not etag_matches("*", etag, allow_wildcard=False)
+    assert etag_matches(f'*, {etag}', etag, allow_wildcard=False)
+    assert not etag_matches(None, etag)
+    assert not etag_matches('"a", "b"', etag)
+
+
+def test_cache_headers_without_validator():
+    """
+    Verifies that responses without a validator only carry the cache policy.
+    """
+    assert cache_headers(None, "no-cache") == {"Cache-Control": "no-cache"}
+    assert cache_headers('"t"', "no-cache") == {"Cache-Control": "no-cache", "ETag": '"t"'}
@@ -0,0 +1,170 @@
+import multiprocessing
+import threading
+import time
+import pytest
+import requests
+from app.http_client import DownloadCancelled, HttpClient, get_http_client, part_path, race
+
+# -------------------------------------------------------------------
+# 1. Pooled Downloads
+# -------------------------------------------------------------------
+
+def test_download_reuses_connection(http_server, tmp_path):
+    """
+    Verifies that consecutive downloads go through one kept-alive connection.
+    ENSURE: Files are written completely and the server sees a single client socket.
+    """
+    http_server.route("/a.txt", (200, b"alpha" * 1000))
+    http_server.route("/b.txt", (200, b"beta"))
+    client = get_http_client()
+
+    client.download(f"{http_server.url}/a.txt", tmp_path / "a.txt")
+    client.download(f"{http_server.url}/b.txt", tmp_path / "b.txt")
+    client.download(f"{http_server.url}/a.txt", tmp_path / "c.txt")
+
+    assert (tmp_path / "a.txt").read_bytes() == b"alpha" * 1000
+    assert (tmp_path / "b.txt").read_bytes() == b"beta"
+    assert len(http_server.peers) == 1
+    assert client.stats()["requests"] == 3
+
+
+def test_download_retries_server_errors(http_server, tmp_path):
+    """
+    Verifies retry with backoff on transient 5xx responses.
+    ENSURE: Two 503s are retried away; a persistent 404 raises and leaves no partial file.
+    """
+    http_server.route("/flaky", (503, b""), (503, b""), (200, b"ok"))
+    http_server.route("/missing", (404, b"nope"))
+    client = HttpClient(retries=3, backoff=0)
+    try:
+        client.download(f"{http_server.url}/flaky", tmp_path / "flaky")
+        assert (tmp_path / "flaky").read_bytes() == b"ok"
+        assert http_server.count("/flaky") == 3
+
+        with pytest.raises(requests.HTTPError):
+            client.download(f"{http_server.url}/missing", tmp_path / "missing")
+        assert list(tmp_path.iterdir()) == [tmp_path / "flaky"]
+    finally:
+        client.close()
+
+
+def test_host_concurrency_limit(http_server, tmp_path):
+    """
+    Verifies the per-host semaphore.
+    ENSURE: With host_concurrency=1 parallel downloads never overlap on the server.
+    """
+    http_server.route("/slow", (200, b"x", 0.05))
+    client = HttpClient(host_concurrency=1)
+    try:
+        threads = [
+            threading.Thread(target=client.download, args=(f"{http_server.url}/slow", tmp_path / f"f{i}"))
+            for i in range(4)
+        ]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+    finally:
+        client.close()
+
+    assert http_server.count("/slow") == 4
+    assert http_server.max_active == 1
+
+
+def test_download_reports_progress(http_server, tmp_path):
+    """
+    Verifies the progress callback of streamed downloads.
+    ENSURE: Received bytes grow per chunk up to the Content-Length.
+    """
+    http_server.route("/big", (200, b"x" * 2500))
+    seen = []
+    for _ in get_http_client().iter_chunks(f"{http_server.url}/big", chunk_size=1000,
+                                           progress=lambda received, total: seen.append((received, total))):
+        pass
+    assert seen == [(1000, 2500), (2000, 2500), (2500, 2500)]
+
+
+def test_download_cancel(http_server, tmp_path):
+    """
+    Verifies that a set cancel event aborts a download.
+    ENSURE: DownloadCancelled is raised and no file is left behind.
+    """
+    http_server.route("/big", (200, b"x" * 10))
+    cancel = threading.Event()
+    cancel.set()
+    with pytest.raises(DownloadCancelled):
+        get_http_client().download(f"{http_server.url}/big", tmp_path / "big", cancel=cancel)
+    assert list(tmp_path.iterdir()) == []
+
+def test_part_path_is_unique_per_process(tmp_path):
+    """
+    Verifies the temp names of downloads across worker processes.
+    ENSURE: A forked process with the same thread ident still gets its own .part file.
+    """
+    ctx = multiprocessing.get_context("fork")
+    with ctx.Pool(1) as pool:
+        child = pool.apply(part_path, (tmp_path / "a.csv.gz",))
+
+    own = part_path(tmp_path / "a.csv.gz")
+    assert own.parent == child.parent == tmp_path
+    assert own.name.startswith("a.csv.gz.") and own.name.endswith(".part")
+    assert own != child
+
+# -------------------------------------------------------------------
+# 2. Hedged Racing
+# -------------------------------------------------------------------
+
+def test_race_hedges_slow_primary():
+    """
+    Verifies that a slow primary is raced by the fallback after the hedge delay.
+    ENSURE: The fallback wins and the primary gets its cancel event set.
+    """
+    primary_cancel = []
+
+    def primary(cancel):
+        primary_cancel.append(cancel)
+        cancel.wait(2)
+        return "primary"
+
+    start = time.time()
+    assert race([primary, lambda cancel: "fallback"], hedge_delay=0.05) == "fallback"
+    assert time.time() - start < 1
+    assert primary_cancel[0].is_set()
+
+
+def test_race_failure_starts_fallback_immediately():
+    """
+    Verifies that a failing or unaccepted primary does not wait for the hedge delay.
+    ENSURE: The fallback result is returned; if all fail, the last error is raised.
+    """
+    def fail(cancel):
+        raise IOError("down")
+
+    start = time.time()
+    assert race([fail, lambda cancel: [1]], hedge_delay=5) == [1]
+    assert race([lambda cancel: [], lambda cancel: [2]], hedge_delay=5, accept=bool) == [2]
+    assert race([lambda cancel: [], lambda cancel: []], hedge_delay=5, accept=bool) == []
+    assert time.time() - start < 1
+
+    with pytest.raises(IOError):
+        race([fail, fail], hedge_delay=5)
+
+
+def test_download_if_changed_uses_validators(http_server, tmp_path):
+    """
+    Verifies conditional downloads with ETag / Last-Modified.
+    ENSURE: The first call returns the validators, a repeated call gets 304 and keeps the file.
+    """
+    headers = {"ETag": '"v1"', "Last-Modified": "Wed, 01 Jan 2025 00:00:00 GMT"}
+    http_server.route("/stations.txt", (200, b"v1", 0, headers))
+    dest = tmp_path / "stations.txt"
+    client = get_http_client()
+
+    validators = client.download_if_changed(f"{http_server.url}/stations.txt", dest)
+    assert validators == {"etag": '"v1"', "last_modified": "Wed, 01 Jan 2025 00:00:00 GMT"}
+
+    assert client.download_if_changed(f"{http_server.url}/stations.txt", dest, **validators) is None
+    assert http_server.request_headers[-1]["If-None-Match"] == '"v1"'
+    assert http_server.request_headers[-1]["If-Modified-Since"] == validators["last_modified"]
+    assert dest.read_bytes() == b"v1"
+    assert list(tmp_path.iterdir()) == [dest]
@@ -1,11 +1,14 @@
+import time
 import pytest
 import sqlite3
+from contextlib import contextmanager
 from unittest.mock import patch, MagicMock, mock_open
 from pathlib import Path
 from app.import_stations import (
     parse_station_line, 
     import_stations, 
     download_file, 
+    download_with_fallback,
     ensure_stations_imported,
     create_schema
 )
@@ -132,31 +135,34 @@ def test_import_inventory():
 # 3. Workflow & Download Tests
 # -------------------------------------------------------------------
 
-def test_download_file_success():
+def test_download_file_success(http_server, tmp_path):
     """
     Verifies that download_file writes content to disk when server responds 200.
     """
-    with patch("requests.get") as mock_get, \
-         patch("builtins.open", mock_open()) as mock_file:
-         
-        mock_resp = MagicMock()
-        mock_resp.iter_content.return_value = [b"chunk1", b"chunk2"]
-        mock_resp.raise_for_status.return_value = None
-        mock_get.return_value.__enter__.return_value = mock_resp
-        
-        # Mock pathlib interactions to prevent real FS access
-        with patch("pathlib.Path.mkdir"), \
-             patch("pathlib.Path.exists", return_value=False), \
-             patch("pathlib.Path.stat") as mock_stat:
-             
-            mock_stat.return_value.st_size = 100 # simulates size check if needed
-             
-            download_file("http://test.com/file", Path("dest.txt"))
-            
-            # Verify write using the mock_open handle
-            handle = mock_file()
-            handle.write.assert_any_call(b"chunk1")
-            handle.write.assert_any_call(b"chunk2")
+    http_server.route("/file", (200, b"chunk1chunk2"))
+    dest = tmp_path / "dest.txt"
+
+    download_file(f"{http_server.url}/file", dest)
+    download_file(f"{http_server.url}/file", dest)
+
+    assert dest.read_bytes() == b"chunk1chunk2"
+    assert http_server.count("/file") == 1
+
+def test_download_with_fallback_hedges_slow_mirror(http_server, tmp_path):
+    """
+    Verifies that a stalled primary mirror is raced by the fallback mirror.
+    ENSURE: The fallback's file is kept and the call returns before the primary answers.
+    """
+    http_server.route("/primary.txt", (200, b"primary", 2))
+    http_server.route("/fallback.txt", (200, b"fallback"))
+    dest = tmp_path / "stations.txt"
+
+    start = time.time()
+    with patch("app.import_stations.HTTP_HEDGE_DELAY", 0.05):
+        download_with_fallback(f"{http_server.url}/primary.txt", f"{http_server.url}/fallback.txt", dest)
+
+    assert time.time() - start < 1.5
+    assert dest.read_bytes() == b"fallback"
 
 def test_ensure_stations_imported_already_exists():
     """
@@ -239,7 +245,7 @@ def test_import_stations_main_logic():
          patch("app.import_stations.import_stations"), \
          patch("app.import_stations.import_inventory"):
          
-        import_stations_main()
+        import_stations_main([])
         
         assert mock_dl.called
         assert mock_connect.called
@@ -257,7 +263,7 @@ def test_import_stations_main_fallback_logic():
         # First call fails, second succeeds
         mock_dl.side_effect = [Exception("Primary URL Fail"), None, Exception("Primary inventory fail"), None, None]
         
-        import_stations_main()
+        import_stations_main([])
         assert mock_dl.call_count >= 2
 
 def test_test_import_inventory_batching():
@@ -279,3 +285,132 @@ def test_test_import_inventory_batching():
         # Verify the batch execution count (5000 records + remainder of 5)
         assert mock_conn.cursor.return_value.executemany.call_count == 2
         assert mock_conn.commit.called
+
+# -------------------------------------------------------------------
+# 5. Materialized Coverage
+# -------------------------------------------------------------------
+
+def test_import_inventory_materializes_coverage(tmp_path):
+    """
+    Verifies that importing the inventory fills station_coverage per station.
+    ENSURE: Re-importing a changed inventory keeps the coverage consistent.
+    """
+    from app.import_stations import import_inventory
+
+    inv = tmp_path / "inventory.txt"
+    inv.write_text(
+        "ACW00011604                    TMAX 1949 1950\n"
+        "ACW00011604                    TMIN 1945 1952\n"
+        "ACW00011605                    TMIN 1990 2000\n"
+    )
+    conn = sqlite3.connect(":memory:")
+    create_schema(conn)
+    import_inventory(conn, inv)
+
+    rows = conn.execute("SELECT * FROM station_coverage ORDER BY station_id").fetchall()
+    assert rows == [
+        ("ACW00011604", 1945, 1952, 1949, 1950, 1945, 1952),
+        ("ACW00011605", 1990, 2000, None, None, 1990, 2000),
+    ]
+
+    inv.write_text("ACW00011604                    TMAX 1949 1960\n")
+    import_inventory(conn, inv)
+    row = conn.execute("SELECT max_year, tmax_end FROM station_coverage WHERE station_id = 'ACW00011604'").fetchone()
+    assert row == (1960, 1960)
+    conn.close()
+
+# -------------------------------------------------------------------
+# 5. Conditional Refresh
+# -------------------------------------------------------------------
+
+def _station_line(sid, lat, lon, name):
+    return f"{sid:<11} {lat:8.4f} {lon:9.4f}   10.0    {name:<30}"
+
+def _inventory_line(sid, element, first, last):
+    return f"{sid:<11} {0:8.4f} {0:9.4f} {element} {first} {last}"
+
+def test_refresh_station_metadata_applies_diff(http_server, tmp_path):
+    """
+    Verifies the conditional refresh of stations and inventory.
+    ENSURE: Only the diff is applied (R*Tree and coverage follow), unchanged files answer 304
+            and no download runs while the writer connection is held.
+    """
+    from app.http_client import get_http_client
+    from app.import_stations import import_inventory, refresh_station_metadata
+
+    old_stations = tmp_path / "old-stations.txt"
+    old_stations.write_text("\n".join([
+        _station_line("S1", 10.0, 20.0, "KEEP"),
+        _station_line("S2", 11.0, 21.0, "MOVE"),
+        _station_line("S3", 12.0, 22.0, "DROP"),
+    ]) + "\n")
+    old_inventory = tmp_path / "old-inventory.txt"
+    old_inventory.write_text("\n".join([
+        _inventory_line("S1", "TMAX", 1950, 2000),
+        _inventory_line("S2", "TMAX", 1960, 2020),
+        _inventory_line("S3", "TMIN", 1970, 1980),
+    ]) + "\n")
+
+    conn = sqlite3.connect(tmp_path / "stations.sqlite3")
+    create_schema(conn)
+    import_stations(conn, old_stations)
+    import_inventory(conn, old_inventory)
+
+    holding = []
+
+    @contextmanager
+    def writer():
+        holding.append(True)
+        try:
+            yield conn
+        finally:
+            holding.pop()
+
+    client = get_http_client()
+    download = client.download_if_changed
+
+    def download_outside_writer(*args, **kwargs):
+        assert not holding, "metadata download while holding the writer"
+        return download(*args, **kwargs)
+
+    stations_body = ("\n".join([
+        _station_line("S1", 10.0, 20.0, "KEEP"),
+        _station_line("S2", 40.0, 41.0, "MOVE"),
+        _station_line("S4", 13.0, 23.0, "NEW"),
+    ]) + "\n").encode()
+    inventory_body = ("\n".join([
+        _inventory_line("S1", "TMAX", 1950, 2000),
+        _inventory_line("S2", "TMAX", 1960, 2024),
+        _inventory_line("S4", "TMIN", 2000, 2024),
+    ]) + "\n").encode()
+    http_server.route("/stations.txt", (200, stations_body, 0, {"ETag": '"s1"'}))
+    http_server.route("/inventory.txt", (200, inventory_body, 0, {"ETag": '"i1"'}))
+
+    with patch("app.import_stations.STATIONS_URL", f"{http_server.url}/stations.txt"), \
+         patch("app.import_stations.NOA_STATIONS_URL", f"{http_server.url}/mirror/stations.txt"), \
+         patch("app.import_stations.INVENTORY_URL", f"{http_server.url}/missing.txt"), \
+         patch("app.import_stations.NOA_INVENTORY_URL", f"{http_server.url}/inventory.txt"), \
+         patch("app.import_stations.STATIONS_TXT", tmp_path / "ghcnd-stations.txt"), \
+         patch("app.import_stations.INVENTORY_TXT", tmp_path / "ghcnd-inventory.txt"), \
+         patch.object(client, "download_if_changed", side_effect=download_outside_writer):
+        res = refresh_station_metadata(writer)
+
+        assert res["changed"] is True
+        assert res["stations"] == {"added": 1, "updated": 1, "removed": 1, "unchanged": 1}
+        assert res["inventory"] == {"added": 1, "updated": 1, "removed": 1, "unchanged": 1}
+
+        rtree = conn.execute("""
+            SELECT s.station_id, r.min_lat, r.min_lon FROM stations_rtree r
+            JOIN stations s ON s.rowid = r.id ORDER BY s.station_id
+        """).fetchall()
+        assert rtree == [("S1", 10.0, 20.0), ("S2", 40.0, 41.0), ("S4", 13.0, 23.0)]
+        coverage = conn.execute("SELECT station_id, min_year, max_year FROM station_coverage ORDER BY station_id").fetchall()
+        assert coverage == [("S1", 1950, 2000), ("S2", 1960, 2024), ("S4", 2000, 2024)]
+
+        # Second refresh: both files answer 304, nothing is rewritten
+        res = refresh_station_metadata(writer)
+        assert res == {"stations": None, "inventory": None, "changed": False}
+        assert http_server.request_headers[-1]["If-None-Match"] == '"i1"'
+        assert http_server.count("/missing.txt") == 2
+
+    conn.close()
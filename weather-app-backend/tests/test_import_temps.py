@@ -1,9 +1,14 @@
+import gzip
+import threading
+import time
 import pytest
+from hypothesis import given, settings, strategies as st
 import sqlite3
 import pandas as pd
 import numpy as np
 from unittest.mock import patch, MagicMock
 from pathlib import Path
+from tests.legacy_reference import legacy_parse, legacy_process, synthetic_dly
 from app.import_temps import (
     download_from_s3,
     _load_s3_data,
@@ -16,95 +21,166 @@ from app.import_temps import (
     get_station_periods,
     create_schema,
     download_from_ncei,
-    _load_dly_data
+    _load_dly_data,
+    _parse_dly_bytes,
+    _parse_s3_stream,
+    fetch_station_period_spans,
+    iter_station_period_blocks,
+    iter_station_periods,
+    load_station_arrays,
+    find_missing_spans,
+    get_covered_spans,
+    save_station_coverage,
+    COVERAGE_MIN_YEAR,
+    COVERAGE_MAX_YEAR,
+    StationDataUnavailable,
 )
+from app.daily_store import save_daily
+from app.parse_pool import _call_sharing, receive_arrays
+from app.process_lock import named_lock
 
 # ---------------------------------------------------------
 # 1. Download Functions
 # ---------------------------------------------------------
 
-@patch("requests.get")
-@patch("builtins.open")
-def test_download_s3_csv_success(mock_open_file, mock_get, tmp_path):
-    dest = tmp_path / "test.csv.gz"
-    
-    mock_resp = MagicMock()
-    mock_resp.iter_content.return_value = [b"chunk"]
-    mock_get.return_value.__enter__.return_value = mock_resp
-    
-    download_from_s3("STAT1", dest)
-    
-    mock_get.assert_called_once()
-    assert dest.parent.exists()
+def test_download_s3_csv_success(http_server, tmp_path):
+    http_server.route("/csv.gz/by_station/STAT1.csv.gz", (200, b"chunk"))
+    dest = tmp_path / "s3" / "test.csv.gz"
 
-@patch("requests.get")
-@patch("builtins.open")
-def test_download_ncei_success(mock_open_file, mock_get, tmp_path):
-    dest = tmp_path / "test.dly"
-    
-    mock_resp = MagicMock()
-    mock_resp.iter_content.return_value = [b"chunk"]
-    mock_get.return_value.__enter__.return_value = mock_resp
-    
-    download_from_ncei("STAT1", dest)
-    
-    mock_get.assert_called_once()
-    assert dest.parent.exists()
+    with patch("app.import_temps.S3_BASE_URL", http_server.url):
+        download_from_s3("STAT1", dest)
+        download_from_s3("STAT1", dest)
+
+    assert dest.read_bytes() == b"chunk"
+    assert http_server.count("/csv.gz/by_station/STAT1.csv.gz") == 1
+
+def test_download_ncei_success(http_server, tmp_path):
+    http_server.route("/STAT1.dly", (200, b"chunk"))
+    dest = tmp_path / "dly" / "test.dly"
+
+    with patch("app.import_temps.DLY_BASE_URL", http_server.url):
+        download_from_ncei("STAT1", dest)
+
+    assert dest.read_bytes() == b"chunk"
+    assert list(dest.parent.iterdir()) == [dest]
 
 
 # ---------------------------------------------------------
 # 2. Loading Functions (S3)
 # ---------------------------------------------------------
 
-@patch("app.import_temps.download_from_s3")
-@patch("pandas.read_csv")
-def test_load_s3_data_success(mock_read_csv, mock_download):
-    df = pd.DataFrame({
-        "station_id": ["STAT1"],
-        "date": ["20200101"],
-        "element": ["TMAX"],
-        "value": [250.0],
-        "qflag": [None]
-    })
-    mock_read_csv.return_value = df
-    
-    res = _load_s3_data("STAT1", start_year=2020, end_year=2020, ignore_qflag=True)
-    
-    assert not res.empty
-    assert "element" in res.columns
-    assert "value" in res.columns
-    assert res.iloc[0]["value"] == 250.0
+def _s3_gz(tmp_path, rows, name="STAT1.csv.gz"):
+    """Writes a GHCN by_station csv.gz with the given rows."""
+    path = tmp_path / name
+    path.write_bytes(gzip.compress("".join(f"{r}\n" for r in rows).encode()))
+    return path
+
+
+def test_load_s3_data_success(tmp_path):
+    _s3_gz(tmp_path, [
+        "STAT1,20200101,TMAX,250,,,S,",
+        "STAT1,20200101,PRCP,12,,,S,",
+        "STAT1,20200102,TMIN,-31,,,S,0700",
+        "STAT1,20200103,TMIN,-40,,I,S,",
+        "STAT1,20190101,TMAX,100,,,S,",
+    ])
+
+    with patch("app.import_temps.S3_DATA_DIR", tmp_path):
+        res = _load_s3_data("STAT1", start_year=2020, end_year=2020, ignore_qflag=True)
+
+    assert list(res.columns) == ["station_id", "year", "month", "element", "value", "day", "qflag"]
+    assert res["day"].tolist() == [1, 2]
+    assert res["element"].tolist() == ["TMAX", "TMIN"]
+    assert res["value"].tolist() == [250.0, -31.0]
+    assert res["year"].tolist() == [2020, 2020]
+    assert (res["station_id"] == "STAT1").all()
+
+
+def test_parse_s3_stream_handles_split_chunks_and_members():
+    rows = [f"STAT1,{1990 + i % 30}{1 + i % 12:02d}01,{'TMAX' if i % 2 else 'TMIN'},{i},,{'X' if i % 7 == 0 else ''},S," for i in range(500)]
+    data = gzip.compress("\n".join(rows[:250]).encode() + b"\n") + gzip.compress("\n".join(rows[250:]).encode())
+    chunks = [data[i:i + 37] for i in range(0, len(data), 37)]
+
+    res = _parse_s3_stream("STAT1", chunks, 2000, 2010, ignore_qflag=True)
+
+    expected = [i for i in range(500) if 2000 <= 1990 + i % 30 <= 2010 and i % 7 != 0]
+    assert res["value"].tolist() == [float(i) for i in expected]
+    assert res["month"].tolist() == [1 + i % 12 for i in expected]
+
+
+def test_load_s3_data_streams_to_cache(http_server, tmp_path):
+    payload = gzip.compress(b"STAT1,20200101,TMAX,250,,,S,\n")
+    http_server.route("/csv.gz/by_station/STAT1.csv.gz", (200, payload))
+
+    with patch("app.import_temps.S3_DATA_DIR", tmp_path), \
+         patch("app.import_temps.S3_BASE_URL", http_server.url), \
+         patch("app.import_temps.S3_CHUNK_SIZE", 10):
+        res = _load_s3_data("STAT1", None, None, True)
+
+    assert res["value"].tolist() == [250.0]
+    assert list(tmp_path.iterdir()) == [tmp_path / "STAT1.csv.gz"]
+    assert (tmp_path / "STAT1.csv.gz").read_bytes() == payload
+
+
+def _dly_line(station_id, year, month, element, days):
+    """Builds one 269-byte .dly record; `days` maps day -> (value, qflag)."""
+    line = f"{station_id:<11}{year:04d}{month:02d}{element}"
+    for day in range(1, 32):
+        value, qflag = days.get(day, (-9999, " "))
+        line += f"{value:5d} {qflag} "
+    return line
+
 
 @patch("app.import_temps.download_from_ncei")
-@patch("pandas.read_fwf")
-def test_load_dly_data_success(mock_read_fwf, mock_download):
-    df = pd.DataFrame({
-        "station_id": ["STAT1"],
-        "year": [2020],
-        "month": [1],
-        "element": ["TMAX"],
-        "v1": [250.0],
-        "q1": [None]
-    })
-    # Add dummy columns for v2-v31 and q2-q31
-    for i in range(2, 32):
-        df[f"v{i}"] = [-9999.0]
-        df[f"q{i}"] = [None]
-        
-    mock_read_fwf.return_value = df
-    
-    res = _load_dly_data("STAT1", start_year=2020, end_year=2020, ignore_qflag=True)
-    
-    assert not res.empty
-    assert "element" in res.columns
-    assert "value" in res.columns
-    assert res.iloc[0]["value"] == 250.0
+def test_load_dly_data_success(mock_download, tmp_path):
+    dly = tmp_path / "STAT1.dly"
+    dly.write_text("\n".join([
+        _dly_line("STAT1", 2020, 1, "TMAX", {1: (250, " "), 2: (-12, "I")}),
+        _dly_line("STAT1", 2020, 1, "PRCP", {1: (30, " ")}),
+        _dly_line("STAT1", 2019, 1, "TMIN", {1: (-50, " ")}),
+    ]) + "\n")
 
-@patch("app.import_temps.download_from_s3")
-def test_load_s3_data_download_fail(mock_download):
-    mock_download.side_effect = Exception("Download failed")
-    with pytest.raises(Exception):
-        _load_s3_data("STAT1", 2020, 2020, True)
+    with patch("app.import_temps.DATA_DIR", tmp_path):
+        res = _load_dly_data("STAT1", start_year=2020, end_year=2020, ignore_qflag=True)
+
+    assert list(res.columns) == ["station_id", "year", "month", "element", "day_raw", "value", "qflag"]
+    assert len(res) == 1
+    assert res.iloc[0]["value"] == 250
+    assert res.iloc[0]["day_raw"] == "v1"
+    assert res.iloc[0]["element"] == "TMAX"
+
+
+def test_parse_dly_bytes_keeps_flags_and_negative_values():
+    data = _dly_line("STAT1", 2020, 2, "TMIN", {3: (-123, "G"), 31: (5, " ")}).encode()
+
+    res = _parse_dly_bytes(data, None, None, ignore_qflag=False)
+
+    assert res["value"].tolist() == [-123, 5]
+    assert res["day_raw"].tolist() == ["v3", "v31"]
+    assert res.iloc[0]["qflag"] == "G"
+    assert pd.isna(res.iloc[1]["qflag"])
+
+
+@pytest.mark.parametrize("start_year,end_year,ignore_qflag", [
+    (None, None, True),
+    (None, None, False),
+    (1995, 2001, True),
+])
+def test_parse_dly_bytes_matches_read_fwf(tmp_path, start_year, end_year, ignore_qflag):
+    dly = tmp_path / "SYN1.dly"
+    dly.write_text(synthetic_dly("SYN1", 1990, 15, seed=3))
+
+    expected = legacy_parse(dly, start_year, end_year, ignore_qflag)
+    res = _parse_dly_bytes(dly.read_bytes(), start_year, end_year, ignore_qflag)
+
+    pd.testing.assert_frame_equal(res, expected, check_index_type=False)
+
+def test_load_s3_data_download_fail(http_server, tmp_path):
+    with patch("app.import_temps.S3_DATA_DIR", tmp_path), \
+         patch("app.import_temps.S3_BASE_URL", http_server.url):
+        with pytest.raises(Exception):
+            _load_s3_data("STAT1", 2020, 2020, True)
+    assert list(tmp_path.iterdir()) == []
 
 @patch("app.import_temps.download_from_ncei")
 def test_load_dly_data_download_fail(mock_download):
@@ -162,19 +238,63 @@ def test_process_weather_data_json_compliance():
     res = _process_weather_data(df, None, None)
     assert res[0][3] is None
 
+_daily_rows = st.lists(
+    st.tuples(
+        st.sampled_from(["STAT1", "STAT2"]),
+        st.integers(1998, 2002),
+        st.integers(1, 12),
+        st.sampled_from(["TMAX", "TMIN"]),
+        st.one_of(
+            st.integers(-600, 600).map(float),
+            st.sampled_from([np.inf, -np.inf, np.nan]),
+        ),
+    ),
+    max_size=60,
+)
+
+
+@settings(max_examples=200, deadline=None)
+@given(
+    rows=_daily_rows,
+    start_year=st.one_of(st.none(), st.integers(1997, 2003)),
+    end_year=st.one_of(st.none(), st.integers(1997, 2003)),
+    lat=st.sampled_from([None, 48.1, -33.9, 0.0, "unknown"]),
+)
+def test_process_weather_data_matches_legacy(rows, start_year, end_year, lat):
+    df = pd.DataFrame(rows, columns=["station_id", "year", "month", "element", "value"])
+
+    expected = legacy_process(df.copy(), start_year, end_year, lat=lat)
+    res = _process_weather_data(df.copy(), start_year, end_year, lat=lat)
+
+    assert res == expected
+    assert [tuple(type(v) for v in r) for r in res] == [tuple(type(v) for v in r) for r in expected]
+
+
 # ---------------------------------------------------------
 # 4. Fetching & Workflow
 # ---------------------------------------------------------
 
+def _loader_frame(values, year=2020):
+    """Unfiltered S3-style loader frame with one TMAX value per day."""
+    return pd.DataFrame({
+        "station_id": "STAT1",
+        "year": year,
+        "month": 1,
+        "element": "TMAX",
+        "value": [float(v) for v in values],
+        "day": list(range(1, len(values) + 1)),
+        "qflag": [""] * len(values),
+    })
+
 @patch("app.import_temps._process_weather_data")
 @patch("app.import_temps._load_s3_data")
 def test_fetch_and_parse_success(mock_s3, mock_process):
-    mock_s3.return_value = pd.DataFrame({"col": [1]})
+    mock_s3.return_value = _loader_frame([100])
     mock_process.return_value = [("STAT1", 2020, "annual", 10.0, 5.0, 1, 1)]
     
     res = fetch_and_parse_station_periods("STAT1")
     assert len(res) == 1
-    mock_s3.assert_called_once()
+    mock_s3.assert_called_once_with("STAT1", None, None, False)
     mock_process.assert_called_once()
 
 @patch("app.import_temps._process_weather_data")
@@ -183,7 +303,7 @@ def test_fetch_and_parse_success(mock_s3, mock_process):
 def test_fetch_and_parse_fallback(mock_s3, mock_dly, mock_process):
     # Simulate S3 failing
     mock_s3.side_effect = Exception("S3 Error")
-    mock_dly.return_value = pd.DataFrame({"col": [2]})
+    mock_dly.return_value = _loader_frame([200])
     mock_process.return_value = [("STAT1", 2020, "annual", 10.0, 5.0, 1, 1)]
     
     res = fetch_and_parse_station_periods("STAT1", None, True, 2020, 2020)
@@ -199,7 +319,7 @@ def test_fetch_and_parse_fallback(mock_s3, mock_dly, mock_process):
 def test_fetch_and_parse_empty_s3(mock_s3, mock_dly, mock_process):
     # Simulate S3 returning empty DataFrame
     mock_s3.return_value = pd.DataFrame()
-    mock_dly.return_value = pd.DataFrame({"col": [3]})
+    mock_dly.return_value = _loader_frame([300])
     mock_process.return_value = [("STAT1", 2020, "annual", 12.0, 6.0, 1, 1)]
     
     res = fetch_and_parse_station_periods("STAT1")
@@ -209,6 +329,50 @@ def test_fetch_and_parse_empty_s3(mock_s3, mock_dly, mock_process):
     mock_process.assert_called_once()
     assert len(res) == 1
 
+@patch("app.import_temps._load_dly_data")
+@patch("app.import_temps._load_s3_data")
+def test_fetch_and_parse_uses_daily_store(mock_s3, mock_dly, daily_store_dir):
+    df = pd.concat([_loader_frame([100, 200], year=2019), _loader_frame([300, 400], year=2020)])
+    df.loc[df["value"] == 400, "qflag"] = "I"
+    mock_s3.return_value = df
+
+    full = fetch_and_parse_station_periods("STAT1", None, False, None, None)
+    assert (daily_store_dir / "STAT1.npz").exists()
+
+    mock_s3.reset_mock()
+    ranged = fetch_and_parse_station_periods("STAT1", None, True, 2020, 2020)
+
+    mock_s3.assert_not_called()
+    mock_dly.assert_not_called()
+    assert full == [
+        ("STAT1", 2019, "annual", 15.0, None, 1, 0),
+        ("STAT1", 2020, "annual", 35.0, None, 1, 0),
+        ("STAT1", 2018, "winter", 15.0, None, 1, 0),
+        ("STAT1", 2019, "winter", 35.0, None, 1, 0),
+    ]
+    assert ranged == [("STAT1", 2020, "annual", 30.0, None, 1, 0)]
+
+@patch("app.import_temps._load_dly_data")
+@patch("app.import_temps._load_s3_data")
+def test_fetch_and_parse_no_data(mock_s3, mock_dly, daily_store_dir):
+    """
+    Verifies that a station without loadable data is an error, not an empty result.
+    ENSURE: StationDataUnavailable is raised, nothing is stored and no coverage is recorded.
+    """
+    mock_s3.return_value = pd.DataFrame()
+    mock_dly.return_value = pd.DataFrame()
+
+    with pytest.raises(StationDataUnavailable):
+        fetch_and_parse_station_periods("STAT1")
+    assert not (daily_store_dir / "STAT1.npz").exists()
+
+    conn = sqlite3.connect(":memory:")
+    create_schema(conn)
+    with pytest.raises(StationDataUnavailable):
+        ensure_station_periods_range("STAT1", conn, 1950, 2000)
+    assert get_covered_spans(conn, "STAT1") == []
+    conn.close()
+
 # ---------------------------------------------------------
 # 5. DB & Blocks
 # ---------------------------------------------------------
@@ -239,34 +403,230 @@ def test_db_operations():
     
     conn.close()
 
+def test_find_missing_spans():
+    covered = [(1990, 2000), (2005, 2010)]
+    assert find_missing_spans([], 2000, 2005) == [(2000, 2005)]
+    assert find_missing_spans(covered, 1995, 1999) == []
+    assert find_missing_spans(covered, 1950, 2020) == [(1950, 1989), (2001, 2004), (2011, 2020)]
+    assert find_missing_spans(covered, 2000, 2005) == [(2001, 2004)]
+    assert find_missing_spans(covered, None, 1995) == [(COVERAGE_MIN_YEAR, 1989)]
+    assert find_missing_spans(covered, 2008, None) == [(2011, COVERAGE_MAX_YEAR)]
+
+def test_save_station_coverage_merges_spans():
+    conn = sqlite3.connect(":memory:")
+    create_schema(conn)
+
+    save_station_coverage(conn, [("STAT1", 1990, 2000), ("STAT2", 1950, 1960)])
+    save_station_coverage(conn, [("STAT1", 2001, 2005), ("STAT1", 2010, 2012)])
+
+    assert get_covered_spans(conn, "STAT1") == [(1990, 2005), (2010, 2012)]
+    assert get_covered_spans(conn, "STAT2") == [(1950, 1960)]
+    conn.close()
+
 def test_ensure_station_periods_range():
     conn = sqlite3.connect(":memory:")
     create_schema(conn)
     
     # 1. Start with empty DB
-    with patch("app.import_temps.import_station_periods") as mock_import:
+    rows = [("STAT1", 2010, "annual", 20.0, 10.0, 12, 12)]
+    with patch("app.import_temps.fetch_station_period_spans", return_value=rows) as mock_fetch:
         res = ensure_station_periods_range("STAT1", conn, 2010, 2010)
         assert res["imported"] is True
         assert res["missing_years_count"] == 1
-        mock_import.assert_called_once()
-        
-    # Manually insert 2010 to simulate existing data
-    conn.execute("INSERT INTO station_temp_period (station_id, year, period, n_tmax, n_tmin) VALUES ('STAT1', 2010, 'annual', 0, 0)")
-    
-    # 2. Check existing year (2010) -> shouldn't import
-    with patch("app.import_temps.import_station_periods") as mock_import:
+        mock_fetch.assert_called_once_with("STAT1", [(2010, 2010)], conn)
+    assert get_covered_spans(conn, "STAT1") == [(2010, 2010)]
+    assert len(get_station_periods("STAT1", conn)) == 1
+
+    # 2. Check covered year (2010) -> shouldn't import, even without annual rows
+    conn.execute("DELETE FROM station_temp_period")
+    with patch("app.import_temps.fetch_station_period_spans") as mock_fetch:
         res = ensure_station_periods_range("STAT1", conn, 2010, 2010)
         assert res["imported"] is False
-        assert not mock_import.called
+        assert not mock_fetch.called
 
     # 3. Check start > end -> ValueError
     with pytest.raises(ValueError):
         ensure_station_periods_range("STAT1", conn, 2010, 2000)
 
-    # 4. Check no range specified -> full import
-    with patch("app.import_temps.import_station_periods") as mock_import:
+    # 4. Wider range -> all missing spans in one fetch
+    with patch("app.import_temps.fetch_station_period_spans", return_value=[]) as mock_fetch:
+        res = ensure_station_periods_range("STAT1", conn, 2005, 2015)
+        mock_fetch.assert_called_once_with("STAT1", [(2005, 2009), (2011, 2015)], conn)
+        assert res["missing_years_count"] == 10
+    assert get_covered_spans(conn, "STAT1") == [(2005, 2015)]
+
+    # 5. Check no range specified -> full import of the rest
+    with patch("app.import_temps.fetch_station_period_spans", return_value=[]) as mock_fetch:
         res = ensure_station_periods_range("STAT1", conn, None, None)
         assert res["mode"] == "full"
-        mock_import.assert_called_once()
+        mock_fetch.assert_called_once_with(
+            "STAT1", [(COVERAGE_MIN_YEAR, 2004), (2016, COVERAGE_MAX_YEAR)], conn)
         
     conn.close()
+
+@patch("app.import_temps._load_s3_data")
+def test_fetch_station_period_spans_single_parse(mock_s3):
+    df = pd.concat([
+        _loader_frame([100], year=1995),
+        _loader_frame([200], year=2000),
+        _loader_frame([300], year=2005),
+    ])
+    mock_s3.return_value = df
+
+    res = fetch_station_period_spans("STAT1", [(1990, 1996), (2004, 2006)])
+
+    mock_s3.assert_called_once()
+    assert [(r[1], r[2], r[3]) for r in res if r[2] == "annual"] == [(1995, "annual", 10.0), (2005, "annual", 30.0)]
+
+def test_fetch_station_period_spans_hedged_fallback(http_server, tmp_path):
+    """
+    Verifies the raced fallback: a stalled S3 download is hedged by NCEI.
+    ENSURE: The DLY data wins well before S3 answers and no partial S3 file is kept.
+    """
+    http_server.route("/csv.gz/by_station/STAT1.csv.gz", (200, b"", 2))
+    http_server.route("/STAT1.dly", (200, (_dly_line("STAT1", 2000, 1, "TMAX", {1: (150, " ")}) + "\n").encode()))
+
+    start = time.time()
+    with patch("app.import_temps.S3_BASE_URL", http_server.url), \
+         patch("app.import_temps.DLY_BASE_URL", http_server.url), \
+         patch("app.import_temps.S3_DATA_DIR", tmp_path / "s3"), \
+         patch("app.import_temps.DATA_DIR", tmp_path / "dly"), \
+         patch("app.import_temps.HTTP_HEDGE_DELAY", 0.05):
+        res = fetch_station_period_spans("STAT1", [(2000, 2000)], lat=50.0)
+
+    assert time.time() - start < 1.5
+    assert [(r[1], r[2], r[3]) for r in res if r[2] == "annual"] == [(2000, "annual", 15.0)]
+    assert not (tmp_path / "s3" / "STAT1.csv.gz").exists()
+
+
+class _InlinePool:
+    """Parse pool stand-in running calls in-process, with the shared-memory transfer."""
+
+    def __init__(self):
+        self.calls = []
+
+    def call(self, fn, *args):
+        self.calls.append(fn.__name__)
+        return fn(*args)
+
+    def call_arrays(self, fn, *args):
+        self.calls.append(fn.__name__)
+        shared = _call_sharing(fn, *args)
+        return None if shared is None else receive_arrays(shared)
+
+def test_fetch_station_period_spans_parse_pool(http_server, tmp_path, daily_store_dir):
+    """
+    Verifies the cold path with a parse pool: download on the thread, parse and aggregate in the pool.
+    ENSURE: An S3 file without temperatures falls back to NCEI; rows equal the in-process path and the store is written.
+    """
+    http_server.route("/csv.gz/by_station/STAT1.csv.gz", (200, gzip.compress(b"STAT1,20000101,PRCP,5,,,E,\n")))
+    http_server.route("/STAT1.dly", (200, (_dly_line("STAT1", 2000, 1, "TMAX", {1: (150, " ")}) + "\n").encode()))
+    pool = _InlinePool()
+
+    with patch("app.import_temps.S3_BASE_URL", http_server.url), \
+         patch("app.import_temps.DLY_BASE_URL", http_server.url), \
+         patch("app.import_temps.S3_DATA_DIR", tmp_path / "s3"), \
+         patch("app.import_temps.DATA_DIR", tmp_path / "dly"):
+        with patch("app.import_temps.get_parse_pool", return_value=pool):
+            res = fetch_station_period_spans("STAT1", [(2000, 2000)], lat=50.0)
+        (daily_store_dir / "STAT1.npz").unlink()
+        expected = fetch_station_period_spans("STAT1", [(2000, 2000)], lat=50.0)
+
+    assert pool.calls == ["_parse_station_file", "_parse_station_file", "_aggregate_spans"]
+    assert res == expected
+    assert [(r[1], r[2], r[3]) for r in res if r[2] == "annual"] == [(2000, "annual", 15.0)]
+
+
+def test_load_station_arrays_waits_for_other_fetch(daily_store_dir):
+    """
+    Verifies the cross-worker fetch lock of cold stations.
+    ENSURE: While another holder fetches the station, the caller waits and then reads the daily store
+    instead of downloading again.
+    """
+    arrays = _daily_arrays(2000, 2001)
+    other = named_lock("fetch-STAT1")
+    other.acquire()
+    result = {}
+
+    with patch("app.import_temps._fetch_daily_arrays") as mock_fetch:
+        waiter = threading.Thread(target=lambda: result.update(arrays=load_station_arrays("STAT1")))
+        waiter.start()
+        time.sleep(0.2)
+        assert waiter.is_alive()
+        save_daily("STAT1", arrays)
+        other.release()
+        waiter.join(5)
+
+    assert not mock_fetch.called
+    np.testing.assert_array_equal(result["arrays"]["date"], arrays["date"])
+
+
+def _daily_arrays(first_year, last_year, seed=0):
+    """Store arrays with one TMAX and TMIN value on the 15th of every month."""
+    rng = np.random.default_rng(seed)
+    date = np.array([y * 10000 + m * 100 + 15 for y in range(first_year, last_year + 1) for m in range(1, 13)])
+    n = len(date)
+    return {
+        "date": np.repeat(date, 2).astype(np.int32),
+        "element": np.tile([0, 1], n).astype(np.int8),
+        "value": rng.integers(-300, 400, size=2 * n).astype(np.int16),
+        "qflag": np.zeros(2 * n, dtype="S1"),
+    }
+
+@pytest.mark.parametrize("spans", [
+    [(COVERAGE_MIN_YEAR, COVERAGE_MAX_YEAR)],
+    [(1953, 1977)],
+    [(COVERAGE_MIN_YEAR, 1961), (1970, COVERAGE_MAX_YEAR)],
+])
+@pytest.mark.parametrize("block_years", [1, 7])
+def test_iter_station_period_blocks_matches_spans(spans, block_years):
+    """
+    Verifies the streamed aggregation against the span-wise one.
+    ENSURE: Blocks are in year order and together give exactly the rows of fetch_station_period_spans,
+    including the seasons crossing block boundaries.
+    """
+    arrays = _daily_arrays(1950, 1985)
+    with patch("app.import_temps.load_daily", return_value=arrays):
+        expected = fetch_station_period_spans("STAT1", spans, lat=48.0)
+
+    blocks = list(iter_station_period_blocks("STAT1", arrays, spans, lat=48.0, block_years=block_years))
+    streamed = [r for block in blocks for r in block]
+
+    assert streamed == sorted(expected, key=lambda r: (r[1], r[2]))
+    assert all(len({r[1] for r in block}) <= block_years + 1 for block in blocks)
+
+def test_fetch_station_period_spans_complete_at_span_edges():
+    """
+    Verifies that spans aggregated separately match one cold aggregation.
+    ENSURE: Cached 1992-1996 merged with fetched 1989-1991 and 1997-2001 gives the rows of 1989-2001,
+    including the winters crossing the span edges (3 months each).
+    """
+    arrays = _daily_arrays(1985, 2005)
+    with patch("app.import_temps.load_daily", return_value=arrays):
+        cold = fetch_station_period_spans("STAT1", [(1989, 2001)], lat=48.0)
+        cached = fetch_station_period_spans("STAT1", [(1992, 1996)], lat=48.0)
+        fetched = fetch_station_period_spans("STAT1", [(1989, 1991), (1997, 2001)], lat=48.0)
+
+    merged = {(r[1], r[2]): r for r in cached}
+    merged.update({(r[1], r[2]): r for r in fetched})
+    in_range = sorted(r for r in merged.values() if r[1] >= 1989)
+
+    assert in_range == sorted(r for r in cold if r[1] >= 1989)
+    assert merged[(1991, "winter")][5] == 3 and merged[(1996, "winter")][5] == 3
+    assert [r[2] for r in cold if r[1] < 1989] == ["winter"]
+
+def test_iter_station_periods_batches():
+    """
+    Verifies cursor batches of cached periods.
+    ENSURE: Tuples in year/period order, split into batches of the given size.
+    """
+    conn = sqlite3.connect(":memory:")
+    create_schema(conn)
+    save_station_periods_to_db(conn, [("STAT1", y, p, 1.0, 2.0, 3, 3) for y in (2001, 2000) for p in ("winter", "annual")])
+
+    batches = list(iter_station_periods("STAT1", conn, start_year=2000, batch_size=3))
+
+    assert [len(b) for b in batches] == [3, 1]
+    assert [r[:2] for b in batches for r in b] == [
+        (2000, "annual"), (2000, "winter"), (2001, "annual"), (2001, "winter")]
+    conn.close()
@@ -0,0 +1,115 @@
+import asyncio
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+
+import pytest
+from app.jobs import JobRegistry, JobsFull
+
+# -------------------------------------------------------------------
+# 1. Deduplication
+# -------------------------------------------------------------------
+
+def _done(value=None, error=None):
+    future = Future()
+    if error is not None:
+        future.set_exception(error)
+    else:
+        future.set_result(value)
+    return future
+
+
+def test_identical_submissions_share_a_job():
+    """
+    Verifies deduplication of running and finished jobs by key.
+    ENSURE: start() runs once per key; other keys get their own job.
+    """
+    registry = JobRegistry()
+    pending = Future()
+    calls = []
+
+    def start():
+        calls.append(1)
+        return pending
+
+    job, shared = registry.submit(("STAT1", None, None), start)
+    again, shared_again = registry.submit(("STAT1", None, None), start)
+    other, _ = registry.submit(("STAT1", 1990, 2000), lambda: _done([]))
+
+    assert (shared, shared_again) == (False, True)
+    assert again is job and other is not job
+    assert len(calls) == 1
+    assert job.status == "running"
+    pending.set_result([1])
+    assert registry.submit(("STAT1", None, None), start)[0] is job
+    assert registry.get(job.job_id).status == "done"
+    assert registry.stats() == {"jobs": 2, "running": 0, "submitted": 2, "deduplicated": 2}
+
+
+def test_failed_jobs_are_replaced():
+    """
+    Verifies that a failed job does not block retries.
+    ENSURE: The next submission of the key starts a new job.
+    """
+    registry = JobRegistry()
+    failed, _ = registry.submit("key", lambda: _done(error=FileNotFoundError("gone")))
+    assert failed.status == "failed"
+
+    retried, shared = registry.submit("key", lambda: _done([]))
+    assert not shared and retried is not failed
+    assert retried.status == "done"
+
+# -------------------------------------------------------------------
+# 2. Bounds & Expiry
+# -------------------------------------------------------------------
+
+def test_finished_jobs_expire_after_ttl():
+    """
+    Verifies the result TTL of finished jobs.
+    ENSURE: Expired jobs are unknown by ID and no longer deduplicate.
+    """
+    registry = JobRegistry(ttl=0.05)
+    job, _ = registry.submit("key", lambda: _done([]))
+    time.sleep(0.1)
+
+    assert registry.get(job.job_id) is None
+    assert registry.submit("key", lambda: _done([]))[0] is not job
+
+
+def test_full_registry_evicts_finished_or_rejects():
+    """
+    Verifies the registry bound.
+    ENSURE: The oldest finished job is evicted first; with only running jobs, JobsFull is raised.
+    """
+    registry = JobRegistry(max_jobs=2)
+    old, _ = registry.submit("old", lambda: _done([]))
+    running, _ = registry.submit("running", Future)
+
+    newer, _ = registry.submit("new", Future)
+    assert registry.get(old.job_id) is None
+    assert registry.get(running.job_id) is running
+
+    with pytest.raises(JobsFull):
+        registry.submit("more", Future)
+    assert registry.get(newer.job_id) is newer
+
+# -------------------------------------------------------------------
+# 3. Waiting
+# -------------------------------------------------------------------
+
+def test_wait_times_out_without_cancelling():
+    """
+    Verifies awaiting a job running on a worker thread.
+    ENSURE: A timed-out wait leaves the job running; a later wait sees its result.
+    """
+    registry = JobRegistry()
+    release = threading.Event()
+    with ThreadPoolExecutor(1) as pool:
+        job, _ = registry.submit("key", lambda: pool.submit(lambda: release.wait(5) and "rows"))
+
+        assert asyncio.run(job.wait(0.05)) is False
+        assert job.status == "running"
+        release.set()
+        assert asyncio.run(job.wait(5)) is True
+    assert job.future.result() == "rows"
+    assert job.stats()["finished_at"] is not None
@@ -0,0 +1,66 @@
+from multiprocessing.shared_memory import SharedMemory
+
+import numpy as np
+import pandas as pd
+import pytest
+from app.daily_store import daily_arrays_from_frame
+from app.import_temps import _aggregate_spans
+from app.parse_pool import ParsePool, receive_arrays, share_arrays
+
+# -------------------------------------------------------------------
+# 1. Shared-Memory Transfer
+# -------------------------------------------------------------------
+
+def test_share_and_receive_arrays_roundtrip():
+    """
+    Verifies the shared-memory transfer of store arrays.
+    ENSURE: Values, dtypes and shapes survive (including empty arrays); the block is unlinked afterwards.
+    """
+    arrays = {
+        "date": np.array([20000101, 20000102], dtype=np.int32),
+        "element": np.array([0, 1], dtype=np.int8),
+        "value": np.array([-15, 230], dtype=np.int16),
+        "qflag": np.array([b"", b"I"], dtype="S1"),
+        "empty": np.zeros(0, dtype=np.int32),
+    }
+    shared = share_arrays(arrays)
+    received = receive_arrays(shared)
+
+    assert list(received) == list(arrays)
+    for name, array in arrays.items():
+        assert received[name].dtype == array.dtype
+        np.testing.assert_array_equal(received[name], array)
+    with pytest.raises(FileNotFoundError):
+        SharedMemory(name=shared[0])
+
+# -------------------------------------------------------------------
+# 2. Worker Processes
+# -------------------------------------------------------------------
+
+def test_parse_pool_runs_in_worker_process():
+    """
+    Verifies parsing and aggregation in a spawned, warmed-up worker.
+    ENSURE: Arrays returned via shared memory and aggregated rows equal the in-process results.
+    """
+    df = pd.DataFrame({
+        "station_id": "STAT1",
+        "year": [2000, 2000, 2001],
+        "month": [1, 7, 7],
+        "element": ["TMAX", "TMIN", "TMAX"],
+        "value": [100.0, -50.0, 250.0],
+        "day": [1, 2, 3],
+        "qflag": ["", "", "X"],
+    })
+    pool = ParsePool(1)
+    try:
+        pool.warm_up()
+        arrays = pool.call_arrays(daily_arrays_from_frame, df)
+        rows = pool.call(_aggregate_spans, "STAT1", arrays, [(None, None)], True, 48.0)
+    finally:
+        pool.shutdown()
+
+    expected = daily_arrays_from_frame(df)
+    for name in expected:
+        np.testing.assert_array_equal(arrays[name], expected[name])
+    assert rows == _aggregate_spans("STAT1", expected, [(None, None)], True, 48.0)
+    assert pool.stats() == {"processes": 1, "started": False, "calls": 3, "restarts": 0}
@@ -0,0 +1,268 @@
+import pytest
+import sqlite3
+import time
+from concurrent.futures import ThreadPoolExecutor
+import pandas as pd
+from unittest.mock import patch
+from app.db import get_pool
+from app.import_stations import create_schema as create_stations_schema, rebuild_station_rtree
+from app.import_temps import (
+    COVERAGE_MAX_YEAR,
+    COVERAGE_MIN_YEAR,
+    create_schema as create_temps_schema,
+    get_covered_spans,
+    get_station_periods,
+)
+from app.prefetch import PrefetchJob, select_stations
+
+STATIONS = [
+    ("GM000000001", 52.5, 13.4),
+    ("GM000000002", 48.1, 11.6),
+    ("US000000001", 40.7, -74.0),
+    ("ASN00000001", -33.9, 151.2),
+]
+
+
+@pytest.fixture
+def db_path(tmp_path):
+    path = tmp_path / "prefetch.sqlite3"
+    conn = sqlite3.connect(path)
+    create_stations_schema(conn)
+    create_temps_schema(conn)
+    conn.executemany(
+        "INSERT INTO stations (station_id, lat, lon, name) VALUES (?, ?, ?, ?)",
+        [(sid, la, lo, sid) for sid, la, lo in STATIONS],
+    )
+    rebuild_station_rtree(conn)
+    conn.commit()
+    conn.close()
+    return path
+
+
+def _loader_frame(station_id, value):
+    return pd.DataFrame({
+        "station_id": station_id,
+        "year": [2000, 2000],
+        "month": [1, 7],
+        "element": ["TMAX", "TMAX"],
+        "value": [float(value), float(value)],
+        "day": [1, 1],
+        "qflag": ["", ""],
+    })
+
+# -------------------------------------------------------------------
+# 1. Station Selection
+# -------------------------------------------------------------------
+
+def test_select_stations_filters(db_path):
+    """
+    Verifies selection by bounding box, ID prefix, explicit list and their combination.
+    ENSURE: Filters are combined with AND and results carry the latitude.
+    """
+    conn = sqlite3.connect(db_path)
+    try:
+        assert select_stations(conn, prefix="GM") == [("GM000000001", 52.5), ("GM000000002", 48.1)]
+        assert [s for s, _ in select_stations(conn, bbox=[45, 5, 55, 15])] == ["GM000000001", "GM000000002"]
+        assert [s for s, _ in select_stations(conn, bbox=[45, 5, 55, 15], prefix="US")] == []
+        assert select_stations(conn, station_ids=["ASN00000001", "NOPE"]) == [("ASN00000001", -33.9)]
+        with pytest.raises(ValueError):
+            select_stations(conn)
+        with pytest.raises(ValueError):
+            select_stations(conn, bbox=[1, 2, 3])
+    finally:
+        conn.close()
+
+# -------------------------------------------------------------------
+# 2. Pipeline & Resume
+# -------------------------------------------------------------------
+
+def _offline(station_id, *args, **kwargs):
+    raise IOError("offline")
+
+
+def test_prefetch_job_saves_rows_and_resumes(db_path, daily_store_dir):
+    """
+    Verifies fetch -> parse -> save for several stations and resuming a job.
+    ENSURE: Finished stations get full coverage and are skipped on a rerun; failures are retried.
+    """
+    stations = [(sid, lat) for sid, lat, _ in STATIONS[:3]]
+
+    def s3(station_id, *args, **kwargs):
+        if station_id == "US000000001":
+            raise IOError("offline")
+        return _loader_frame(station_id, 200)
+
+    with patch("app.import_temps._load_s3_data", side_effect=s3), \
+         patch("app.import_temps._load_dly_data", side_effect=_offline):
+        stats = PrefetchJob(stations, parallelism=2, processes=0, db_path=db_path).run()
+
+    assert stats["status"] == "done"
+    assert (stats["done"], stats["failed"], stats["skipped"]) == (2, 1, 0)
+    assert stats["errors"][0]["station_id"] == "US000000001"
+    assert stats["stations_per_second"] > 0
+    assert (daily_store_dir / "GM000000001.npz").exists()
+
+    with get_pool(db_path).reader() as conn:
+        assert get_covered_spans(conn, "GM000000001") == [(COVERAGE_MIN_YEAR, COVERAGE_MAX_YEAR)]
+        assert get_covered_spans(conn, "US000000001") == []
+        annual = [r for r in get_station_periods("GM000000002", conn) if r["period"] == "annual"]
+        assert annual[0]["avg_tmax_c"] == 20.0
+
+    with patch("app.import_temps._load_s3_data", side_effect=lambda sid, *a, **k: _loader_frame(sid, 100)) as mock_s3:
+        stats = PrefetchJob(stations, parallelism=2, processes=0, db_path=db_path).run()
+
+    assert (stats["done"], stats["failed"], stats["skipped"]) == (1, 0, 2)
+    assert [c.args[0] for c in mock_s3.call_args_list] == ["US000000001"]
+
+
+def test_prefetch_job_falls_back_to_dly_like_live_requests(db_path, daily_store_dir):
+    """
+    Verifies that prefetch uses the live fetch path.
+    ENSURE: An S3 file without temperature rows falls back to the DLY file; the daily store is reused.
+    """
+    stations = [("GM000000001", 52.5)]
+    with patch("app.import_temps._load_s3_data", return_value=pd.DataFrame()), \
+         patch("app.import_temps._load_dly_data", side_effect=lambda sid, *a, **k: _loader_frame(sid, 150)) as mock_dly:
+        stats = PrefetchJob(stations, parallelism=1, processes=0, db_path=db_path).run()
+
+    assert (stats["done"], stats["empty"]) == (1, 0)
+    mock_dly.assert_called_once()
+    assert (daily_store_dir / "GM000000001.npz").exists()
+    with get_pool(db_path).reader() as conn:
+        annual = [r for r in get_station_periods("GM000000001", conn) if r["period"] == "annual"]
+        assert annual[0]["avg_tmax_c"] == 15.0
+
+
+def test_prefetch_job_does_not_cover_empty_stations(db_path):
+    """
+    Verifies that a station without temperature data is not recorded as cached.
+    ENSURE: It counts as empty, gets no coverage and is fetched again by the next job.
+    """
+    stations = [("GM000000001", 52.5)]
+    for _ in range(2):
+        with patch("app.import_temps._load_s3_data", return_value=pd.DataFrame()) as mock_s3, \
+             patch("app.import_temps._load_dly_data", return_value=pd.DataFrame()):
+            stats = PrefetchJob(stations, parallelism=1, processes=0, db_path=db_path).run()
+
+        assert (stats["done"], stats["empty"], stats["rows"], stats["skipped"]) == (1, 1, 0, 0)
+        mock_s3.assert_called_once()
+        with get_pool(db_path).reader() as conn:
+            assert get_covered_spans(conn, "GM000000001") == []
+
+
+def test_prefetch_job_cancel(db_path):
+    """
+    Verifies that a cancelled job does not schedule further stations.
+    ENSURE: Status is 'cancelled' and nothing is fetched.
+    """
+    job = PrefetchJob([(sid, lat) for sid, lat, _ in STATIONS], parallelism=1, processes=0, db_path=db_path)
+    job.cancel()
+    with patch("app.prefetch.prefetch_station") as mock_fetch:
+        stats = job.run()
+
+    assert stats["status"] == "cancelled"
+    assert stats["remaining"] == len(STATIONS)
+    assert not mock_fetch.called
+
+# -------------------------------------------------------------------
+# 3. Admin API
+# -------------------------------------------------------------------
+
+def test_prefetch_api_start_and_status(client):
+    """
+    Verifies starting a prefetch job and polling its status through the admin API.
+    ENSURE: Start answers 202 with the job stats; unknown jobs answer 404.
+    """
+    from app.main import app, _prefetch_jobs
+    app.state.stations_ready = True
+    app.state.stations_error = None
+    _prefetch_jobs.clear()
+
+    admin = {"X-Admin-Token": "secret"}
+
+    with patch("app.main.ADMIN_TOKEN", "secret"), \
+         patch("app.main.get_pool"), \
+         patch("app.main.select_stations", return_value=[("GM000000001", 52.5)]) as mock_select, \
+         patch("app.main.PrefetchJob.start") as mock_start:
+        response = client.post("/api/admin/prefetch", json={"prefix": "GM", "processes": 0}, headers=admin)
+        assert response.status_code == 202
+        job_id = response.json()["job_id"]
+        assert response.json()["total"] == 1
+        assert mock_select.call_args[0][1:] == (None, "GM", None)
+        mock_start.assert_called_once()
+
+        # A second job is rejected while the first is pending
+        assert client.post("/api/admin/prefetch", json={"prefix": "US"}, headers=admin).status_code == 409
+
+        assert client.get(f"/api/admin/prefetch/{job_id}", headers=admin).json()["status"] == "pending"
+        assert client.delete(f"/api/admin/prefetch/{job_id}", headers=admin).status_code == 200
+        assert client.get("/api/admin/prefetch/unknown", headers=admin).status_code == 404
+    _prefetch_jobs.clear()
+
+
+def test_prefetch_api_concurrent_starts_run_one_job(client):
+    """
+    Verifies that simultaneous start requests cannot both pass the running-job check.
+    ENSURE: Exactly one request starts a job, the others answer 409.
+    """
+    from app.main import app, _prefetch_jobs
+    app.state.stations_ready = True
+    app.state.stations_error = None
+    _prefetch_jobs.clear()
+
+    def slow_select(*args):
+        time.sleep(0.05)
+        return [("GM000000001", 52.5)]
+
+    admin = {"X-Admin-Token": "secret"}
+    with patch("app.main.ADMIN_TOKEN", "secret"), \
+         patch("app.main.get_pool"), \
+         patch("app.main.select_stations", side_effect=slow_select), \
+         patch("app.main.PrefetchJob.start") as mock_start, \
+         ThreadPoolExecutor(4) as pool:
+        codes = list(pool.map(
+            lambda _: client.post("/api/admin/prefetch", json={"prefix": "GM"}, headers=admin).status_code,
+            range(4),
+        ))
+
+    assert sorted(codes) == [202, 409, 409, 409]
+    mock_start.assert_called_once()
+    _prefetch_jobs.clear()
+
+
+def test_prefetch_api_validation_and_token(client):
+    """
+    Verifies selection errors, request limits and the admin token.
+    ENSURE: Missing filters answer 400, malformed bboxes and excessive parallelism/processes 422,
+    a wrong token 403 and an unconfigured token 503.
+    """
+    from app.main import app, _prefetch_jobs
+    app.state.stations_ready = True
+    app.state.stations_error = None
+    _prefetch_jobs.clear()
+
+    admin = {"X-Admin-Token": "secret"}
+
+    with patch("app.main.ADMIN_TOKEN", "secret"):
+        with patch("app.main.get_pool"), \
+             patch("app.main.select_stations", side_effect=ValueError("Select stations")):
+            assert client.post("/api/admin/prefetch", json={}, headers=admin).status_code == 400
+
+        for body in (
+            {"bbox": [10, 0, 5, 1]},
+            {"bbox": [0, 0, 95, 1]},
+            {"bbox": [0, 0, 1]},
+            {"prefix": "G"},
+            {"prefix": "GM", "parallelism": 0},
+            {"prefix": "GM", "parallelism": 10_000},
+            {"prefix": "GM", "processes": 10_000},
+        ):
+            assert client.post("/api/admin/prefetch", json=body, headers=admin).status_code == 422, body
+
+        assert client.post("/api/admin/prefetch", json={"prefix": "GM"}).status_code == 403
+        assert client.post("/api/admin/prefetch", json={"prefix": "GM"}, headers={"X-Admin-Token": "x"}).status_code == 403
+        assert client.get("/api/admin/prefetch/x", headers=admin).status_code == 404
+
+    with patch("app.main.ADMIN_TOKEN", None):
+        assert client.post("/api/admin/prefetch", json={"prefix": "GM"}).status_code == 503
+        assert client.post("/api/admin/stations/refresh").status_code == 503
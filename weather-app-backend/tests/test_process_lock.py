@@ -0,0 +1,67 @@
+import subprocess
+import sys
+import threading
+import time
+
+from app.process_lock import FileLock, holding, named_lock
+
+# -------------------------------------------------------------------
+# 1. Threads
+# -------------------------------------------------------------------
+
+def test_lock_excludes_other_holders_until_released():
+    """
+    Verifies mutual exclusion of two lock objects on the same file.
+    ENSURE: A second holder times out while the lock is held and gets it right after release.
+    """
+    first, second = named_lock("bootstrap"), named_lock("bootstrap")
+    assert first.acquire(0)
+    start = time.monotonic()
+    assert second.acquire(0.1) is False
+    assert time.monotonic() - start >= 0.1
+
+    threading.Timer(0.1, first.release).start()
+    assert second.acquire(5)
+    assert second.locked and not first.locked
+    second.release()
+
+
+def test_holding_reports_whether_the_lock_is_held():
+    """
+    Verifies the context manager for optional locks.
+    ENSURE: Yields False after the timeout without touching the other holder's lock.
+    """
+    other = named_lock("fetch-STAT1")
+    other.acquire()
+    with holding("fetch-STAT1", 0.05) as locked:
+        assert locked is False
+    assert other.locked
+    other.release()
+
+    with holding("fetch-STAT1", 0) as locked:
+        assert locked is True
+
+# -------------------------------------------------------------------
+# 2. Processes
+# -------------------------------------------------------------------
+
+def test_lock_excludes_other_processes_and_dies_with_them(lock_dir):
+    """
+    Verifies the lock between worker processes.
+    ENSURE: A lock held by another process blocks this one; it is freed when that process is killed.
+    """
+    path = lock_dir / "bootstrap.lock"
+    code = (
+        "import sys, time; from pathlib import Path; from app.process_lock import FileLock; "
+        f"lock = FileLock(Path({str(path)!r})); lock.acquire(); print('locked', flush=True); time.sleep(30)"
+    )
+    proc = subprocess.Popen([sys.executable, "-c", code], stdout=subprocess.PIPE, text=True)
+    try:
+        assert proc.stdout.readline().strip() == "locked"
+        lock = FileLock(path)
+        assert lock.acquire(0.1) is False
+    finally:
+        proc.kill()
+        proc.wait()
+    assert lock.acquire(5)
+    lock.release()
@@ -0,0 +1,74 @@
+import asyncio
+import threading
+import time
+from app.progress import ProgressChannel, ProgressRegistry
+
+# -------------------------------------------------------------------
+# 1. Channels
+# -------------------------------------------------------------------
+
+def _collect(channel, last_id=0, heartbeat=5.0):
+    async def _run():
+        return [e async for e in channel.subscribe(last_id, heartbeat)]
+    return asyncio.run(_run())
+
+
+def test_channel_replays_and_ends_after_final_phase():
+    """
+    Verifies the event log of a finished channel.
+    ENSURE: Events are numbered, replayed after last_id, nothing is published after the final phase.
+    """
+    channel = ProgressChannel("STAT1")
+    channel.publish("started")
+    channel.publish("download", source="s3", bytes=10, total=20)
+    channel.publish("saved", rows=5)
+    channel.publish("started")
+
+    assert channel.done
+    assert [(e["id"], e["phase"]) for e in _collect(channel)] == [(1, "started"), (2, "download"), (3, "saved")]
+    assert [e["id"] for e in _collect(channel, last_id=2)] == [3]
+    assert channel.events[1]["bytes"] == 10
+
+
+def test_channel_wakes_subscribers_from_threads():
+    """
+    Verifies that events published on a worker thread reach a waiting coroutine.
+    ENSURE: Live events arrive in order; idle periods yield None heartbeats.
+    """
+    channel = ProgressChannel("STAT1")
+
+    def _publish():
+        time.sleep(0.1)
+        channel.publish("started")
+        time.sleep(0.1)
+        channel.publish("error", detail="boom")
+
+    threading.Thread(target=_publish).start()
+    events = _collect(channel, heartbeat=0.05)
+
+    assert [e["phase"] for e in events if e is not None] == ["started", "error"]
+    assert None in events
+
+# -------------------------------------------------------------------
+# 2. Registry
+# -------------------------------------------------------------------
+
+def test_registry_reuses_open_channels_and_prunes_finished():
+    """
+    Verifies the channel lifecycle per station.
+    ENSURE: One open channel per station, reports without a channel are ignored, finished ones expire.
+    """
+    registry = ProgressRegistry(keep_seconds=0.05)
+    registry.report("STAT1", "started")
+    assert registry.get("STAT1") is None
+
+    channel = registry.open("STAT1")
+    assert registry.open("STAT1") is channel
+    registry.report("STAT1", "saved", rows=1)
+    assert registry.get("STAT1") is channel
+    assert registry.stats() == {"open": 0, "finished": 1}
+
+    assert registry.open("STAT1") is not channel
+    registry.report("STAT1", "error", detail="x")
+    time.sleep(0.1)
+    assert registry.get("STAT1") is None
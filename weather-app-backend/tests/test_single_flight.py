@@ -0,0 +1,68 @@
+import asyncio
+import pytest
+from app.single_flight import SingleFlight
+
+# -------------------------------------------------------------------
+# 1. Coalescing
+# -------------------------------------------------------------------
+
+@pytest.mark.asyncio
+async def test_single_flight_run_coalesces_coroutines():
+    """
+    Verifies that concurrent coroutines with the same key await one task.
+    ENSURE: The function runs once, all callers get the result, metrics count the coalesced calls.
+    """
+    flight = SingleFlight()
+    calls = []
+
+    async def fetch():
+        calls.append(1)
+        await asyncio.sleep(0.05)
+        return "rows"
+
+    results = await asyncio.gather(*[flight.run("STAT1", fetch) for _ in range(3)])
+
+    assert calls == [1]
+    assert sorted(results) == [("rows", False), ("rows", True), ("rows", True)]
+    stats = flight.stats()
+    assert stats["executions"] == 1
+    assert stats["coalesced"] == 2
+    assert stats["in_flight"] == 0
+
+
+@pytest.mark.asyncio
+async def test_single_flight_sequential_calls_execute_again():
+    """
+    Verifies that results are not cached once the in-flight call has finished.
+    """
+    flight = SingleFlight()
+
+    async def value(v):
+        return v
+
+    assert await flight.run("k", lambda: value(1)) == (1, False)
+    assert await flight.run("k", lambda: value(2)) == (2, False)
+    assert flight.stats()["executions"] == 2
+
+# -------------------------------------------------------------------
+# 2. Error Propagation
+# -------------------------------------------------------------------
+
+@pytest.mark.asyncio
+async def test_single_flight_propagates_errors_to_waiters():
+    """
+    Verifies that an exception of the leader is raised in every waiting caller.
+    """
+    flight = SingleFlight()
+
+    async def failing():
+        await asyncio.sleep(0.05)
+        raise FileNotFoundError("missing")
+
+    results = await asyncio.gather(
+        flight.run("k", failing), flight.run("k", failing), return_exceptions=True,
+    )
+
+    assert all(isinstance(r, FileNotFoundError) for r in results)
+    assert flight.stats()["coalesced"] == 1
+    assert flight.stats()["in_flight"] == 0
@@ -0,0 +1,218 @@
+import pytest
+import sqlite3
+import numpy as np
+from unittest.mock import patch
+from app.import_stations import create_schema, rebuild_station_rtree, rebuild_station_coverage
+from app.stations_search import find_stations_nearby, haversine_distance
+from app import station_index
+from app.station_index import StationIndex, haversine_distances, reload_station_index, get_station_index
+
+
+def _make_db(path, stations, inventory):
+    conn = sqlite3.connect(path)
+    create_schema(conn)
+    conn.executemany(
+        "INSERT INTO stations (station_id, lat, lon, name) VALUES (?, ?, ?, ?)",
+        [(sid, la, lo, f" NAME {sid} ") for sid, la, lo in stations],
+    )
+    conn.executemany(
+        "INSERT INTO station_inventory (station_id, element, start_year, end_year) VALUES (?, ?, ?, ?)",
+        inventory,
+    )
+    rebuild_station_rtree(conn)
+    rebuild_station_coverage(conn)
+    conn.commit()
+    conn.close()
+
+
+@pytest.fixture
+def station_db(tmp_path):
+    db = tmp_path / "stations.sqlite3"
+    _make_db(
+        db,
+        [
+            ("ST001", 52.52, 13.40),
+            ("ST002", 52.60, 13.50),
+            ("ST003", 52.40, 13.10),
+            ("ST004", 48.13, 11.57),
+            ("ST005", 52.53, 13.41),
+        ],
+        [
+            ("ST001", "TMAX", 1950, 2020),
+            ("ST001", "TMIN", 1940, 2010),
+            ("ST002", "TMIN", 2000, 2022),
+            ("ST003", "TMAX", 1990, 2000),
+            ("ST004", "TMAX", 1900, 2024),
+        ],
+    )
+    return db
+
+# -------------------------------------------------------------------
+# 1. Vectorized Math
+# -------------------------------------------------------------------
+
+def test_haversine_distances_matches_scalar():
+    """
+    Verifies that the vectorized Haversine matches the scalar implementation.
+    """
+    lats = np.array([48.137, 0.0, -33.9])
+    lons = np.array([11.576, 0.0, 151.2])
+    res = haversine_distances(52.52, 13.405, lats, lons)
+    for i in range(3):
+        assert res[i] == pytest.approx(haversine_distance(52.52, 13.405, lats[i], lons[i]))
+
+# -------------------------------------------------------------------
+# 2. Search Equivalence with the SQLite Path
+# -------------------------------------------------------------------
+
+@pytest.mark.parametrize("years", [(None, None), (1995, 2000), (2005, 2021)])
+def test_index_search_matches_sqlite(station_db, years):
+    """
+    Verifies that the in-memory search returns the same stations as find_stations_nearby.
+    ENSURE: Order, distances and year ranges are identical, including the year filter.
+    """
+    index = StationIndex.from_db(station_db)
+    start_year, end_year = years
+
+    expected = find_stations_nearby(52.52, 13.40, 50, db_path=station_db,
+                                    start_year=start_year, end_year=end_year)
+    result = index.search(52.52, 13.40, 50, start_year=start_year, end_year=end_year)
+
+    assert result == expected
+
+
+def test_index_search_limit_and_missing_inventory(station_db):
+    """
+    Verifies the limit and that stations without inventory report no years.
+    """
+    index = StationIndex.from_db(station_db)
+
+    res = index.search(52.53, 13.41, 1, limit=1)
+    assert len(res) == 1
+    assert res[0]["station_id"] == "ST005"
+    assert res[0]["start_year"] is None
+    assert res[0]["end_year"] is None
+    assert res[0]["name"] == "NAME ST005"
+
+    assert index.search(52.53, 13.41, 0) == []
+
+
+def test_index_from_db_missing_file(tmp_path):
+    """
+    Verifies that loading from a missing database raises FileNotFoundError.
+    """
+    with pytest.raises(FileNotFoundError):
+        StationIndex.from_db(tmp_path / "missing.sqlite3")
+
+# -------------------------------------------------------------------
+# 3. Reload
+# -------------------------------------------------------------------
+
+def test_reload_station_index_swaps_instance(station_db):
+    """
+    Verifies that reloading replaces the global index with a new instance.
+    """
+    with patch.object(station_index, "_index", None):
+        first = reload_station_index(station_db)
+        assert get_station_index() is first
+        second = reload_station_index(station_db)
+        assert get_station_index() is second
+        assert first is not second
+        assert len(second) == 5
+        # Same content, same version in every instance
+        assert first.version == second.version
+
+def test_index_follows_refresh_of_another_worker(station_db):
+    """
+    Verifies that a worker picks up station metadata refreshed by another worker.
+    ENSURE: A new changed_at in source_files reloads the index; an unchanged version does not.
+    """
+    with patch.object(station_index, "_index", None), \
+         patch.object(station_index, "INDEX_CHECK_SECONDS", 0):
+        first = reload_station_index(station_db)
+        assert get_station_index() is first
+
+        # Another worker applies a refresh to the shared database
+        conn = sqlite3.connect(station_db)
+        conn.execute("INSERT INTO stations (station_id, lat, lon, name) VALUES ('ST006', 10.0, 10.0, 'NEW')")
+        conn.execute("""
+            INSERT INTO source_files (name, url, etag, last_modified, checked_at, changed_at)
+            VALUES ('ghcnd-stations.txt', 'u', NULL, NULL, 1.0, 1.0)
+        """)
+        conn.commit()
+        conn.close()
+
+        second = get_station_index()
+        assert second is not first
+        assert len(second) == 6 and second.version != first.version
+        assert second.source_version == 1.0
+        assert get_station_index() is second
+
+# -------------------------------------------------------------------
+# 4. k Nearest Neighbours
+# -------------------------------------------------------------------
+
+def test_nearest_matches_brute_force(station_db):
+    """
+    Verifies that the KD-tree returns the same k stations as sorting all distances.
+    """
+    index = StationIndex.from_db(station_db)
+    brute = sorted(
+        (round(haversine_distance(50.0, 10.0, float(la), float(lo)), 3), str(sid))
+        for sid, la, lo in zip(index.station_ids, index.lat, index.lon)
+    )
+
+    res = index.nearest(50.0, 10.0, k=3)
+
+    assert [r["station_id"] for r in res] == [sid for _, sid in brute[:3]]
+    assert [r["distance_km"] for r in res] == [d for d, _ in brute[:3]]
+
+
+def test_nearest_ignores_radius_cap(station_db):
+    """
+    Verifies that sparse regions still return stations far beyond 100 km.
+    """
+    index = StationIndex.from_db(station_db)
+    res = index.nearest(0.0, -30.0, k=2)
+    assert len(res) == 2
+    assert res[0]["distance_km"] > 5000
+
+
+def test_nearest_max_distance_and_years(station_db):
+    """
+    Verifies the optional maximum distance and the inventory year filter.
+    """
+    index = StationIndex.from_db(station_db)
+
+    res = index.nearest(52.52, 13.40, k=10, max_distance_km=50)
+    assert "ST004" not in {r["station_id"] for r in res}
+    assert len(res) == 4
+
+    res = index.nearest(52.52, 13.40, k=10, start_year=1920, end_year=2024)
+    assert [r["station_id"] for r in res] == ["ST004"]
+
+    assert index.nearest(52.52, 13.40, k=10, max_distance_km=0) == []
+
+# -------------------------------------------------------------------
+# 5. Batch Search
+# -------------------------------------------------------------------
+
+def test_search_batch_matches_single_searches(station_db):
+    """
+    Verifies that batch results equal individual searches and keep the input order.
+    ENSURE: Chunk boundaries do not change the results.
+    """
+    index = StationIndex.from_db(station_db)
+    queries = [
+        {"lat": 52.52, "lon": 13.40, "radius_km": 50, "limit": 10, "start_year": None, "end_year": None},
+        {"lat": 48.13, "lon": 11.57, "radius_km": 10, "limit": 10, "start_year": None, "end_year": None},
+        {"lat": 52.52, "lon": 13.40, "radius_km": 50, "limit": 2, "start_year": 1995, "end_year": 2000},
+        {"lat": 0.0, "lon": 0.0, "radius_km": 100, "limit": 10, "start_year": None, "end_year": None},
+        {"lat": 52.52, "lon": 13.40, "radius_km": 0, "limit": 10, "start_year": None, "end_year": None},
+    ]
+
+    results = list(index.search_batch(queries, chunk_size=2))
+
+    assert len(results) == len(queries)
+    for q, res in zip(queries, results):
+        assert res == index.search(**q)
@@ -117,7 +117,8 @@ def test_find_stations_nearby_db_not_found():
 
 def test_find_stations_nearby_with_year_filter_sql():
     """
-    Verifies that year filters correctly trigger the SQL 'EXISTS' clause.
+    Verifies that year filters use the precomputed station_coverage columns.
+    ENSURE: No correlated subqueries against station_inventory remain.
     """
     with patch("sqlite3.connect") as mock_connect, \
          patch("pathlib.Path.exists", return_value=True):
@@ -129,7 +130,67 @@ def test_find_stations_nearby_with_year_filter_sql():
         find_stations_nearby(0, 0, 10, start_year=2000, end_year=2020)
         
         # Check if the generated SQL contains the year filtering logic
-        sql_query = mock_conn.execute.call_args[0][0]
-        assert "AND EXISTS" in sql_query
-        assert "station_inventory" in sql_query
+        sql_query, params = mock_conn.execute.call_args[0]
+        assert "c.tmax_start <= ?" in sql_query
+        assert "station_coverage" in sql_query
+        assert "station_inventory" not in sql_query
+        assert params[-4:] == [2000, 2020, 2000, 2020]
 
+
+# -------------------------------------------------------------------
+# 4. R*Tree Integration Tests
+# -------------------------------------------------------------------
+
+def _make_station_db(path, stations):
+    """Creates a real SQLite station DB (incl. R*Tree) for the given (id, lat, lon) tuples."""
+    import sqlite3
+    from app.import_stations import create_schema, rebuild_station_rtree, rebuild_station_coverage
+
+    conn = sqlite3.connect(path)
+    create_schema(conn)
+    conn.executemany(
+        "INSERT INTO stations (station_id, lat, lon, name) VALUES (?, ?, ?, ?)",
+        [(sid, la, lo, f"NAME {sid}") for sid, la, lo in stations],
+    )
+    conn.executemany(
+        "INSERT INTO station_inventory (station_id, element, start_year, end_year) VALUES (?, 'TMAX', 1950, 2020)",
+        [(sid,) for sid, _, _ in stations],
+    )
+    rebuild_station_rtree(conn)
+    rebuild_station_coverage(conn)
+    conn.commit()
+    conn.close()
+
+
+def test_find_stations_nearby_rtree(tmp_path):
+    """
+    Verifies that the R*Tree candidate lookup returns only stations inside the radius.
+    ENSURE: Results are ordered by distance and contain the inventory year range.
+    """
+    db = tmp_path / "stations.sqlite3"
+    _make_station_db(db, [
+        ("NEAR1", 52.52, 13.40),
+        ("NEAR2", 52.60, 13.50),
+        ("FAR01", 48.13, 11.57),
+    ])
+
+    results = find_stations_nearby(52.52, 13.40, 50, db_path=db)
+
+    assert [r["station_id"] for r in results] == ["NEAR1", "NEAR2"]
+    assert results[0]["start_year"] == 1950
+    assert results[0]["end_year"] == 2020
+
+
+def test_find_stations_nearby_rtree_antimeridian(tmp_path):
+    """
+    Verifies that searches crossing the date line find stations on both sides.
+    """
+    db = tmp_path / "stations.sqlite3"
+    _make_station_db(db, [
+        ("EAST1", -17.0, 179.9),
+        ("WEST1", -17.0, -179.9),
+    ])
+
+    results = find_stations_nearby(-17.0, 180.0, 50, db_path=db)
+
+    assert {r["station_id"] for r in results} == {"EAST1", "WEST1"}
@@ -0,0 +1,62 @@
+import pytest
+import asyncio
+import threading
+from app.worker_pool import BoundedExecutor, PoolSaturated
+
+# -------------------------------------------------------------------
+# 1. Capacity & Back-Pressure
+# -------------------------------------------------------------------
+
+def test_bounded_executor_rejects_when_full():
+    """
+    Verifies that jobs beyond workers + queue are rejected immediately.
+    ENSURE: Slots are released once jobs finish, and counters reflect the rejection.
+    """
+    pool = BoundedExecutor(max_workers=1, max_queue=1, name="test")
+    release = threading.Event()
+
+    running = pool.submit(release.wait, 5)
+    queued = pool.submit(lambda: "queued")
+    with pytest.raises(PoolSaturated):
+        pool.submit(lambda: "rejected")
+
+    release.set()
+    assert running.result(timeout=5) is True
+    assert queued.result(timeout=5) == "queued"
+
+    stats = pool.stats()
+    assert stats["rejected"] == 1
+    assert stats["completed"] == 2
+    assert stats["pending"] == 0
+    assert pool.submit(lambda: 1).result(timeout=5) == 1
+    pool.shutdown()
+
+
+def test_bounded_executor_restarts_after_shutdown():
+    """
+    Verifies that a pool can be used again after shutdown (e.g. app restart in tests).
+    """
+    pool = BoundedExecutor(max_workers=1)
+    assert pool.submit(lambda: 1).result(timeout=5) == 1
+    pool.shutdown()
+    assert pool.submit(lambda: 2).result(timeout=5) == 2
+    pool.shutdown()
+
+# -------------------------------------------------------------------
+# 2. Async Usage
+# -------------------------------------------------------------------
+
+@pytest.mark.asyncio
+async def test_bounded_executor_run_awaits_result():
+    """
+    Verifies that run() can be awaited from the event loop and propagates errors.
+    """
+    pool = BoundedExecutor(max_workers=2)
+    assert await pool.run(lambda x: x + 1, 1) == 2
+
+    def fail():
+        raise FileNotFoundError("missing")
+
+    with pytest.raises(FileNotFoundError):
+        await pool.run(fail)
+    pool.shutdown()
@@ -0,0 +1,143 @@
+import pytest
+import sqlite3
+import time
+from unittest.mock import patch
+from app.db import get_pool
+from app.import_temps import create_schema, get_covered_spans, get_station_periods, save_station_periods_to_db
+from app.write_queue import WriteBehindQueue
+
+
+@pytest.fixture
+def db_path(tmp_path):
+    path = tmp_path / "queue.sqlite3"
+    with get_pool(path).writer() as conn:
+        create_schema(conn)
+    return path
+
+
+def _rows(station_id, years):
+    return [(station_id, y, "annual", 10.0, 2.0, 12, 12) for y in years]
+
+# -------------------------------------------------------------------
+# 1. Batching
+# -------------------------------------------------------------------
+
+def test_write_queue_merges_submissions_into_one_batch(db_path):
+    """
+    Verifies that rows from several submissions are committed in one transaction.
+    ENSURE: All rows are persisted and only one batch is counted.
+    """
+    wq = WriteBehindQueue(db_path, batch_rows=1000, flush_interval=10)
+    with patch("app.write_queue.save_station_periods_to_db", wraps=save_station_periods_to_db) as mock_save:
+        wq.submit(_rows("STAT1", range(2000, 2005)))
+        wq.submit(_rows("STAT2", range(2000, 2003)))
+        wq.stop(timeout=5)
+
+    assert mock_save.call_count == 1
+    assert len(mock_save.call_args[0][1]) == 8
+    stats = wq.stats()
+    assert stats["rows_written"] == 8
+    assert stats["batches"] == 1
+    assert stats["queue_depth"] == 0
+
+    with get_pool(db_path).reader() as conn:
+        assert len(get_station_periods("STAT1", conn)) == 5
+        assert len(get_station_periods("STAT2", conn)) == 3
+
+
+def test_write_queue_records_coverage_after_rows(db_path):
+    """
+    Verifies that coverage spans are written in the same flush as their rows.
+    ENSURE: Coverage is persisted, also for spans without any rows.
+    """
+    wq = WriteBehindQueue(db_path, batch_rows=1000, flush_interval=10)
+    wq.submit(_rows("STAT1", [2000]), coverage=[("STAT1", 1990, 2000)])
+    wq.submit([], coverage=[("STAT2", 1950, 1960)])
+    wq.stop(timeout=5)
+
+    with get_pool(db_path).reader() as conn:
+        assert get_covered_spans(conn, "STAT1") == [(1990, 2000)]
+        assert get_covered_spans(conn, "STAT2") == [(1950, 1960)]
+        assert len(get_station_periods("STAT1", conn)) == 1
+
+def test_write_queue_reports_saved_submissions(db_path):
+    """
+    Verifies the on_saved callbacks.
+    ENSURE: True after the commit (also for empty submissions), False for dropped rows.
+    """
+    saved = []
+    wq = WriteBehindQueue(db_path, batch_rows=1000, flush_interval=10, max_queue=1)
+    wq.submit([], on_saved=lambda ok: saved.append(("empty", ok)))
+    with patch.object(wq, "start"):
+        wq.submit(_rows("STAT1", [2000]), on_saved=lambda ok: saved.append(("first", ok)))
+        wq.submit(_rows("STAT1", [2001]), on_saved=lambda ok: saved.append(("dropped", ok)))
+    assert saved == [("empty", True), ("dropped", False)]
+
+    wq.start()
+    wq.stop(timeout=5)
+    assert saved[-1] == ("first", True)
+
+def test_write_queue_flushes_on_size_and_time(db_path):
+    """
+    Verifies the size threshold and the time threshold for flushing.
+    """
+    wq = WriteBehindQueue(db_path, batch_rows=3, flush_interval=0.05)
+    wq.submit(_rows("STAT1", range(2000, 2004)))  # above size threshold
+    for _ in range(100):
+        if wq.stats()["rows_written"] == 4:
+            break
+        time.sleep(0.01)
+    assert wq.stats()["rows_written"] == 4
+
+    wq.submit(_rows("STAT2", [2000]))  # below size threshold, flushed by time
+    for _ in range(100):
+        if wq.stats()["rows_written"] == 5:
+            break
+        time.sleep(0.01)
+    assert wq.stats()["rows_written"] == 5
+    wq.stop(timeout=5)
+
+# -------------------------------------------------------------------
+# 2. Bounds & Shutdown
+# -------------------------------------------------------------------
+
+def test_write_queue_drops_when_full(db_path):
+    """
+    Verifies that a full queue rejects rows instead of blocking the caller.
+    """
+    wq = WriteBehindQueue(db_path, max_queue=1)
+    with patch.object(wq, "_start_thread"):
+        assert wq.submit(_rows("STAT1", [2000])) is True
+        assert wq.submit(_rows("STAT1", [2001])) is False
+    assert wq.stats()["dropped"] == 1
+
+
+def test_write_queue_rejects_submissions_after_stop(db_path):
+    """
+    Verifies that a stopped queue stays stopped.
+    ENSURE: submit() after stop() drops the rows without restarting the writer; start() reopens it.
+    """
+    wq = WriteBehindQueue(db_path, flush_interval=0.01)
+    assert wq.submit(_rows("STAT1", [2000])) is True
+    wq.stop(timeout=5)
+
+    saved = []
+    assert wq.submit(_rows("STAT1", [2001]), on_saved=saved.append) is False
+    assert saved == [False]
+    assert wq._thread is None
+    assert wq.stats()["dropped"] == 1
+
+    wq.start()
+    assert wq.submit(_rows("STAT1", [2002])) is True
+    wq.stop(timeout=5)
+    with get_pool(db_path).reader() as conn:
+        assert [r["year"] for r in get_station_periods("STAT1", conn)] == [2000, 2002]
+
+
+def test_write_queue_stop_without_start_is_noop(db_path):
+    """
+    Verifies that stopping an idle queue does not hang.
+    """
+    wq = WriteBehindQueue(db_path)
+    wq.stop(timeout=1)
+    assert wq.stats()["rows_written"] == 0